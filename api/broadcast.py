@@ -0,0 +1,132 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Optional
+
+from api.redis_client import get_redis
+
+# Callback chamado em cada worker quando chega uma mensagem: (canal, texto_json)
+EntregaLocal = Callable[[str, str], Awaitable[None]]
+
+
+class BroadcastBackend(ABC):
+    """
+    Transporte das mensagens de WebSocket entre workers.
+    'publish' é chamado uma vez por evento; cada worker recebe a mensagem
+    pelo callback registrado em 'start' e entrega aos seus próprios sockets.
+    """
+
+    @abstractmethod
+    async def start(self, entregar: EntregaLocal):
+        ...
+
+    @abstractmethod
+    async def stop(self):
+        ...
+
+    @abstractmethod
+    async def publish(self, canal: str, texto: str):
+        ...
+
+    @abstractmethod
+    async def proximo_seq(self, canal: str) -> int:
+        """Número de sequência do próximo evento do canal (único entre workers)."""
+
+    @abstractmethod
+    async def seq_atual(self, canal: str) -> int:
+        """Último número de sequência emitido no canal (0 se nenhum)."""
+
+
+class MemoryBroadcastBackend(BroadcastBackend):
+    """Um único processo: a mensagem vai direto para o callback local."""
+
+    def __init__(self):
+        self._entregar: Optional[EntregaLocal] = None
+        self._seq: Dict[str, int] = defaultdict(int)
+
+    async def start(self, entregar: EntregaLocal):
+        self._entregar = entregar
+
+    async def stop(self):
+        self._entregar = None
+
+    async def publish(self, canal: str, texto: str):
+        if self._entregar:
+            await self._entregar(canal, texto)
+
+    async def proximo_seq(self, canal: str) -> int:
+        self._seq[canal] += 1
+        return self._seq[canal]
+
+    async def seq_atual(self, canal: str) -> int:
+        return self._seq[canal]
+
+
+class RedisBroadcastBackend(BroadcastBackend):
+    """
+    Vários workers: publica no Redis e cada worker escuta todos os canais
+    com o prefixo configurado (PSUBSCRIBE).
+    """
+
+    def __init__(self, redis, prefixo: str = "ifome:ws:"):
+        self.redis = redis
+        self.prefixo = prefixo
+        self._entregar: Optional[EntregaLocal] = None
+        self._tarefa: Optional[asyncio.Task] = None
+
+    async def start(self, entregar: EntregaLocal):
+        self._entregar = entregar
+        self._tarefa = asyncio.create_task(self._escutar())
+
+    async def stop(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+    async def publish(self, canal: str, texto: str):
+        await self.redis.publish(f"{self.prefixo}{canal}", texto)
+
+    async def proximo_seq(self, canal: str) -> int:
+        # INCR é atômico: todos os workers compartilham o mesmo contador
+        return int(await self.redis.incr(f"{self.prefixo}seq:{canal}"))
+
+    async def seq_atual(self, canal: str) -> int:
+        valor = await self.redis.get(f"{self.prefixo}seq:{canal}")
+        return int(valor) if valor else 0
+
+    async def _escutar(self):
+        """Loop de assinatura; reconecta sozinho se o Redis cair."""
+        espera = 1
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.psubscribe(f"{self.prefixo}*")
+                espera = 1
+                async for mensagem in pubsub.listen():
+                    if mensagem["type"] != "pmessage":
+                        continue
+                    canal = mensagem["channel"][len(self.prefixo):]
+                    try:
+                        await self._entregar(canal, mensagem["data"])
+                    except Exception as e:
+                        print(f"Erro ao entregar mensagem do Redis [{canal}]: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Pub/sub do Redis caiu, reconectando em {espera}s: {e}")
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, 30)
+            finally:
+                await pubsub.aclose()
+
+
+def criar_backend() -> BroadcastBackend:
+    """Redis se REDIS_URL estiver configurada, senão memória (um worker só)."""
+    redis = get_redis()
+    if redis is not None:
+        return RedisBroadcastBackend(redis)
+    return MemoryBroadcastBackend()
@@ -28,14 +28,111 @@ class Settings:
     DB_PORT: str = os.getenv("DB_PORT", "5432")
     DB_NAME: str = os.getenv("DB_NAME", "ifome")
 
-    DATABASE_URL: str = (
-        f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # URL única usada pelo engine (src/database.py). DATABASE_URL no .env
+    # sobrescreve, ex: sqlite+aiosqlite:///./ifome_clone.db para testes.
+    DATABASE_URL: str = os.getenv("DATABASE_URL") or (
+        f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     )
 
+    # Pool de conexões (ignorado no SQLite)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # segundos esperando uma conexão livre
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # recicla conexões com mais de 30 min
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+
+    # Redis (opcional). Quando definido, os workers compartilham o
+    # broadcast dos WebSockets por pub/sub; vazio = tudo em memória.
+    REDIS_URL: str = os.getenv("REDIS_URL", "")
+    # Workers do uvicorn (ele lê a mesma variável). Estado que precisa ser
+    # único entre workers (sacola, idempotência) exige REDIS_URL se > 1.
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+    # WebSockets: cada socket tem uma fila de saída própria. Se o cliente
+    # não acompanhar, a política decide entre descartar a mensagem mais
+    # antiga ("descartar") ou derrubar a conexão ("fechar").
+    WS_SEND_TIMEOUT: float = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+    WS_MAX_FILA: int = int(os.getenv("WS_MAX_FILA", "32"))
+    WS_POLITICA_LENTO: str = os.getenv("WS_POLITICA_LENTO", "descartar")
+    # Eventos guardados por restaurante para o tablet retomar após reconectar
+    WS_REPLAY_MAX: int = int(os.getenv("WS_REPLAY_MAX", "200"))
+    # Quanto tempo o buffer fica depois que a última cozinha desconecta
+    WS_REPLAY_RETENCAO: float = float(os.getenv("WS_REPLAY_RETENCAO", "120"))
+    # Feed de alterações: o cursor não passa de (agora - janela), para não pular
+    # transações que gravaram atualizado_em antes mas fizeram commit depois
+    FEED_JANELA_ALTERACOES: float = float(os.getenv("FEED_JANELA_ALTERACOES", "10"))
+
+    # Cache da busca de restaurantes próximos (Google Places)
+    PLACES_CACHE_TTL: int = int(os.getenv("PLACES_CACHE_TTL", "600"))  # segundos
+    PLACES_CACHE_MAX_ITENS: int = int(os.getenv("PLACES_CACHE_MAX_ITENS", "5000"))
+    PLACES_CACHE_MAX_BYTES: int = int(os.getenv("PLACES_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    PLACES_CACHE_PRECISAO_GEOHASH: int = int(os.getenv("PLACES_CACHE_PRECISAO_GEOHASH", "6"))
+
+    # Cliente HTTP de saída (compartilhado por todo o app)
+    HTTP_TIMEOUT: float = float(os.getenv("HTTP_TIMEOUT", "10"))
+    HTTP_MAX_CONEXOES: int = int(os.getenv("HTTP_MAX_CONEXOES", "100"))
+    HTTP_MAX_CONEXOES_POR_HOST: int = int(os.getenv("HTTP_MAX_CONEXOES_POR_HOST", "20"))
+
+    # Outbox (NF e e-mails de status): lote por ciclo, entregas simultâneas,
+    # tentativas antes de ir para 'morto' e backoff exponencial (segundos).
+    OUTBOX_LOTE: int = int(os.getenv("OUTBOX_LOTE", "20"))
+    OUTBOX_CONCORRENCIA: int = int(os.getenv("OUTBOX_CONCORRENCIA", "5"))
+    OUTBOX_MAX_TENTATIVAS: int = int(os.getenv("OUTBOX_MAX_TENTATIVAS", "8"))
+    OUTBOX_BACKOFF_BASE: float = float(os.getenv("OUTBOX_BACKOFF_BASE", "2"))
+    OUTBOX_BACKOFF_MAX: float = float(os.getenv("OUTBOX_BACKOFF_MAX", "600"))
+    OUTBOX_INTERVALO: float = float(os.getenv("OUTBOX_INTERVALO", "1"))
+    # Tempo que uma mensagem fica reservada para um worker antes de outro poder pegá-la
+    OUTBOX_RESERVA: int = int(os.getenv("OUTBOX_RESERVA", "120"))
+
+    # PDF da NF: processos de renderização e pasta do cache em disco.
+    # O pool é por worker do uvicorn: total de processos = workers x NF_PDF_WORKERS
+    NF_PDF_WORKERS: int = int(os.getenv("NF_PDF_WORKERS", "1"))
+    NF_PDF_DIR: str = os.getenv("NF_PDF_DIR", "nf_cache")
+    NF_PDF_CACHE_DIAS: float = float(os.getenv("NF_PDF_CACHE_DIAS", "7"))
+    NF_PDF_CACHE_MAX_BYTES: int = int(os.getenv("NF_PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+    # Login por telefone: validade do código, tentativas por código e
+    # quantos códigos um telefone pode pedir por janela (segundos).
+    OTP_TTL: int = int(os.getenv("OTP_TTL", "300"))
+    OTP_MAX_TENTATIVAS: int = int(os.getenv("OTP_MAX_TENTATIVAS", "5"))
+    OTP_MAX_ENVIOS: int = int(os.getenv("OTP_MAX_ENVIOS", "3"))
+    OTP_JANELA_ENVIOS: int = int(os.getenv("OTP_JANELA_ENVIOS", "900"))
+    OTP_MAX_TELEFONES: int = int(os.getenv("OTP_MAX_TELEFONES", "100000"))
+
+    # SMS (Twilio): fila do dispatcher, envios simultâneos, tentativas e
+    # intervalo mínimo (segundos) entre SMS para o mesmo número.
+    SMS_MAX_FILA: int = int(os.getenv("SMS_MAX_FILA", "1000"))
+    SMS_CONCORRENCIA: int = int(os.getenv("SMS_CONCORRENCIA", "4"))
+    SMS_MAX_TENTATIVAS: int = int(os.getenv("SMS_MAX_TENTATIVAS", "3"))
+    SMS_INTERVALO_DESTINO: float = float(os.getenv("SMS_INTERVALO_DESTINO", "10"))
+
+    # Cardápio: JSON pronto por restaurante (invalidado ao cadastrar item)
+    CARDAPIO_CACHE_TTL: int = int(os.getenv("CARDAPIO_CACHE_TTL", "600"))
+    CARDAPIO_CACHE_MAX_ITENS: int = int(os.getenv("CARDAPIO_CACHE_MAX_ITENS", "5000"))
+    CARDAPIO_CACHE_MAX_BYTES: int = int(os.getenv("CARDAPIO_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+    # Sacola: write-behind (store em memória/Redis, gravada no banco em lote)
+    SACOLA_TTL: int = int(os.getenv("SACOLA_TTL", "1800"))
+    SACOLA_MAX_USUARIOS: int = int(os.getenv("SACOLA_MAX_USUARIOS", "50000"))
+    SACOLA_FLUSH_INTERVALO: float = float(os.getenv("SACOLA_FLUSH_INTERVALO", "5"))
+    SACOLA_FLUSH_LOTE: int = int(os.getenv("SACOLA_FLUSH_LOTE", "200"))
+    # Trava por usuário (checkout/PUT em lote x flusher): validade e espera máxima
+    SACOLA_TRAVA_TTL: int = int(os.getenv("SACOLA_TRAVA_TTL", "30"))
+    SACOLA_TRAVA_ESPERA: float = float(os.getenv("SACOLA_TRAVA_ESPERA", "10"))
+
+    # Idempotency-Key do checkout: respostas guardadas e espera de duplicadas
+    IDEMPOTENCIA_TTL: int = int(os.getenv("IDEMPOTENCIA_TTL", "86400"))
+    IDEMPOTENCIA_LEASE: int = int(os.getenv("IDEMPOTENCIA_LEASE", "60"))
+    IDEMPOTENCIA_ESPERA: float = float(os.getenv("IDEMPOTENCIA_ESPERA", "25"))
+    IDEMPOTENCIA_MAX_CHAVES: int = int(os.getenv("IDEMPOTENCIA_MAX_CHAVES", "100000"))
+
     # Segurança / Sessão
     SECRET_KEY: str = os.getenv("SECRET_KEY", "uma_chave_secreta_padrao")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 1 dia
+    # Rotas /internal/* (métricas): exigem o header X-Internal-Token com este valor.
+    # Sem token configurado, só respondem com DEBUG ligado.
+    INTERNAL_TOKEN: str = os.getenv("INTERNAL_TOKEN", "")
     
     # --- CORREÇÃO 1: Carregar a base URL do .env ---
     NGROK_BASE_URL: str = os.getenv("NGROK_BASE_URL", "http://localhost:8000")
@@ -1,48 +1,266 @@
 from fastapi import WebSocket
-from typing import List, Dict
-from collections import defaultdict
-import json
+from typing import Any, Awaitable, Callable, Coroutine, Deque, List, Dict, Optional, Set, Tuple
+from collections import defaultdict, deque
+import asyncio
+import orjson
+
+from api.broadcast import BroadcastBackend, criar_backend
+from api.config import settings
+from src.serializers import dumps
 
 # Removemos imports desnecessários para evitar erros circulares
 # Apenas gerenciamos a conexão aqui.
 
+# Tarefas soltas (fechar socket etc.): o event loop só guarda referência fraca,
+# então ficam aqui até terminar, para não serem coletadas no meio
+_tarefas_em_fundo: Set[asyncio.Task] = set()
+
+
+def _em_fundo(corrotina: Coroutine) -> asyncio.Task:
+    tarefa = asyncio.create_task(corrotina)
+    _tarefas_em_fundo.add(tarefa)
+    tarefa.add_done_callback(_tarefa_terminou)
+    return tarefa
+
+
+def _tarefa_terminou(tarefa: asyncio.Task):
+    _tarefas_em_fundo.discard(tarefa)
+    if not tarefa.cancelled() and tarefa.exception():
+        print(f"Erro em tarefa de WebSocket: {tarefa.exception()!r}")
+
+class ClienteWebSocket:
+    """
+    Um socket conectado + sua fila de saída.
+    Uma tarefa por socket esvazia a fila, então um cliente lento atrasa
+    apenas a si mesmo e nunca quem publicou o evento.
+    """
+    def __init__(self, websocket: WebSocket, ao_fechar: Callable[["ClienteWebSocket"], None]):
+        self.websocket = websocket
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_MAX_FILA)
+        self.descartadas = 0
+        self._ao_fechar = ao_fechar
+        self._fechado = False
+        self._tarefa = asyncio.create_task(self._enviar_loop())
+
+    def enfileirar(self, texto: str):
+        """Não bloqueia. Aplica a política de cliente lento se a fila estiver cheia."""
+        if self._fechado:
+            return
+        try:
+            self.fila.put_nowait(texto)
+        except asyncio.QueueFull:
+            if settings.WS_POLITICA_LENTO == "fechar":
+                print("⚠️ Cliente WebSocket lento demais, fechando conexão.")
+                _em_fundo(self.fechar(codigo=1013))
+                return
+            # "descartar": joga fora a mensagem mais antiga e guarda a nova
+            self.fila.get_nowait()
+            self.fila.put_nowait(texto)
+            self.descartadas += 1
+
+    async def _enviar_loop(self):
+        while True:
+            texto = await self.fila.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(texto), timeout=settings.WS_SEND_TIMEOUT)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Erro ao enviar via socket: {e!r}")
+                # Já estamos dentro da própria tarefa: só marca e sai do loop
+                self._tarefa = None
+                await self.fechar()
+                return
+
+    async def fechar(self, codigo: int = 1000):
+        if self._fechado:
+            return
+        self._fechado = True
+        self._ao_fechar(self)
+        if self._tarefa:
+            self._tarefa.cancel()
+        try:
+            await self.websocket.close(code=codigo)
+        except Exception:
+            pass
+
+
+def _guardar_em_ordem(buffer: Deque[Tuple[int, str]], seq: int, texto: str):
+    """Pub/sub não garante ordem entre publicadores: mantém o buffer ordenado por seq."""
+    buffer.append((seq, texto))
+    if len(buffer) > 1 and buffer[-2][0] > seq:
+        ordenado = sorted(buffer)
+        buffer.clear()
+        buffer.extend(ordenado)
+
+
+def _sem_buracos(buffer: Deque[Tuple[int, str]], desde: int) -> bool:
+    """O buffer tem todos os eventos depois de 'desde', em sequência (sem perdidos no meio)?"""
+    seqs = [seq for seq, _ in buffer if seq > desde]
+    if not buffer or buffer[0][0] > desde + 1:
+        return False
+    return all(seq == desde + 1 + i for i, seq in enumerate(seqs))
+
+
 class ConnectionManager:
     """
-    Gerencia as conexões WebSocket ativas.
+    Gerencia as conexões WebSocket ativas deste worker.
+    O envio passa pelo backend de broadcast, então um evento publicado em
+    qualquer worker chega aos sockets de todos eles.
     """
-    def __init__(self):
-        # Dicionário que guarda uma lista de sockets para cada order_id
-        self.active_connections: Dict[int, List[WebSocket]] = defaultdict(list)
+    def __init__(self, backend: Optional[BroadcastBackend] = None):
+        # Dicionário que guarda uma lista de clientes para cada order_id
+        self.active_connections: Dict[int, List[ClienteWebSocket]] = defaultdict(list)
+        # Telas da cozinha, por restaurant_id
+        self.restaurant_connections: Dict[str, List[ClienteWebSocket]] = defaultdict(list)
+        # Últimos eventos de cada restaurante (seq, texto), para retomada.
+        # Todo worker recebe todos os eventos, então qualquer um pode retomar.
+        # Só existe buffer para restaurante com cozinha conectada (ou que saiu há
+        # menos de WS_REPLAY_RETENCAO segundos, para dar tempo de reconectar).
+        self.replay: Dict[str, Deque[Tuple[int, str]]] = {}
+        self._expirar_replay: Dict[str, asyncio.TimerHandle] = {}
+        # Canais que não são de socket (ex.: invalidação de cache entre workers)
+        self._ouvintes: Dict[str, Callable[[str, str], None]] = {}
+        self.backend = backend or criar_backend()
+
+    def registrar_ouvinte(self, tipo: str, callback: Callable[[str, str], None]):
+        """callback(chave, texto) para cada mensagem publicada em '<tipo>:<chave>'."""
+        self._ouvintes[tipo] = callback
+
+    async def publicar(self, tipo: str, chave: str, texto: str = ""):
+        await self.backend.publish(f"{tipo}:{chave}", texto)
+
+    async def startup(self):
+        """Começa a receber as mensagens publicadas pelos outros workers."""
+        await self.backend.start(self._entregar_local)
+
+    async def shutdown(self):
+        await self.backend.stop()
 
     async def connect(self, websocket: WebSocket, order_id: int):
         """Aceita a conexão e guarda na lista."""
         await websocket.accept()
-        self.active_connections[order_id].append(websocket)
+        cliente = ClienteWebSocket(websocket, lambda c: self._remover(self.active_connections, order_id, c))
+        self.active_connections[order_id].append(cliente)
         print(f"🔌 WebSocket Conectado! [Pedido #{order_id}] - Total conexões: {len(self.active_connections[order_id])}")
 
+    async def connect_restaurant(
+        self,
+        websocket: WebSocket,
+        restaurant_id: str,
+        desde: Optional[int],
+        carregar_snapshot: Callable[[str], Awaitable[List[Dict[str, Any]]]],
+    ):
+        """
+        Conecta uma tela da cozinha. Se 'desde' (último seq recebido) ainda
+        estiver no buffer de replay, manda só os eventos que faltam; senão
+        manda um snapshot dos pedidos abertos. O cliente ignora eventos com
+        seq <= ao do snapshot/replay que já recebeu.
+        """
+        await websocket.accept()
+        canal = f"restaurant:{restaurant_id}"
+        conexoes = self.restaurant_connections
+        cliente = ClienteWebSocket(websocket, lambda c: self._remover(conexoes, restaurant_id, c))
+
+        buffer = self._buffer_replay(restaurant_id)
+        seq_atual = await self.backend.seq_atual(canal)
+        pode_retomar = (
+            desde is not None and desde <= seq_atual
+            and (desde == seq_atual or _sem_buracos(buffer, desde))
+        )
+
+        if pode_retomar:
+            ultimo_enviado = desde
+        else:
+            # seq lido ANTES da consulta: o que chegar durante ela vai no replay abaixo
+            pedidos = await carregar_snapshot(restaurant_id)
+            cliente.enfileirar(dumps({"tipo": "snapshot", "seq": seq_atual, "pedidos": pedidos}))
+            ultimo_enviado = seq_atual
+
+        # Sem await entre o replay e o registro: nenhum evento fica no meio
+        faltando = [texto for seq, texto in buffer if seq > ultimo_enviado]
+        if faltando:
+            cliente.enfileirar('{"tipo":"replay","eventos":[' + ",".join(faltando) + "]}")
+        conexoes[restaurant_id].append(cliente)
+        print(f"🍳 Cozinha conectada [Restaurante {restaurant_id}] - Total: {len(conexoes[restaurant_id])}")
+
     def disconnect(self, websocket: WebSocket, order_id: int):
         """Remove a conexão da lista."""
-        if order_id in self.active_connections:
-            if websocket in self.active_connections[order_id]:
-                self.active_connections[order_id].remove(websocket)
-                print(f"🔌 WebSocket Desconectado [Pedido #{order_id}]")
-            
+        self._fechar_socket(self.active_connections, order_id, websocket)
+
+    def disconnect_restaurant(self, websocket: WebSocket, restaurant_id: str):
+        self._fechar_socket(self.restaurant_connections, restaurant_id, websocket)
+
+    def _fechar_socket(self, conexoes: Dict, chave, websocket: WebSocket):
+        for cliente in list(conexoes.get(chave, [])):
+            if cliente.websocket is websocket:
+                _em_fundo(cliente.fechar())
+
+    def _remover(self, conexoes: Dict, chave, cliente: ClienteWebSocket):
+        if chave in conexoes:
+            if cliente in conexoes[chave]:
+                conexoes[chave].remove(cliente)
+                print(f"🔌 WebSocket Desconectado [{chave}]")
+
             # Limpa a chave se não houver mais ninguém ouvindo
-            if not self.active_connections[order_id]:
-                del self.active_connections[order_id]
+            if not conexoes[chave]:
+                del conexoes[chave]
+                if conexoes is self.restaurant_connections:
+                    self._agendar_fim_replay(chave)
+
+    def _buffer_replay(self, restaurant_id: str) -> Deque[Tuple[int, str]]:
+        """Buffer do restaurante (criado na conexão da cozinha); cancela a expiração pendente."""
+        expiracao = self._expirar_replay.pop(restaurant_id, None)
+        if expiracao:
+            expiracao.cancel()
+        if restaurant_id not in self.replay:
+            self.replay[restaurant_id] = deque(maxlen=settings.WS_REPLAY_MAX)
+        return self.replay[restaurant_id]
+
+    def _agendar_fim_replay(self, restaurant_id: str):
+        def expirar():
+            self._expirar_replay.pop(restaurant_id, None)
+            if restaurant_id not in self.restaurant_connections:
+                self.replay.pop(restaurant_id, None)
+
+        self._expirar_replay[restaurant_id] = asyncio.get_running_loop().call_later(
+            settings.WS_REPLAY_RETENCAO, expirar
+        )
 
     async def broadcast_to_order(self, order_id: int, data: dict):
-        """Envia dados para todos conectados naquele pedido."""
+        """
+        Codifica o JSON uma única vez e publica; cada worker apenas
+        enfileira nos sockets daquele pedido (não espera a entrega).
+        """
+        await self.backend.publish(f"order:{order_id}", dumps(data))
+
+    async def broadcast_to_restaurant(self, restaurant_id: str, evento: dict):
+        """Numera o evento (seq por restaurante) e publica para as cozinhas."""
+        canal = f"restaurant:{restaurant_id}"
+        evento["seq"] = await self.backend.proximo_seq(canal)
+        await self.backend.publish(canal, dumps(evento))
+
+    async def _entregar_local(self, canal: str, texto: str):
+        """Recebe uma mensagem do backend e enfileira para os sockets locais."""
+        tipo, _, chave = canal.partition(":")
+        if tipo in self._ouvintes:
+            self._ouvintes[tipo](chave, texto)
+            return
+        if tipo == "restaurant":
+            buffer = self.replay.get(chave)
+            if buffer is not None:
+                _guardar_em_ordem(buffer, orjson.loads(texto)["seq"], texto)
+            for cliente in list(self.restaurant_connections.get(chave, [])):
+                cliente.enfileirar(texto)
+            return
+        if tipo != "order":
+            return
+        order_id = int(chave)
+
         if order_id in self.active_connections:
             print(f"📢 Enviando atualização para Pedido #{order_id}")
-            connections = self.active_connections[order_id]
-            
-            for connection in list(connections):
-                try:
-                    await connection.send_json(data)
-                except Exception as e:
-                    print(f"Erro ao enviar via socket: {e}")
-                    self.disconnect(connection, order_id)
+            for cliente in list(self.active_connections[order_id]):
+                cliente.enfileirar(texto)
 
 # Instância única para ser usada em todo o app
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
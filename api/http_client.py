@@ -0,0 +1,64 @@
+import asyncio
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from api.config import settings
+
+# HTTP/2 só se o pacote 'h2' estiver instalado (httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_DISPONIVEL = True
+except ImportError:
+    HTTP2_DISPONIVEL = False
+
+
+class HttpClient:
+    """
+    Cliente HTTP assíncrono único da aplicação (Google, serviço de e-mail...).
+    Mantém as conexões vivas entre chamadas (keep-alive / HTTP/2) e limita
+    quantas requisições simultâneas vão para cada host.
+    """
+
+    def __init__(self):
+        self._cliente: Optional[httpx.AsyncClient] = None
+        self._limite_por_host: Dict[str, asyncio.Semaphore] = {}
+
+    async def iniciar(self):
+        if self._cliente is None:
+            self._cliente = httpx.AsyncClient(
+                http2=HTTP2_DISPONIVEL,
+                timeout=httpx.Timeout(settings.HTTP_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_MAX_CONEXOES,
+                    max_keepalive_connections=settings.HTTP_MAX_CONEXOES,
+                    keepalive_expiry=30,
+                ),
+            )
+
+    async def fechar(self):
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if self._cliente is None:
+            # Uso fora do app (scripts): abre sob demanda
+            await self.iniciar()
+        host = urlsplit(url).netloc
+        limite = self._limite_por_host.get(host)
+        if limite is None:
+            limite = self._limite_por_host[host] = asyncio.Semaphore(settings.HTTP_MAX_CONEXOES_POR_HOST)
+        async with limite:
+            return await self._cliente.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+
+# Instância única, aberta/fechada no lifespan do main.py
+http_client = HttpClient()
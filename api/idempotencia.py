@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+
+from api.config import settings
+from api.redis_client import get_redis
+
+# Registro guardado por chave:
+#   {"estado": "andamento", "impressao": ..., "token": ...}         -> 1ª requisição ainda rodando
+#   {"estado": "pronto", "impressao": ..., "status": 201, "corpo": "...", "media_type": ...}
+Registro = Dict[str, object]
+
+
+class IdempotenciaStore(ABC):
+    """
+    Respostas já dadas, por Idempotency-Key.
+    'reservar' é uma única operação atômica: ou a chave é nossa (None), ou
+    devolve o registro existente (pronto ou ainda em andamento).
+    A reserva leva um token: concluir/liberar/renovar só valem para o dono,
+    então quem perdeu o lease não apaga nem sobrescreve a reserva de outro.
+    """
+
+    @abstractmethod
+    async def reservar(self, chave: str, impressao: str, token: str) -> Optional[Registro]:
+        ...
+
+    @abstractmethod
+    async def concluir(self, chave: str, token: str, registro: Registro) -> bool:
+        ...
+
+    @abstractmethod
+    async def liberar(self, chave: str, token: str) -> bool:
+        """A 1ª requisição falhou: a chave fica livre para uma nova tentativa."""
+
+    @abstractmethod
+    async def renovar(self, chave: str, token: str) -> bool:
+        """Estende o lease da reserva. False = a reserva não é mais nossa."""
+
+    @abstractmethod
+    async def aguardar(self, chave: str, timeout: float) -> Optional[Registro]:
+        """Espera a requisição em andamento terminar. None = liberada ou sumiu."""
+
+
+class MemoryIdempotenciaStore(IdempotenciaStore):
+    """
+    Um único processo: quem chega depois espera num asyncio.Event, sem polling.
+    Cheio, abre espaço só com registros vencidos ou já prontos (os mais
+    antigos primeiro); reserva em andamento nunca é descartada, senão a
+    duplicada dela passaria. Só reservas vivas -> chave nova recebe 503.
+    """
+
+    def __init__(self, max_chaves: int = 100_000):
+        self.max_chaves = max_chaves
+        # chave -> (expira_em, registro)
+        self._registros: "OrderedDict[str, Tuple[float, Registro]]" = OrderedDict()
+        self._eventos: Dict[str, asyncio.Event] = {}
+
+    def _vivo(self, chave: str) -> Optional[Registro]:
+        entrada = self._registros.get(chave)
+        if entrada is None:
+            return None
+        if time.monotonic() >= entrada[0]:
+            del self._registros[chave]
+            return None
+        return entrada[1]
+
+    def _dono(self, chave: str, token: str) -> bool:
+        registro = self._vivo(chave)
+        return registro is not None and registro["estado"] == "andamento" and registro["token"] == token
+
+    def _guardar(self, chave: str, ttl: float, registro: Registro):
+        self._registros[chave] = (time.monotonic() + ttl, registro)
+        self._registros.move_to_end(chave)
+
+    def _abrir_espaco(self) -> bool:
+        if len(self._registros) < self.max_chaves:
+            return True
+        agora = time.monotonic()
+        descartavel = next(
+            (chave for chave, (expira_em, registro) in self._registros.items()
+             if expira_em <= agora or registro["estado"] == "pronto"),
+            None,
+        )
+        if descartavel is None:
+            return False
+        del self._registros[descartavel]
+        return True
+
+    def _acordar(self, chave: str):
+        evento = self._eventos.pop(chave, None)
+        if evento:
+            evento.set()
+
+    async def reservar(self, chave: str, impressao: str, token: str) -> Optional[Registro]:
+        registro = self._vivo(chave)
+        if registro is not None:
+            return registro
+        if not self._abrir_espaco():
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Muitas requisições em andamento. Tente novamente em instantes.",
+            )
+        self._guardar(chave, settings.IDEMPOTENCIA_LEASE, {"estado": "andamento", "impressao": impressao, "token": token})
+        return None
+
+    async def concluir(self, chave: str, token: str, registro: Registro) -> bool:
+        if not self._dono(chave, token):
+            return False
+        self._guardar(chave, settings.IDEMPOTENCIA_TTL, registro)
+        self._acordar(chave)
+        return True
+
+    async def liberar(self, chave: str, token: str) -> bool:
+        if not self._dono(chave, token):
+            return False
+        del self._registros[chave]
+        self._acordar(chave)
+        return True
+
+    async def renovar(self, chave: str, token: str) -> bool:
+        if not self._dono(chave, token):
+            return False
+        self._guardar(chave, settings.IDEMPOTENCIA_LEASE, self._registros[chave][1])
+        return True
+
+    async def aguardar(self, chave: str, timeout: float) -> Optional[Registro]:
+        registro = self._vivo(chave)
+        if registro is None or registro["estado"] != "andamento":
+            return registro
+        evento = self._eventos.setdefault(chave, asyncio.Event())
+        try:
+            await asyncio.wait_for(evento.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._vivo(chave)
+
+
+# SET NX ou, se já existe, o registro atual: uma ida ao Redis por requisição
+_LUA_RESERVAR = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then return nil end
+return redis.call('GET', KEYS[1])
+"""
+
+# Só o dono da reserva (mesmo token, ainda em andamento) conclui, libera ou renova.
+# ARGV[1] = token, ARGV[2] = 'concluir' | 'liberar' | 'renovar', ARGV[3] = TTL, ARGV[4] = registro
+_LUA_SE_DONO = """
+local bruto = redis.call('GET', KEYS[1])
+if not bruto then return 0 end
+local registro = cjson.decode(bruto)
+if registro['estado'] ~= 'andamento' or registro['token'] ~= ARGV[1] then return 0 end
+if ARGV[2] == 'liberar' then
+  redis.call('DEL', KEYS[1])
+elseif ARGV[2] == 'renovar' then
+  redis.call('EXPIRE', KEYS[1], ARGV[3])
+else
+  redis.call('SET', KEYS[1], ARGV[4], 'EX', ARGV[3])
+end
+return 1
+"""
+
+
+class RedisIdempotenciaStore(IdempotenciaStore):
+    """Vários workers: registros no Redis com TTL; a espera é por polling curto."""
+
+    INTERVALO_ESPERA = 0.05
+
+    def __init__(self, redis, prefixo: str = "ifome:idem:"):
+        self.redis = redis
+        self.prefixo = prefixo
+        self._reservar = redis.register_script(_LUA_RESERVAR)
+        self._se_dono = redis.register_script(_LUA_SE_DONO)
+
+    async def reservar(self, chave: str, impressao: str, token: str) -> Optional[Registro]:
+        bruto = await self._reservar(
+            keys=[self.prefixo + chave],
+            args=[
+                json.dumps({"estado": "andamento", "impressao": impressao, "token": token}),
+                settings.IDEMPOTENCIA_LEASE,
+            ],
+        )
+        return json.loads(bruto) if bruto else None
+
+    async def _como_dono(self, chave: str, token: str, acao: str, ttl: int, registro: str = "") -> bool:
+        return bool(await self._se_dono(keys=[self.prefixo + chave], args=[token, acao, ttl, registro]))
+
+    async def concluir(self, chave: str, token: str, registro: Registro) -> bool:
+        return await self._como_dono(chave, token, "concluir", settings.IDEMPOTENCIA_TTL, json.dumps(registro))
+
+    async def liberar(self, chave: str, token: str) -> bool:
+        return await self._como_dono(chave, token, "liberar", 0)
+
+    async def renovar(self, chave: str, token: str) -> bool:
+        return await self._como_dono(chave, token, "renovar", settings.IDEMPOTENCIA_LEASE)
+
+    async def aguardar(self, chave: str, timeout: float) -> Optional[Registro]:
+        limite = time.monotonic() + timeout
+        while True:
+            bruto = await self.redis.get(self.prefixo + chave)
+            registro = json.loads(bruto) if bruto else None
+            if registro is None or registro["estado"] != "andamento" or time.monotonic() >= limite:
+                return registro
+            await asyncio.sleep(self.INTERVALO_ESPERA)
+
+
+def criar_idempotencia_store() -> IdempotenciaStore:
+    """Redis se REDIS_URL estiver configurada, senão memória (um worker só)."""
+    redis = get_redis()
+    if redis is not None:
+        return RedisIdempotenciaStore(redis)
+    if settings.WEB_CONCURRENCY > 1:
+        # Duplicada que cai em outro worker não veria a reserva: dois pedidos
+        raise RuntimeError("Idempotency-Key com mais de um worker exige REDIS_URL (WEB_CONCURRENCY > 1).")
+    return MemoryIdempotenciaStore(max_chaves=settings.IDEMPOTENCIA_MAX_CHAVES)
+
+
+idempotencia_store = criar_idempotencia_store()
+
+
+async def _manter_reserva(chave: str, token: str):
+    """Renova o lease enquanto 'executar' roda: checkout lento não libera a chave para uma duplicada."""
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCIA_LEASE / 3)
+        try:
+            if not await idempotencia_store.renovar(chave, token):
+                print(f"⚠️ Reserva de Idempotency-Key perdida durante a execução: {chave}")
+                return
+        except Exception as e:
+            print(f"⚠️ Erro ao renovar reserva de Idempotency-Key: {e}")
+
+
+def _resposta_guardada(registro: Registro) -> Response:
+    return Response(
+        content=registro["corpo"],
+        status_code=registro["status"],
+        media_type=registro["media_type"],
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def executar_idempotente(
+    chave: Optional[str],
+    escopo: str,
+    corpo: str,
+    executar: Callable[[], Awaitable[Response]],
+) -> Response:
+    """
+    Roda 'executar' uma vez por (escopo, Idempotency-Key).
+    - Retentativa: devolve a resposta guardada, sem rodar nada.
+    - Requisição duplicada simultânea: espera a primeira terminar.
+    - Mesma chave com outro corpo: 422.
+    Só respostas 2xx ficam guardadas; erro libera a chave para nova tentativa.
+    """
+    if not chave:
+        return await executar()
+    if len(chave) > 255:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Idempotency-Key muito longa.")
+
+    chave = f"{escopo}:{chave}"
+    impressao = hashlib.sha256(corpo.encode()).hexdigest()
+    token = uuid.uuid4().hex
+
+    registro = await idempotencia_store.reservar(chave, impressao, token)
+    if registro is not None and registro["estado"] == "andamento" and registro["impressao"] == impressao:
+        registro = await idempotencia_store.aguardar(chave, settings.IDEMPOTENCIA_ESPERA)
+        if registro is None:
+            # A primeira falhou e liberou a chave: esta assume
+            registro = await idempotencia_store.reservar(chave, impressao, token)
+
+    if registro is not None:
+        if registro["impressao"] != impressao:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key já usada com outro conteúdo.",
+            )
+        if registro["estado"] == "andamento":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Requisição com esta Idempotency-Key ainda em processamento.",
+            )
+        return _resposta_guardada(registro)
+
+    renovacao = asyncio.create_task(_manter_reserva(chave, token))
+    try:
+        resposta = await executar()
+    except BaseException:
+        await idempotencia_store.liberar(chave, token)
+        raise
+    finally:
+        renovacao.cancel()
+
+    if 200 <= resposta.status_code < 300:
+        guardada = await idempotencia_store.concluir(chave, token, {
+            "estado": "pronto",
+            "impressao": impressao,
+            "status": resposta.status_code,
+            "corpo": bytes(resposta.body).decode(),
+            "media_type": resposta.media_type,
+        })
+        if not guardada:
+            print(f"⚠️ Resposta não guardada: a reserva da Idempotency-Key expirou antes do fim ({chave})")
+    else:
+        await idempotencia_store.liberar(chave, token)
+    return resposta
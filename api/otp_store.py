@@ -0,0 +1,176 @@
+import enum
+from abc import ABC, abstractmethod
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from api.config import settings
+from api.redis_client import get_redis
+
+
+class ResultadoOtp(str, enum.Enum):
+    OK = "ok"
+    INVALIDO = "invalido"
+    INEXISTENTE = "inexistente"   # nunca pedido ou expirado
+    BLOQUEADO = "bloqueado"       # tentativas esgotadas: código descartado
+
+
+def _hash_codigo(telefone: str, codigo: str) -> str:
+    # Guarda só o HMAC: sem a SECRET_KEY, quem ler o store não consegue
+    # testar os 10^6 códigos possíveis para achar o certo
+    return hmac.new(settings.SECRET_KEY.encode(), f"{telefone}:{codigo}".encode(), hashlib.sha256).hexdigest()
+
+
+class OtpStore(ABC):
+    """
+    Códigos de login por telefone.
+    'emitir' aplica o limite de envios por telefone; 'verificar' conta as
+    tentativas e apaga o código ao acertar ou ao esgotar as tentativas.
+    """
+
+    @abstractmethod
+    async def emitir(self, telefone: str, codigo: str) -> bool:
+        """Guarda o código (substitui o anterior). False = limite de envios atingido."""
+
+    @abstractmethod
+    async def verificar(self, telefone: str, codigo: str) -> ResultadoOtp:
+        ...
+
+
+class MemoryOtpStore(OtpStore):
+    """
+    Um único processo: dicionários com TTL e tamanho máximo. Só entradas
+    vencidas são descartadas; com o store cheio, telefones novos são recusados
+    (descartar as vivas zeraria o limite de envios de quem já está nele).
+    """
+
+    def __init__(self, max_telefones: int = 100_000):
+        self.max_telefones = max_telefones
+        # telefone -> (hash, expira_em, tentativas)
+        self._codigos: "OrderedDict[str, Tuple[str, float, int]]" = OrderedDict()
+        # telefone -> (inicio_janela, envios)
+        self._envios: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+
+    def _descartar_vencidos(self, agora: float):
+        # Do mais antigo para o mais novo; para no primeiro ainda válido
+        while self._envios:
+            inicio, _ = next(iter(self._envios.values()))
+            if agora - inicio < settings.OTP_JANELA_ENVIOS:
+                break
+            self._envios.popitem(last=False)
+        while self._codigos:
+            _, expira_em, _ = next(iter(self._codigos.values()))
+            if expira_em > agora:
+                break
+            self._codigos.popitem(last=False)
+
+    # Sem 'await' no meio: cada operação é atômica no event loop
+    async def emitir(self, telefone: str, codigo: str) -> bool:
+        agora = time.monotonic()
+        if telefone not in self._envios and len(self._envios) >= self.max_telefones:
+            self._descartar_vencidos(agora)
+            if len(self._envios) >= self.max_telefones:
+                return False
+        inicio, envios = self._envios.get(telefone, (agora, 0))
+        if agora - inicio >= settings.OTP_JANELA_ENVIOS:
+            # Janela nova: vai para o fim (a ordem do dict é a do início da janela)
+            self._envios.pop(telefone, None)
+            inicio, envios = agora, 0
+        if envios >= settings.OTP_MAX_ENVIOS:
+            return False
+        self._envios[telefone] = (inicio, envios + 1)
+
+        # Todo código tem o mesmo TTL: a ordem do dict é a da expiração
+        self._codigos.pop(telefone, None)
+        self._codigos[telefone] = (_hash_codigo(telefone, codigo), agora + settings.OTP_TTL, 0)
+        return True
+
+    async def verificar(self, telefone: str, codigo: str) -> ResultadoOtp:
+        entrada = self._codigos.get(telefone)
+        if entrada is None:
+            return ResultadoOtp.INEXISTENTE
+        esperado, expira_em, tentativas = entrada
+        if time.monotonic() >= expira_em:
+            del self._codigos[telefone]
+            return ResultadoOtp.INEXISTENTE
+        if hmac.compare_digest(esperado, _hash_codigo(telefone, codigo)):
+            del self._codigos[telefone]
+            return ResultadoOtp.OK
+        tentativas += 1
+        if tentativas >= settings.OTP_MAX_TENTATIVAS:
+            del self._codigos[telefone]
+            return ResultadoOtp.BLOQUEADO
+        self._codigos[telefone] = (esperado, expira_em, tentativas)
+        return ResultadoOtp.INVALIDO
+
+
+# Scripts Lua: cada operação roda inteira dentro do Redis (atômica entre workers)
+_LUA_EMITIR = """
+local envios = redis.call('INCR', KEYS[2])
+if envios == 1 then redis.call('EXPIRE', KEYS[2], ARGV[3]) end
+if envios > tonumber(ARGV[4]) then return 0 end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'codigo', ARGV[1], 'tentativas', 0)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+_LUA_VERIFICAR = """
+local esperado = redis.call('HGET', KEYS[1], 'codigo')
+if not esperado then return 0 end
+if esperado == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+local tentativas = redis.call('HINCRBY', KEYS[1], 'tentativas', 1)
+if tentativas >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+    return 3
+end
+return 2
+"""
+
+_RESULTADOS_REDIS: Dict[int, ResultadoOtp] = {
+    0: ResultadoOtp.INEXISTENTE,
+    1: ResultadoOtp.OK,
+    2: ResultadoOtp.INVALIDO,
+    3: ResultadoOtp.BLOQUEADO,
+}
+
+
+class RedisOtpStore(OtpStore):
+    """Vários workers: códigos e contadores no Redis, expirados pelo próprio Redis."""
+
+    def __init__(self, redis, prefixo: str = "ifome:otp:"):
+        self.redis = redis
+        self.prefixo = prefixo
+        self._emitir = redis.register_script(_LUA_EMITIR)
+        self._verificar = redis.register_script(_LUA_VERIFICAR)
+
+    async def emitir(self, telefone: str, codigo: str) -> bool:
+        resultado = await self._emitir(
+            keys=[f"{self.prefixo}codigo:{telefone}", f"{self.prefixo}envios:{telefone}"],
+            args=[_hash_codigo(telefone, codigo), settings.OTP_TTL,
+                  settings.OTP_JANELA_ENVIOS, settings.OTP_MAX_ENVIOS],
+        )
+        return int(resultado) == 1
+
+    async def verificar(self, telefone: str, codigo: str) -> ResultadoOtp:
+        resultado = await self._verificar(
+            keys=[f"{self.prefixo}codigo:{telefone}"],
+            args=[_hash_codigo(telefone, codigo), settings.OTP_MAX_TENTATIVAS],
+        )
+        return _RESULTADOS_REDIS[int(resultado)]
+
+
+def criar_otp_store() -> OtpStore:
+    """Redis se REDIS_URL estiver configurada, senão memória (um worker só)."""
+    redis = get_redis()
+    if redis is not None:
+        return RedisOtpStore(redis)
+    return MemoryOtpStore(max_telefones=settings.OTP_MAX_TELEFONES)
+
+
+otp_store = criar_otp_store()
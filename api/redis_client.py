@@ -0,0 +1,26 @@
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from api.config import settings
+
+# Cliente único por processo. Só é criado se REDIS_URL estiver configurada;
+# sem Redis, quem chama get_redis() cai na implementação em memória.
+_cliente: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> Optional[aioredis.Redis]:
+    """Retorna o cliente Redis compartilhado, ou None se REDIS_URL não foi definida."""
+    global _cliente
+    if not settings.REDIS_URL:
+        return None
+    if _cliente is None:
+        _cliente = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _cliente
+
+
+async def fechar_redis():
+    global _cliente
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.database import get_db
-from src.models.avaliacao import Avaliacao
+from src.models.avaliacao import Avaliacao, AvaliacaoRestaurante
 from src.models.pedidos import OrderModel
-from src import schemas
+from src import schemas, vendas_rollup
 
 router = APIRouter(
     prefix="/api/avaliacoes",
@@ -12,17 +13,17 @@ router = APIRouter(
 
 # ROTA 1: CRIAR AVALIAÇÃO (A que você já tinha)
 @router.post("/", response_model=schemas.AvaliacaoResponse, status_code=status.HTTP_201_CREATED)
-def criar_avaliacao(
+async def criar_avaliacao(
     avaliacao: schemas.AvaliacaoCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # 1. Verifica se o pedido existe
-    pedido = db.query(OrderModel).filter(OrderModel.id == avaliacao.pedido_id).first()
+    pedido = await db.scalar(select(OrderModel).where(OrderModel.id == avaliacao.pedido_id))
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido não encontrado.")
 
     # 2. Verifica se já foi avaliado
-    ja_avaliado = db.query(Avaliacao).filter(Avaliacao.pedido_id == avaliacao.pedido_id).first()
+    ja_avaliado = await db.scalar(select(Avaliacao).where(Avaliacao.pedido_id == avaliacao.pedido_id))
     if ja_avaliado:
         raise HTTPException(status_code=400, detail="Este pedido já foi avaliado.")
 
@@ -34,24 +35,43 @@ def criar_avaliacao(
     )
     
     db.add(nova_avaliacao)
-    db.commit()
-    db.refresh(nova_avaliacao)
+    await vendas_rollup.registrar_avaliacao(db, pedido, avaliacao.nota)
+    await db.commit()
+    await db.refresh(nova_avaliacao)
     
     return nova_avaliacao
 
 
 # ROTA 2: CONSULTAR SE JÁ EXISTE (Nova - Necessária para o Front-end)
 @router.get("/pedido/{pedido_id}", response_model=schemas.AvaliacaoResponse)
-def obter_avaliacao_por_pedido(
+async def obter_avaliacao_por_pedido(
     pedido_id: int, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Busca a avaliação filtrando pelo ID do pedido
-    avaliacao = db.query(Avaliacao).filter(Avaliacao.pedido_id == pedido_id).first()
+    avaliacao = await db.scalar(select(Avaliacao).where(Avaliacao.pedido_id == pedido_id))
     
     # Se não encontrar, retorna erro 404
     # O Front-end usa esse erro 404 para saber que PODE exibir o formulário
     if not avaliacao:
         raise HTTPException(status_code=404, detail="Avaliação não encontrada para este pedido.")
         
-    return avaliacao
\ No newline at end of file
+    return avaliacao
+
+
+# ROTA 3: NOTA AGREGADA DO RESTAURANTE (contagem, média e histograma 1-5)
+@router.get("/restaurante/{restaurant_id}", response_model=schemas.AvaliacaoRestauranteResponse)
+async def obter_avaliacao_restaurante(
+    restaurant_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    # Uma leitura por chave primária: o agregado é mantido a cada avaliação
+    agregado = await db.get(AvaliacaoRestaurante, restaurant_id)
+    if not agregado:
+        # Restaurante ainda sem avaliações
+        agregado = AvaliacaoRestaurante(
+            restaurant_id=restaurant_id, n_avaliacoes=0, soma_notas=0,
+            notas_1=0, notas_2=0, notas_3=0, notas_4=0, notas_5=0,
+        )
+    return agregado
+
@@ -1,19 +1,26 @@
 import os
 import re
 import asyncio 
-import requests 
-from typing import Optional, Dict, Any
+import httpx
+import unicodedata
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Importar dependências do Firebase Admin
 from firebase_admin import credentials, initialize_app, firestore, _apps
 
 # --- Nossas Importações Locais Corrigidas ---
-from src.database import get_db
+from api.http_client import http_client
+from src.cache import TTLCache
+from src.database import get_db, dialect_insert
 from src.models.endereco import Endereco  # <-- IMPORTA O MODELO
+from src.models.geocode_cache import GeocodeCache
 from src import schemas                     # <-- IMPORTA OS SCHEMAS
+from src.security import get_current_user, exigir_mesmo_usuario
 
 
 # --- Variáveis de Ambiente ---
@@ -58,8 +65,11 @@ router = APIRouter(
 )
 
 # --- FUNÇÃO DE GEOCODIFICAÇÃO AUTOMÁTICA ---
-def geocode_address(endereco_completo: str) -> Dict[str, float]:
-    """Converte um endereço de texto em Lat/Lng usando o Google Geocoding API."""
+async def consultar_geocoding(endereco_completo: str) -> Tuple[Dict[str, float], Dict[str, Any]]:
+    """
+    Converte um endereço de texto em Lat/Lng usando o Google Geocoding API.
+    Retorna as coordenadas e o primeiro resultado bruto do provedor.
+    """
     if not GOOGLE_API_KEY:
         raise HTTPException(status_code=500, detail="Chave da Google Places API não configurada no servidor.")
         
@@ -70,22 +80,78 @@ def geocode_address(endereco_completo: str) -> Dict[str, float]:
     }
     
     try:
-        response = requests.get(url, params=params)
+        response = await http_client.get(url, params=params)
         response.raise_for_status()
         data = response.json()
         
         if data['status'] == 'OK' and len(data['results']) > 0:
-            location = data['results'][0]['geometry']['location']
-            return {"lat": location['lat'], "lng": location['lng']}
+            resultado = data['results'][0]
+            location = resultado['geometry']['location']
+            return {"lat": location['lat'], "lng": location['lng']}, resultado
         else:
             print(f"Geocodificação falhou: {data.get('error_message', data['status'])}")
             raise HTTPException(status_code=400, detail="Não foi possível encontrar as coordenadas para o endereço fornecido.")
             
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Erro de conexão com Geocoding API: {e}")
         raise HTTPException(status_code=503, detail="Serviço de geocodificação indisponível.")
 
 
+# --- CACHE DE GEOCODIFICAÇÃO ---
+# Memória (por worker) na frente da tabela geocode_cache (compartilhada).
+geocode_memoria = TTLCache("geocode", ttl=6 * 60 * 60, max_itens=20000)
+
+
+def chave_endereco(cep: str, rua: str, numero: str) -> str:
+    """Normaliza CEP + rua + número: só dígitos no CEP, sem acento/pontuação, minúsculo."""
+    def normalizar(texto: str) -> str:
+        sem_acento = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+        return " ".join(re.sub(r"[^a-z0-9 ]", " ", sem_acento.lower()).split())
+
+    return f"{re.sub(r'[^0-9]', '', cep or '')}|{normalizar(rua)}|{normalizar(numero)}"
+
+
+async def geocode_address(db: AsyncSession, endereco: schemas.EnderecoCreate) -> Dict[str, float]:
+    """Geocodifica usando o cache (memória -> tabela) e só consulta o Google na falta."""
+    chave = chave_endereco(endereco.cep, endereco.rua, endereco.numero)
+
+    coordenadas = geocode_memoria.get(chave)
+    if coordenadas:
+        return coordenadas
+
+    registro = await db.scalar(select(GeocodeCache).where(GeocodeCache.chave == chave))
+    if registro:
+        coordenadas = {"lat": registro.latitude, "lng": registro.longitude}
+        geocode_memoria.set(chave, coordenadas)
+        return coordenadas
+
+    endereco_completo = (
+        f"{endereco.rua}, {endereco.numero}, {endereco.bairro}, "
+        f"{endereco.cidade}, {endereco.estado}, {endereco.cep}"
+    )
+    coordenadas, resultado = await consultar_geocoding(endereco_completo)
+
+    # ON CONFLICT DO NOTHING: dois cadastros simultâneos do mesmo endereço
+    # não derrubam a transação. O commit acontece junto com o endereço.
+    await db.execute(
+        dialect_insert(db, GeocodeCache).values(
+            chave=chave,
+            endereco_consultado=endereco_completo,
+            latitude=coordenadas['lat'],
+            longitude=coordenadas['lng'],
+            provedor="google",
+            place_id=resultado.get('place_id'),
+            endereco_formatado=resultado.get('formatted_address'),
+            tipo_localizacao=resultado.get('geometry', {}).get('location_type'),
+            resposta=resultado,
+            criado_em=datetime.utcnow(),
+            validado_em=datetime.utcnow(),
+        ).on_conflict_do_nothing(index_elements=["chave"])
+    )
+    geocode_memoria.set(chave, coordenadas)
+    return coordenadas
+
+
 # --- Função auxiliar para salvar no Firestore ---
 async def save_to_firestore(uid: str, data: Dict[str, Any]):
     """Salva as coordenadas no Firestore para o Front-end."""
@@ -108,19 +174,16 @@ async def save_to_firestore(uid: str, data: Dict[str, Any]):
 async def cadastrar_endereco(
     user_id: int, # <-- CORREÇÃO: Mudado de str para int
     endereco: schemas.EnderecoCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: schemas.UsuarioToken = Depends(get_current_user)
 ):
     """Cadastra um endereço, geocodifica (preenche lat/lng automaticamente) e salva no DB/Firestore."""
+    exigir_mesmo_usuario(user_id, usuario_atual)
     
-    # 1. Monta o endereço completo para Geocodificação
-    endereco_completo = (
-        f"{endereco.rua}, {endereco.numero}, {endereco.bairro}, "
-        f"{endereco.cidade}, {endereco.estado}, {endereco.cep}"
-    )
-    
-    # 2. Geocodifica o endereço (converte para Lat/Lng)
+    # 1 e 2. Geocodifica o endereço (converte para Lat/Lng), usando o cache
+    # quando o mesmo CEP + rua + número já foi consultado antes
     try:
-        coordenadas = geocode_address(endereco_completo)
+        coordenadas = await geocode_address(db, endereco)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -128,7 +191,7 @@ async def cadastrar_endereco(
 
     # 3. Verifica se já existe (SQLAlchemy)
     # (A query agora compara int com int, o que está correto)
-    existente = db.query(Endereco).filter(Endereco.user_id == user_id).first() 
+    existente = await db.scalar(select(Endereco).where(Endereco.user_id == user_id)) 
     
     # 4. Cria o objeto de dados final
     endereco_data = endereco.model_dump()
@@ -139,15 +202,15 @@ async def cadastrar_endereco(
         # Atualiza o endereço existente
         for key, value in endereco_data.items():
             setattr(existente, key, value)
-        db.commit()
-        db.refresh(existente)
+        await db.commit()
+        await db.refresh(existente)
         mensagem = "Endereço atualizado com sucesso!"
     else:
         # Cadastra novo endereço
         novo_endereco = Endereco(user_id=user_id, **endereco_data)
         db.add(novo_endereco)
-        db.commit()
-        db.refresh(novo_endereco)
+        await db.commit()
+        await db.refresh(novo_endereco)
         mensagem = "Endereço cadastrado com sucesso!"
 
     # 5. Sincroniza a localização para o Front-end (Firestore)
@@ -167,14 +230,16 @@ async def cadastrar_endereco(
 
 # --- ROTA DE CONSULTA ---
 @router.get("/{user_id}", response_model=schemas.EnderecoResponse) 
-def consultar_endereco(
+async def consultar_endereco(
     user_id: int, # <-- CORREÇÃO: Mudado de str para int
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: schemas.UsuarioToken = Depends(get_current_user)
 ):
     """Consulta endereço de um usuário específico, retornando também lat/lng."""
+    exigir_mesmo_usuario(user_id, usuario_atual)
     
     # Busca no banco usando o MODELO
-    endereco_db = db.query(Endereco).filter(Endereco.user_id == user_id).first() 
+    endereco_db = await db.scalar(select(Endereco).where(Endereco.user_id == user_id)) 
     
     if not endereco_db:
         raise HTTPException(status_code=404, detail="Usuário ainda não possui endereço cadastrado.")
@@ -1,14 +1,21 @@
 import os
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
 from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, tuple_, Column, Integer, String, Float, ForeignKey, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional, Tuple
 
-from src.database import get_db, Base 
+from api.config import settings
+from api.sacola_store import sacola_store, Linhas
+from src.database import get_db, Base, dialect_insert, SessionLocal
+from src.schemas import UsuarioToken
+from src.security import get_current_user, exigir_mesmo_usuario
 
 # --- 1. Modelo de Entrada Pydantic ---
 class SacolaItem(BaseModel):
@@ -37,6 +44,17 @@ class SacolaItemResponse(BaseModel):
 class SacolaItemUpdate(BaseModel):
     quantidade: int
 
+# --- Esquemas da Sacola Inteira (PUT em lote) ---
+class SacolaBulk(BaseModel):
+    itens: List[SacolaItem]
+    # substituir: a sacola passa a ser exatamente 'itens' (quantidade <= 0 remove)
+    # mesclar: soma as quantidades às que já estão na sacola
+    modo: Literal["substituir", "mesclar"] = "substituir"
+
+class SacolaBulkResponse(BaseModel):
+    itens: List[SacolaItemResponse]
+    total: float
+
 # --- 3. Modelo de Item da Sacola (SQLAlchemy / Tabela) ---
 class SacolaItemModel(Base):
     __tablename__ = "sacola_items"
@@ -51,91 +69,356 @@ class SacolaItemModel(Base):
     observacao = Column(String, nullable=True)
     criado_em = Column(DateTime, default=datetime.utcnow)
 
+    # Uma linha por item: permite o UPSERT (ON CONFLICT). Mesmo nome da migração 3.
+    __table_args__ = (
+        Index("uq_sacola_user_restaurante_item", "user_id", "restaurant_id", "item_id", unique=True),
+    )
+
 # --- ROTEADOR ---
 router = APIRouter(
     prefix="/api/sacola", 
     tags=["Sacola"]
 )
 
+CHAVE_SACOLA = ["user_id", "restaurant_id", "item_id"]
+
+
+def _upsert_sacola(db: AsyncSession, linhas: List[dict], somar: bool):
+    """INSERT ... ON CONFLICT (user_id, restaurant_id, item_id) DO UPDATE, num único comando."""
+    stmt = dialect_insert(db, SacolaItemModel).values(linhas)
+    return stmt.on_conflict_do_update(
+        index_elements=CHAVE_SACOLA,
+        set_={
+            "quantidade": (SacolaItemModel.quantidade + stmt.excluded.quantidade) if somar else stmt.excluded.quantidade,
+            "nome": stmt.excluded.nome,
+            "preco_unitario": stmt.excluded.preco_unitario,
+            "observacao": stmt.excluded.observacao,
+        },
+    )
+
+
+def _linha_sacola(user_id: str, item: SacolaItem) -> dict:
+    return {
+        "user_id": user_id,
+        "restaurant_id": item.restaurant_id,
+        "item_id": item.item_id,
+        "nome": item.nome,
+        "quantidade": item.quantidade,
+        "preco_unitario": item.preco,
+        "observacao": item.observacao,
+        "criado_em": datetime.utcnow(),
+    }
+
+# --- WRITE-BEHIND DA SACOLA ---
+# Sacolas ativas ficam no sacola_store (memória ou Redis). Quantidade e
+# remoção só mexem no store e marcam a sacola como suja; o SacolaFlusher
+# grava as sujas no banco em lote a cada SACOLA_FLUSH_INTERVALO segundos.
+# Linhas novas vão direto ao banco (precisam do id do registro).
+
+def _linha_do_modelo(item: SacolaItemModel) -> dict:
+    return {
+        "id": item.id,
+        "user_id": item.user_id,
+        "item_id": item.item_id,
+        "restaurant_id": item.restaurant_id,
+        "quantidade": item.quantidade,
+        "observacao": item.observacao,
+        "nome": item.nome,
+        "preco_unitario": item.preco_unitario,
+    }
+
+
+async def _carregar_sacola(db: AsyncSession, user_id: str) -> Linhas:
+    """Do store; na falta, lê do banco uma vez e guarda."""
+    linhas = await sacola_store.linhas(user_id)
+    if linhas is None:
+        itens = (await db.scalars(
+            select(SacolaItemModel).where(SacolaItemModel.user_id == user_id)
+        )).all()
+        linhas = {item.id: _linha_do_modelo(item) for item in itens}
+        await sacola_store.definir_linhas(user_id, linhas)
+    return linhas
+
+
+def _ativas(linhas: Linhas) -> List[dict]:
+    """Sem as lápides (quantidade 0 = removida, aguardando o flush)."""
+    return [linha for _, linha in sorted(linhas.items()) if linha["quantidade"] > 0]
+
+
+def _linha_ativa(linhas: Linhas, sacola_item_id: int) -> dict:
+    linha = linhas.get(sacola_item_id)
+    if linha is None or linha["quantidade"] <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Item não encontrado na sacola."
+        )
+    return linha
+
+
+async def _persistir(sacolas: List[Tuple[str, Linhas]]):
+    """
+    Um UPSERT em lote (pela chave user/restaurante/item) + um DELETE das
+    lápides, numa transação. UPSERT e não UPDATE por id: uma linha removida
+    e readicionada enquanto o DELETE dela ia para o banco volta a existir
+    (com o mesmo id) em vez de sumir sem erro.
+    """
+    gravar = []
+    lapides: Dict[str, List[int]] = {}
+    for user_id, linhas in sacolas:
+        for linha_id, linha in linhas.items():
+            if linha["quantidade"] > 0:
+                gravar.append({
+                    "id": linha_id,
+                    "user_id": user_id,
+                    "restaurant_id": linha["restaurant_id"],
+                    "item_id": linha["item_id"],
+                    "nome": linha["nome"],
+                    "quantidade": linha["quantidade"],
+                    "preco_unitario": linha["preco_unitario"],
+                    "observacao": linha["observacao"],
+                })
+            else:
+                lapides.setdefault(user_id, []).append(linha_id)
+
+    async with SessionLocal() as db:
+        if gravar:
+            await db.execute(_upsert_sacola(db, gravar, somar=False))
+        ids_removidos = [linha_id for ids in lapides.values() for linha_id in ids]
+        if ids_removidos:
+            await db.execute(delete(SacolaItemModel).where(SacolaItemModel.id.in_(ids_removidos)))
+        await db.commit()
+
+    for user_id, ids in lapides.items():
+        await sacola_store.remover_lapides(user_id, ids)
+
+
+async def descarregar_sacolas(limite: int) -> int:
+    """
+    Grava até 'limite' sacolas sujas. Se falhar, elas voltam para a fila.
+    Cada sacola fica travada até o commit: um checkout dela espera este
+    flush terminar em vez de ler o banco sem ele.
+    """
+    token = uuid.uuid4().hex
+    sujas = await sacola_store.pegar_sujas(limite, token)
+    if not sujas:
+        return 0
+    try:
+        await _persistir(sujas)
+    except Exception:
+        for user_id, _ in sujas:
+            await sacola_store.marcar_suja(user_id)
+        raise
+    finally:
+        for user_id, _ in sujas:
+            await sacola_store.destravar(user_id, token)
+    return len(sujas)
+
+
+async def descarregar_usuario(user_id: str):
+    """Flush imediato de uma sacola. Só com a trava do usuário (sacola_travada)."""
+    # Lê e tira das sujas num passo só: a sacola não pode sair do store entre os dois
+    linhas = await sacola_store.pegar_suja(user_id)
+    if not linhas:
+        return
+    try:
+        await _persistir([(user_id, linhas)])
+    except Exception:
+        await sacola_store.marcar_suja(user_id)
+        raise
+
+
+@asynccontextmanager
+async def sacola_travada(user_id: str):
+    """
+    Para quem lê/escreve a sacola direto no banco (checkout, PUT em lote):
+    espera um flush em andamento desta sacola, grava as pendências e segura
+    a trava até o fim do bloco, para o flusher não gravar por cima uma cópia
+    tirada antes (por exemplo, devolvendo à sacola as linhas recém-compradas).
+    """
+    token = uuid.uuid4().hex
+    if not await sacola_store.travar(user_id, token, settings.SACOLA_TRAVA_ESPERA):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="A sacola está sendo atualizada. Tente novamente.",
+        )
+    try:
+        await descarregar_usuario(user_id)
+        yield
+    finally:
+        await sacola_store.destravar(user_id, token)
+
+
+class SacolaFlusher:
+    def __init__(self):
+        self._tarefa: Optional[asyncio.Task] = None
+
+    def iniciar(self):
+        if self._tarefa is None:
+            self._tarefa = asyncio.create_task(self._loop())
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        # Último flush antes de desligar
+        while await descarregar_sacolas(settings.SACOLA_FLUSH_LOTE):
+            pass
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(settings.SACOLA_FLUSH_INTERVALO)
+            try:
+                while await descarregar_sacolas(settings.SACOLA_FLUSH_LOTE) >= settings.SACOLA_FLUSH_LOTE:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Erro ao gravar sacolas no banco: {e}")
+
+
+# Instância única, iniciada/parada no lifespan do main.py
+sacola_flusher = SacolaFlusher()
+
 # --- ROTA: ADICIONAR ITEM À SACOLA (POST) ---
 @router.post("/{user_id}", response_model=SacolaItemResponse, status_code=status.HTTP_200_OK)
-def add_item_to_sacola(
+async def add_item_to_sacola(
     user_id: str, 
     item: SacolaItem,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: UsuarioToken = Depends(get_current_user)
 ):
     """
     Adiciona um item à sacola. 
     Se o item já existir, atualiza a quantidade.
     """
+    exigir_mesmo_usuario(user_id, usuario_atual)
     
-    # --- LÓGICA DE CORREÇÃO ---
-    # 1. Procura se o item JÁ ESTÁ na sacola do usuário
-    item_existente = db.query(SacolaItemModel).filter(
-        SacolaItemModel.user_id == user_id,
-        SacolaItemModel.item_id == item.item_id,
-        SacolaItemModel.restaurant_id == item.restaurant_id
-    ).first()
-    
-    try:
-        if item_existente:
-            # 2. Se JÁ EXISTE, apenas soma a quantidade
-            item_existente.quantidade += item.quantidade
-            db.commit()
-            db.refresh(item_existente)
-            return item_existente
-        
-        else:
-            # 3. Se NÃO EXISTE, cria um novo
-            novo_item_sacola = SacolaItemModel(
-                user_id=user_id,
-                restaurant_id=item.restaurant_id,
-                item_id=item.item_id,
-                nome=item.nome,
-                quantidade=item.quantidade,
-                preco_unitario=item.preco,
-                observacao=item.observacao,
-                criado_em=datetime.utcnow()
-            )
-            db.add(novo_item_sacola)
-            db.commit()
-            db.refresh(novo_item_sacola)
-            return novo_item_sacola
+    linhas = await _carregar_sacola(db, user_id)
+    chave = (item.restaurant_id, item.item_id)
+    existente = next(
+        (l for l in linhas.values() if (l["restaurant_id"], l["item_id"]) == chave), None
+    )
+
+    # 1. Já está na sacola: só soma no store (o banco recebe no próximo flush)
+    if existente and existente["quantidade"] > 0:
+        linha = await sacola_store.somar_quantidade(user_id, existente["id"], item.quantidade)
+        if linha:
+            return linha
+
+    # 2. Foi removida e ainda não saiu do banco: revive a linha no store
+    if existente:
+        linha = {**existente, "quantidade": item.quantidade}
+        await sacola_store.gravar_linha(user_id, linha)
+        return linha
 
+    # 3. Linha nova: UPSERT atômico no banco (precisa do id). Dois toques
+    # simultâneos somam na mesma linha (índice único user/restaurante/item)
+    try:
+        item_salvo = (await db.scalars(
+            _upsert_sacola(db, [_linha_sacola(user_id, item)], somar=True).returning(SacolaItemModel),
+            execution_options={"populate_existing": True},
+        )).one()
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Erro ao salvar item na sacola: {e}")
         raise HTTPException(status_code=500, detail="Erro interno ao adicionar item à sacola.")
 
+    linha = _linha_do_modelo(item_salvo)
+    await sacola_store.gravar_linha(user_id, linha, suja=False)
+    return linha
+
+# --- ROTA: SALVAR A SACOLA INTEIRA (PUT EM LOTE) ---
+@router.put("/{user_id}", response_model=SacolaBulkResponse)
+async def put_sacola(
+    user_id: str,
+    sacola: SacolaBulk,
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: UsuarioToken = Depends(get_current_user)
+):
+    """
+    Substitui (ou mescla) a sacola inteira numa única requisição e transação:
+    um DELETE do que saiu, um UPSERT de todas as linhas e a leitura final.
+    Retorna os itens e o total recalculado.
+    """
+    exigir_mesmo_usuario(user_id, usuario_atual)
+
+    # Junta itens repetidos no corpo: o mesmo registro duas vezes no mesmo
+    # UPSERT é erro no Postgres ("cannot affect row a second time")
+    por_chave: Dict[Tuple[str, int], SacolaItem] = {}
+    for item in sacola.itens:
+        chave = (item.restaurant_id, item.item_id)
+        if chave in por_chave and sacola.modo == "mesclar":
+            item = item.model_copy(update={"quantidade": por_chave[chave].quantidade + item.quantidade})
+        por_chave[chave] = item
+
+    manter = {chave: item for chave, item in por_chave.items() if item.quantidade > 0}
+
+    # Pendências do write-behind vão antes (o lote parte do estado real do banco),
+    # e o flusher não grava esta sacola até o store receber o resultado
+    async with sacola_travada(user_id):
+        try:
+            if sacola.modo == "substituir":
+                remover = delete(SacolaItemModel).where(SacolaItemModel.user_id == user_id)
+                if manter:
+                    remover = remover.where(
+                        tuple_(SacolaItemModel.restaurant_id, SacolaItemModel.item_id).not_in(list(manter))
+                    )
+                await db.execute(remover)
+
+            if manter:
+                await db.execute(_upsert_sacola(
+                    db,
+                    [_linha_sacola(user_id, item) for item in manter.values()],
+                    somar=sacola.modo == "mesclar",
+                ))
+
+            itens = (await db.scalars(
+                select(SacolaItemModel).where(SacolaItemModel.user_id == user_id).order_by(SacolaItemModel.id)
+            )).all()
+            await db.commit()
+
+        except Exception as e:
+            await db.rollback()
+            print(f"Erro ao salvar a sacola: {e}")
+            raise HTTPException(status_code=500, detail="Erro interno ao salvar a sacola.")
+
+        await sacola_store.definir_linhas(user_id, {i.id: _linha_do_modelo(i) for i in itens})
+
+    total = sum(i.quantidade * i.preco_unitario for i in itens)
+    return SacolaBulkResponse(
+        itens=[SacolaItemResponse.model_validate(i) for i in itens],
+        total=round(total, 2),
+    )
+
 # --- ROTA: CONSULTAR SACOLA (GET) ---
 @router.get("/{user_id}", response_model=List[SacolaItemResponse])
-def get_sacola(user_id: str, db: Session = Depends(get_db)):
-    """Consulta todos os itens na sacola de um usuário."""
-    itens = db.query(SacolaItemModel).filter(SacolaItemModel.user_id == user_id).all()
-    if not itens:
-        return [] 
-    return itens
+async def get_sacola(
+    user_id: str,
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: UsuarioToken = Depends(get_current_user)
+):
+    """Consulta todos os itens na sacola de um usuário (servido do sacola_store)."""
+    exigir_mesmo_usuario(user_id, usuario_atual)
+    return _ativas(await _carregar_sacola(db, user_id))
 
 # --- ROTA: ATUALIZAR QUANTIDADE (PUT) ---
 @router.put("/{user_id}/{sacola_item_id}", response_model=SacolaItemResponse)
-def update_item_quantity(
+async def update_item_quantity(
     user_id: str, 
     sacola_item_id: int,
     update_data: SacolaItemUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: UsuarioToken = Depends(get_current_user)
 ):
-    """Atualiza a quantidade de um item específico na sacola."""
-    
-    db_item = db.query(SacolaItemModel).filter(
-        SacolaItemModel.id == sacola_item_id,
-        SacolaItemModel.user_id == user_id
-    ).first()
+    """Atualiza a quantidade de um item específico na sacola (gravada no próximo flush)."""
+    exigir_mesmo_usuario(user_id, usuario_atual)
 
-    if db_item is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Item não encontrado na sacola."
-        )
+    linha = _linha_ativa(await _carregar_sacola(db, user_id), sacola_item_id)
 
     if update_data.quantidade <= 0:
         raise HTTPException(
@@ -143,47 +426,23 @@ def update_item_quantity(
             detail="A quantidade deve ser maior que zero. Use DELETE para remover."
         )
 
-    try:
-        db_item.quantidade = update_data.quantidade
-        db.commit()
-        db.refresh(db_item)
-        return db_item
-    
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-            detail="Erro interno ao atualizar item."
-        )
+    linha = {**linha, "quantidade": update_data.quantidade}
+    await sacola_store.gravar_linha(user_id, linha)
+    return linha
 
 # --- ROTA: DELETAR ITEM DA SACOLA (DELETE) ---
 @router.delete("/{user_id}/{sacola_item_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_item_from_sacola(
+async def delete_item_from_sacola(
     user_id: str, 
     sacola_item_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: UsuarioToken = Depends(get_current_user)
 ):
     """Remove um item específico da sacola do usuário pelo ID do registro."""
-    
-    db_item = db.query(SacolaItemModel).filter(
-        SacolaItemModel.id == sacola_item_id,
-        SacolaItemModel.user_id == user_id
-    ).first()
+    exigir_mesmo_usuario(user_id, usuario_atual)
 
-    if db_item is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Item não encontrado na sacola."
-        )
+    linha = _linha_ativa(await _carregar_sacola(db, user_id), sacola_item_id)
 
-    try:
-        db.delete(db_item)
-        db.commit()
-        return {"detail": "Item removido com sucesso."}
-    
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-            detail="Erro interno ao remover item."
-        )
\ No newline at end of file
+    # Vira lápide (quantidade 0); o DELETE no banco sai no próximo flush
+    await sacola_store.gravar_linha(user_id, {**linha, "quantidade": 0})
+    return {"detail": "Item removido com sucesso."}
@@ -1,13 +1,18 @@
 import os
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+import hashlib
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 # --- Nossas Importações Locais Corrigidas ---
 from src.database import get_db
 from src.models.items import Item  # <-- CORRETO
-from src import schemas          # <-- CORRETO
+from src import schemas, serializers  # <-- CORRETO
+from src.cache import TTLCache
+from api.config import settings
+from api.connection_manager import manager
 
 # --- ROTEADOR ---
 router = APIRouter(
@@ -16,10 +21,42 @@ router = APIRouter(
     tags=["Consulta de Itens"]
 )
 
+# --- CACHE DO CARDÁPIO ---
+# restaurant_id -> (etag, corpo JSON já serializado). Uma visita repetida
+# não consulta o banco nem serializa de novo; com If-None-Match nem o corpo vai.
+cardapio_cache = TTLCache(
+    "cardapio",
+    ttl=settings.CARDAPIO_CACHE_TTL,
+    max_itens=settings.CARDAPIO_CACHE_MAX_ITENS,
+    max_bytes=settings.CARDAPIO_CACHE_MAX_BYTES,
+    tamanho=lambda valor: len(valor[1]),
+)
+
+
+async def invalidar_cardapio(restaurant_id: str):
+    """Chamado após gravar itens: limpa aqui e avisa os outros workers."""
+    cardapio_cache.invalidate(restaurant_id)
+    try:
+        await manager.publicar("cardapio", restaurant_id)
+    except Exception as e:
+        print(f"ALERTA: Falha ao propagar invalidação do cardápio: {e}")
+
+
+manager.registrar_ouvinte("cardapio", lambda restaurant_id, _: cardapio_cache.invalidate(restaurant_id))
+
+
+def _etag_confere(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidatos = [parte.strip() for parte in if_none_match.split(",")]
+    # Comparação fraca, como manda o RFC 9110 para If-None-Match
+    return "*" in candidatos or etag in (c.removeprefix("W/") for c in candidatos)
+
+
 # --- ROTA ---
 # Alterei a rota para /items/{restaurant_id} para ficar mais claro
 @router.get("/items/{restaurant_id}", response_model=List[schemas.ItemResponse])
-def get_items_for_restaurant(restaurant_id: str, db: Session = Depends(get_db)):
+async def get_items_for_restaurant(restaurant_id: str, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Busca itens de menu para um determinado restaurante (usando o Place ID).
     """
@@ -50,17 +87,23 @@ def get_items_for_restaurant(restaurant_id: str, db: Session = Depends(get_db)):
             },
         ]
 
-    # --- LÓGICA REAL (BUSCA NO BANCO DE DADOS) ---
-    
-    # 1. Tenta buscar no banco de dados usando o MODELO importado
-    #    Boa prática: Adicionado filtro para 'Item.ativo == True'
-    items = db.query(Item).filter(
-        Item.restaurant_id == restaurant_id,
-        Item.ativo == True
-    ).all()
-    
-    # 2. Retorna os itens encontrados (ou uma lista vazia)
-    #    O Pydantic (via response_model) garante a conversão
-    #    Se 'items' for uma lista vazia, ele retornará '[]',
-    #    o que é perfeito para o frontend.
-    return items
\ No newline at end of file
+    # --- LÓGICA REAL (CACHE -> BANCO DE DADOS) ---
+
+    async def carregar() -> Tuple[str, bytes]:
+        # 1. Busca no banco usando o MODELO importado
+        #    Boa prática: Adicionado filtro para 'Item.ativo == True'
+        items = (await db.scalars(select(Item).where(
+            Item.restaurant_id == restaurant_id,
+            Item.ativo == True
+        ))).all()
+        # 2. Serializa uma vez só (lista vazia vira '[]', perfeito para o frontend)
+        corpo = serializers.json_bytes(serializers.lista_itens, items)
+        return f'"{hashlib.sha256(corpo).hexdigest()[:32]}"', corpo
+
+    etag, corpo = await cardapio_cache.get_or_load(restaurant_id, carregar)
+
+    # no-cache: o navegador guarda, mas revalida sempre (304 quando nada mudou)
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if _etag_confere(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=corpo, media_type="application/json", headers=headers)
@@ -1,11 +1,17 @@
 import os
-import requests 
-import asyncio
+import httpx
 from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, status, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.config import settings
+from api.http_client import http_client
+from src.cache import TTLCache
 from src.database import get_db
+from src.geo import geohash, centro_geohash
 from src.models.endereco import Endereco
+from src.models.avaliacao import AvaliacaoRestaurante
 from src import schemas 
 
 # --- Variáveis de Ambiente (Google API Key) ---
@@ -19,7 +25,7 @@ router = APIRouter(
 # --- FUNÇÃO HELPER: BUSCAR LOCALIZAÇÃO DO USUÁRIO ---
 async def get_user_location(
     user_id: int,
-    db: Session
+    db: AsyncSession
 ) -> Dict[str, float]:
     """
     Busca a localização (lat/lng) do usuário no banco de dados.
@@ -27,9 +33,9 @@ async def get_user_location(
     
     try:
         # Busca o endereço pelo user_id
-        address = db.query(Endereco).filter(
+        address = await db.scalar(select(Endereco).where(
             Endereco.user_id == user_id 
-        ).first()
+        ))
 
         if not address or not address.latitude or not address.longitude:
              # Se não achar endereço ou coordenadas, lança erro 404 específico
@@ -50,6 +56,80 @@ async def get_user_location(
         )
 
 
+# --- CACHE DO GOOGLE PLACES ---
+# Chave: (célula geohash, palavra-chave, raio). Quem está no mesmo bairro e
+# busca a mesma coisa recebe a mesma resposta, e buscas simultâneas pela
+# mesma chave viram uma única chamada ao Google (single-flight).
+places_cache = TTLCache(
+    "places_nearby",
+    ttl=settings.PLACES_CACHE_TTL,
+    max_itens=settings.PLACES_CACHE_MAX_ITENS,
+    max_bytes=settings.PLACES_CACHE_MAX_BYTES,
+)
+
+RAIO_BUSCA_METROS = 5000
+
+
+async def buscar_places_nearby(lat: float, lng: float, keyword: str, radius: int) -> List[Dict[str, Any]]:
+    """Chamada real ao Places nearbysearch (sem cache)."""
+    url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+    params = {
+        'location': f"{lat},{lng}",
+        'radius': radius,
+        'type': 'restaurant',
+        'keyword': keyword,
+        'key': GOOGLE_API_KEY
+    }
+    
+    try:
+        # Cliente HTTP compartilhado (assíncrono, reaproveita a conexão com o Google)
+        response = await http_client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        
+        if data.get('status') in ['OK', 'ZERO_RESULTS']:
+            return data.get('results', [])
+        else:
+            print(f"Erro do Google Places: {data.get('status')} - {data.get('error_message', '')}")
+            # Se a chave do Google for inválida ou houver erro de cota, retorna 503 ou 400
+            raise HTTPException(status_code=503, detail=f"Erro externo na busca de restaurantes: {data.get('status')}")
+            
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        print(f"Erro de conexão com Google: {e}")
+        raise HTTPException(status_code=503, detail="Serviço de busca de restaurantes indisponível temporariamente.")
+    except Exception as e:
+        print(f"Erro inesperado: {e}")
+        raise HTTPException(status_code=500, detail="Erro interno no servidor.")
+
+
+async def _com_avaliacoes(db: AsyncSession, resultados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Junta a nota do iFome (avaliacoes_restaurante) a cada resultado do Google:
+    uma única query IN (...) por chave primária, e consulta O(1) por restaurante.
+    Devolve dicts novos: os do places_cache são compartilhados e não podem mudar.
+    """
+    ids = {r["place_id"] for r in resultados if r.get("place_id")}
+    if not ids:
+        return resultados
+    agregados = {
+        a.restaurant_id: a
+        for a in (await db.scalars(
+            select(AvaliacaoRestaurante).where(AvaliacaoRestaurante.restaurant_id.in_(ids))
+        )).all()
+    }
+    com_nota = []
+    for r in resultados:
+        agregado = agregados.get(r.get("place_id"))
+        com_nota.append({
+            **r,
+            "ifome_avaliacao_media": agregado.media if agregado else None,
+            "ifome_n_avaliacoes": agregado.n_avaliacoes if agregado else 0,
+        })
+    return com_nota
+
+
 # --- ROTA PRINCIPAL: CONSULTA RESTAURANTES PRÓXIMOS ---
 # Esta é a rota que estava dando 404. Ela deve estar acessível em:
 # /api/restaurantes/nearby/{user_id}
@@ -57,7 +137,7 @@ async def get_user_location(
 async def consulta_restaurantes_proximos(
     user_id: str,
     search: Optional[str] = Query(None, description="Termo de busca (nome ou tipo de comida)"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Busca restaurantes próximos à localização do usuário usando a Google Places API.
@@ -72,49 +152,31 @@ async def consulta_restaurantes_proximos(
     # Esta função faz a busca no DB
     location = await get_user_location(user_id_int, db)
 
-    # --- Passo 2: Lógica da Google Places API ---
+    # --- Passo 2: Lógica da Google Places API (com cache por célula) ---
     if not GOOGLE_API_KEY:
         print("ERRO: GOOGLE_PLACES_API_KEY não encontrada no .env")
         raise HTTPException(status_code=500, detail="Configuração de API inválida no servidor.")
     
-    url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    keyword = search if search else 'comida'
+    keyword = (search or 'comida').strip().lower()
+    celula = geohash(location['lat'], location['lng'], settings.PLACES_CACHE_PRECISAO_GEOHASH)
+    # A busca usa o centro da célula, para que a resposta valha para todos nela
+    lat_centro, lng_centro = centro_geohash(celula)
 
-    params = {
-        'location': f"{location['lat']},{location['lng']}",
-        'radius': 5000,
-        'type': 'restaurant',
-        'keyword': keyword,
-        'key': GOOGLE_API_KEY
-    }
-    
-    try:
-        # Usa asyncio.to_thread para rodar a chamada síncrona de requests sem bloquear o servidor
-        response = await asyncio.to_thread(requests.get, url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get('status') in ['OK', 'ZERO_RESULTS']:
-            return data.get('results', [])
-        else:
-            print(f"Erro do Google Places: {data.get('status')} - {data.get('error_message', '')}")
-            # Se a chave do Google for inválida ou houver erro de cota, retorna 503 ou 400
-            raise HTTPException(status_code=503, detail=f"Erro externo na busca de restaurantes: {data.get('status')}")
-            
-    except requests.exceptions.RequestException as e:
-        print(f"Erro de conexão com Google: {e}")
-        raise HTTPException(status_code=503, detail="Serviço de busca de restaurantes indisponível temporariamente.")
-    except Exception as e:
-        print(f"Erro inesperado: {e}")
-        raise HTTPException(status_code=500, detail="Erro interno no servidor.")
+    resultados = await places_cache.get_or_load(
+        (celula, keyword, RAIO_BUSCA_METROS),
+        lambda: buscar_places_nearby(lat_centro, lng_centro, keyword, RAIO_BUSCA_METROS),
+    )
+    resultados = await _com_avaliacoes(db, resultados)
+    # Devolve direto: pula a validação/jsonable_encoder do response_model
+    return ORJSONResponse(resultados)
 
 
 # --- ROTA DE CONSULTA DE ENDEREÇO ---
 @router.get("/endereco/{user_id}")
-def consultar_endereco_do_usuario(user_id: int, db: Session = Depends(get_db)):
+async def consultar_endereco_do_usuario(user_id: int, db: AsyncSession = Depends(get_db)):
     """ Consulta o endereço de um usuário para preencher o checkout. """
     
-    endereco_db = db.query(Endereco).filter(Endereco.user_id == user_id).first()
+    endereco_db = await db.scalar(select(Endereco).where(Endereco.user_id == user_id))
     if not endereco_db:
         raise HTTPException(status_code=404, detail="Endereço não cadastrado.")
     
@@ -2,7 +2,8 @@
 from fastapi import HTTPException, Depends, Request, APIRouter
 from fastapi.responses import RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from urllib.parse import urlencode
 
 # --- Imports da Aplicação ---
@@ -12,12 +13,12 @@ from src.database import get_db
 from src.models.usuario import Usuario 
 from api.config import oauth, settings 
 from src.security import autenticar_usuario, criar_token_de_acesso
+from api.otp_store import otp_store, ResultadoOtp
 
 # --- Novos Imports para Telefone e Twilio ---
-import random
-import os
+import secrets
 from pydantic import BaseModel
-from twilio.rest import Client
+from api.sms import sms_dispatcher
 
 # Usar o primeiro da lista de settings como padrão
 FRONTEND_URL = settings.FRONTEND_URLS[0] if settings.FRONTEND_URLS else "http://localhost:3000"
@@ -33,8 +34,6 @@ class VerifyCodeBody(BaseModel):
     phone: str
     # CORREÇÃO 3: Faltava o campo 'code' que a rota usa
     code: str 
-    
-temp_code_storage = {}
 
 
 # --- LOGIN COM GOOGLE ---
@@ -55,7 +54,7 @@ async def login_google(request: Request):
 
 
 @router.get("/google/callback")
-async def google_callback(request: Request, db: Session = Depends(get_db)):
+async def google_callback(request: Request, db: AsyncSession = Depends(get_db)):
     """
     Callback do Google. Processa e redireciona para o frontend com o token.
     """
@@ -79,7 +78,7 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
 
     email = user_info["email"]
     # CORREÇÃO 4: 'User' -> 'Usuario'
-    db_user = db.query(Usuario).filter(Usuario.email == email).first()
+    db_user = await db.scalar(select(Usuario).where(Usuario.email == email))
 
     if not db_user:
         # CORREÇÃO 5: 'User' -> 'Usuario'
@@ -90,10 +89,10 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
             is_active=True
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
 
-    access_token = criar_token_de_acesso(data={"sub": db_user.email})
+    access_token = criar_token_de_acesso(data={"sub": db_user.email, "uid": db_user.id})
 
     params = {"token": access_token}
     redirect_url = f"{FRONTEND_URL}/auth/callback?{urlencode(params)}"
@@ -113,7 +112,7 @@ async def login_facebook(request: Request):
 
 
 @router.get("/facebook/callback")
-async def facebook_callback(request: Request, db: Session = Depends(get_db)):
+async def facebook_callback(request: Request, db: AsyncSession = Depends(get_db)):
     token = await oauth.facebook.authorize_access_token(request)
     resp = await oauth.facebook.get("me?fields=id,name,email", token=token)
     profile = resp.json()
@@ -124,7 +123,7 @@ async def facebook_callback(request: Request, db: Session = Depends(get_db)):
             detail="O provedor do Facebook não forneceu um e-mail."
         )
     # CORREÇÃO 6: 'User' -> 'Usuario'
-    db_user = db.query(Usuario).filter(Usuario.email == email).first()
+    db_user = await db.scalar(select(Usuario).where(Usuario.email == email))
     if not db_user:
         # CORREÇÃO 7: 'User' -> 'Usuario'
         db_user = Usuario(
@@ -134,10 +133,10 @@ async def facebook_callback(request: Request, db: Session = Depends(get_db)):
             is_active=True
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
-    access_token = criar_token_de_acesso(data={"sub": db_user.email})
+    access_token = criar_token_de_acesso(data={"sub": db_user.email, "uid": db_user.id})
     params = {"token": access_token}
     redirect_url = f"{FRONTEND_URL}/auth/callback?{urlencode(params)}"
     return RedirectResponse(url=redirect_url)
@@ -147,11 +146,11 @@ async def facebook_callback(request: Request, db: Session = Depends(get_db)):
 
 @router.post("/login")
 async def login_para_token_de_acesso(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
     # 'autenticar_usuario' já foi corrigido para usar 'Usuario'
-    usuario = autenticar_usuario(db, form_data.username, form_data.password)
+    usuario = await autenticar_usuario(db, form_data.username, form_data.password)
     if not usuario:
         raise HTTPException(
             status_code=401,
@@ -159,7 +158,7 @@ async def login_para_token_de_acesso(
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token = criar_token_de_acesso(
-        data={"sub": usuario.email}
+        data={"sub": usuario.email, "uid": usuario.id}
     )
     # Retorna o token E os dados do usuário
     return {
@@ -175,28 +174,20 @@ async def login_para_token_de_acesso(
 async def request_phone_code(body: RequestCodeBody):
     if len(body.phone) < 10: 
         raise HTTPException(status_code=400, detail="Telefone inválido.")
-    code = str(random.randint(100000, 999999))
-    temp_code_storage[body.phone] = code
-    try:
-        account_sid = os.environ.get("TWILIO_ACCOUNT_SID")
-        auth_token = os.environ.get("TWILIO_AUTH_TOKEN")
-        twilio_phone = os.environ.get("TWILIO_PHONE_NUMBER")
-        if not all([account_sid, auth_token, twilio_phone]):
-            print("!!! ERRO DE CONFIGURAÇÃO: Variáveis Twilio não definidas no .env")
-            raise HTTPException(status_code=500, detail="Serviço de SMS não configurado.")
-        client = Client(account_sid, auth_token)
-        message = client.messages.create(
-            body=f"Seu código de login iFome é: {code}",
-            from_=twilio_phone,
-            to=body.phone  
-        )
-        print(f"SMS enviado para {body.phone}. SID: {message.sid}")
-    except Exception as e:
-        print(f"!!! ERRO AO ENVIAR SMS: {e}")
+    code = f"{secrets.randbelow(1_000_000):06d}"
+    # Compartilhado entre workers (Redis) e com limite de envios por telefone
+    if not await otp_store.emitir(body.phone, code):
+        raise HTTPException(status_code=429, detail="Muitos códigos solicitados. Tente novamente mais tarde.")
+    if not sms_dispatcher.configurado:
+        print("!!! ERRO DE CONFIGURAÇÃO: Variáveis Twilio não definidas no .env")
         # Em desenvolvimento, retorne o código para facilitar o teste
-        # Em produção, comente a linha abaixo e descomente a 'raise'
+        # Em produção, troque pela 'raise' abaixo
         return {"message": f"Erro (dev mode): Código seria {code}"}
-        # raise HTTPException(status_code=500, detail="Erro ao enviar o código SMS.")
+        # raise HTTPException(status_code=500, detail="Serviço de SMS não configurado.")
+
+    # Só enfileira: o envio (Twilio) acontece no dispatcher, fora do request
+    if not sms_dispatcher.enfileirar(body.phone, f"Seu código de login iFome é: {code}"):
+        raise HTTPException(status_code=503, detail="Serviço de SMS sobrecarregado. Tente novamente em instantes.")
     
     return {"message": "Código enviado com sucesso!"}
 
@@ -204,17 +195,18 @@ async def request_phone_code(body: RequestCodeBody):
 # --- LOGIN COM TELEFONE (ETAPA 2: Verificar Código) ---
 
 @router.post("/phone/verify-code")
-async def verify_phone_code(body: VerifyCodeBody, db: Session = Depends(get_db)):
-    stored_code = temp_code_storage.get(body.phone)
-    if not stored_code:
+async def verify_phone_code(body: VerifyCodeBody, db: AsyncSession = Depends(get_db)):
+    # Confere e conta a tentativa numa única operação atômica
+    resultado = await otp_store.verificar(body.phone, body.code)
+    if resultado == ResultadoOtp.INEXISTENTE:
         raise HTTPException(status_code=404, detail="Nenhum código solicitado para este número.")
-    if stored_code != body.code:
+    if resultado == ResultadoOtp.BLOQUEADO:
+        raise HTTPException(status_code=429, detail="Muitas tentativas. Solicite um novo código.")
+    if resultado == ResultadoOtp.INVALIDO:
         raise HTTPException(status_code=400, detail="Código inválido.")
     
-    del temp_code_storage[body.phone]
-    
     # CORREÇÃO 8: 'User' -> 'Usuario'
-    db_user = db.query(Usuario).filter(Usuario.telefone == body.phone).first()
+    db_user = await db.scalar(select(Usuario).where(Usuario.telefone == body.phone))
     
     if not db_user:
         # CORREÇÃO 9: 'User' -> 'Usuario'
@@ -227,11 +219,11 @@ async def verify_phone_code(body: VerifyCodeBody, db: Session = Depends(get_db))
             is_active=True
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
     # O 'sub' do token deve ser algo único. Usaremos o email (mesmo que seja placeholder)
-    access_token = criar_token_de_acesso(data={"sub": db_user.email})
+    access_token = criar_token_de_acesso(data={"sub": db_user.email, "uid": db_user.id})
     return {
         "access_token": access_token, 
         "token_type": "bearer",
@@ -0,0 +1,62 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.config import settings
+
+from src.cache import caches_registrados
+from src.database import estatisticas_pool, get_db
+from src.outbox import metricas_outbox, profundidade_fila
+from src.security import metricas_hash
+from api.sms import sms_dispatcher
+
+def exigir_token_interno(x_internal_token: Optional[str] = Header(None)):
+    """Libera as métricas só para quem tem o INTERNAL_TOKEN (ou em DEBUG, se não houver token)."""
+    if settings.INTERNAL_TOKEN:
+        if x_internal_token and hmac.compare_digest(x_internal_token, settings.INTERNAL_TOKEN):
+            return
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token interno inválido.")
+    if not settings.DEBUG:
+        # Em produção sem token configurado, as rotas nem aparecem
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+
+# --- ROTEADOR INTERNO (fora da documentação pública) ---
+router = APIRouter(
+    prefix="/internal",
+    tags=["Monitoramento"],
+    include_in_schema=False,
+    dependencies=[Depends(exigir_token_interno)]
+)
+
+
+@router.get("/db/pool")
+async def get_pool_stats():
+    """Estado do pool de conexões deste worker (checkouts, espera, overflow)."""
+    return estatisticas_pool()
+
+
+@router.get("/caches")
+async def get_cache_stats():
+    """Hit/miss, ocupação e despejos de cada cache em memória deste worker."""
+    return {nome: cache.estatisticas() for nome, cache in caches_registrados.items()}
+
+
+@router.get("/hash")
+async def get_hash_stats():
+    """Fila e tempo médio do pool de bcrypt (login/cadastro)."""
+    return metricas_hash.estatisticas()
+
+
+@router.get("/outbox")
+async def get_outbox_stats(db: AsyncSession = Depends(get_db)):
+    """Backlog da outbox por status (banco) e entregas/latência deste worker."""
+    return {"fila": await profundidade_fila(db), "worker": metricas_outbox.estatisticas()}
+
+
+@router.get("/sms")
+async def get_sms_stats():
+    """Fila, latência e taxa de erro do Twilio neste worker."""
+    return sms_dispatcher.estatisticas()
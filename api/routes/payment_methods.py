@@ -1,13 +1,15 @@
 # ARQUIVO FINAL: api/routes/metodos_pagamento.py
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, Column, Integer, String, Boolean, ForeignKey, DateTime
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
 from src.database import get_db, Base # Importa a Base
+from src.schemas import UsuarioToken
+from src.security import get_current_user, exigir_mesmo_usuario
 # Se necessário, adicione aqui o import para a classe Usuario se ela for usada
 # Ex: from .usuario import Usuario 
 
@@ -88,10 +90,10 @@ router = APIRouter(
 # ROTA GENÉRICA (EXISTENTE)
 # -----------------------------------------------------
 @router.get("/", response_model=List[PaymentMethodResponse])
-def get_payment_methods(db: Session = Depends(get_db)):
+async def get_payment_methods(db: AsyncSession = Depends(get_db)):
     """Consulta todos os métodos de pagamento ativos (PIX, DINHEIRO, CARTAO)."""
     
-    methods = db.query(PaymentMethodModel).filter(PaymentMethodModel.ativo == True).all()
+    methods = (await db.scalars(select(PaymentMethodModel).where(PaymentMethodModel.ativo == True))).all()
     
     if not methods:
         # MOCK DATA: Insere os dados de mock e os retorna
@@ -101,8 +103,8 @@ def get_payment_methods(db: Session = Depends(get_db)):
              PaymentMethodModel(nome="Dinheiro", codigo="DINHEIRO", requer_troco=True),
         ]
         db.add_all(initial_methods)
-        db.commit()
-        methods = db.query(PaymentMethodModel).filter(PaymentMethodModel.ativo == True).all()
+        await db.commit()
+        methods = (await db.scalars(select(PaymentMethodModel).where(PaymentMethodModel.ativo == True))).all()
         
     return methods
 
@@ -112,20 +114,22 @@ def get_payment_methods(db: Session = Depends(get_db)):
 # -----------------------------------------------------
 
 @router.post("/cards/{user_id}", response_model=CardResponse, status_code=status.HTTP_201_CREATED)
-def register_card(
+async def register_card(
     user_id: int, 
     card_data: CardCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: UsuarioToken = Depends(get_current_user)
 ):
     """
     Registra um novo cartão tokenizado para o usuário.
     """
+    exigir_mesmo_usuario(user_id, usuario_atual)
     
     # 1. Verifica duplicidade pelo Token
-    existing_card = db.query(UserCardModel).filter(
+    existing_card = await db.scalar(select(UserCardModel).where(
         UserCardModel.user_id == user_id,
         UserCardModel.token_gateway == card_data.token_gateway
-    ).first()
+    ))
     
     if existing_card:
         raise HTTPException(status_code=400, detail="Este cartão já está cadastrado.")
@@ -142,19 +146,21 @@ def register_card(
     
     # 3. Salva no banco
     db.add(new_card)
-    db.commit()
-    db.refresh(new_card)
+    await db.commit()
+    await db.refresh(new_card)
     
     return new_card
 
 
 @router.get("/cards/{user_id}", response_model=List[CardResponse])
-def get_user_cards(
+async def get_user_cards(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: UsuarioToken = Depends(get_current_user)
 ):
     """Lista todos os cartões salvos por um usuário."""
+    exigir_mesmo_usuario(user_id, usuario_atual)
     
-    cards = db.query(UserCardModel).filter(UserCardModel.user_id == user_id).all()
+    cards = (await db.scalars(select(UserCardModel).where(UserCardModel.user_id == user_id))).all()
     
     return cards
\ No newline at end of file
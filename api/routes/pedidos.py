@@ -1,21 +1,31 @@
 import os
-import requests 
-import asyncio
+import base64
 import random # Para gerar o código
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy import and_, case, delete, func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Optional
 
-from src.database import get_db
+from api.config import settings
+from api.http_client import http_client
+from src.database import get_db, contador_de_queries
 from src.models.pedidos import OrderModel, PedidoItem, OrderStatus, TipoEntrega
 from src.models.items import Item as ItemModel
 from src.models.usuario import Usuario 
 from src.models.endereco import Endereco
-from src import schemas
+from src import schemas, vendas_rollup, outbox, serializers
+from src.security import get_current_user, exigir_mesmo_usuario
+from src.nf_pdf import gerar_pdf_nf
+from api.routes.restaurante_admin import notificar_cozinha_pedido_criado, notificar_cozinha_status
+from api.routes.cadastro_sacola import SacolaItemModel, sacola_travada
+from api.sacola_store import sacola_store
+from api.idempotencia import executar_idempotente
 
 EMAIL_SERVICE_URL = os.getenv("EMAIL_SERVICE_URL", "http://localhost:3001/api/nf/enviar")
 
-async def enviar_nf_microsservico(
+def montar_payload_nf(
     destinatario: str, 
     order_id: int, 
     nome_cliente: str,
@@ -24,10 +34,12 @@ async def enviar_nf_microsservico(
     total: float,
     tipo_entrega: str,
     horario_entrega: str,
-    codigo_entrega: str # <--- Novo parâmetro
-):
+    codigo_entrega: str, # <--- Novo parâmetro
+    criado_em: Optional[datetime] = None
+) -> Optional[dict]:
+    """Monta o e-mail da NF (vai para a outbox junto com o pedido). None = não enviar."""
     if not EMAIL_SERVICE_URL or destinatario == 'placeholder@phone.placeholder':
-        return
+        return None
 
     itens_payload = []
     for item in itens:
@@ -61,96 +73,346 @@ async def enviar_nf_microsservico(
         "clienteEndereco": endereco_cliente,
         "total": total,
         "itens": itens_payload,
+        "tipoEntrega": info_entrega,
+        "dataPedido": criado_em.strftime("%d/%m/%Y %H:%M") if criado_em else None,
         "fileName": f"NF_Pedido_{order_id}.pdf",
+        # Preenchido na entrega (src/nf_pdf.py), para não guardar o PDF na outbox
         "pdfBase64": "" 
     }
+    return payload
+
 
-    try:
-        await asyncio.to_thread(requests.post, EMAIL_SERVICE_URL, json=payload, timeout=10)
-        print(f"E-mail enviado com Código de Entrega!")
-    except Exception as e:
-        print(f"ERRO ao enviar e-mail: {e}")
+@outbox.registrar_entrega("nf_pedido")
+async def enviar_nf_microsservico(payload: dict):
+    """Entrega feita pelo worker da outbox; exceção = nova tentativa com backoff."""
+    # PDF gerado aqui (pool de processos + cache em disco por pedido/conteúdo)
+    pdf = await gerar_pdf_nf(payload)
+    payload = {**payload, "pdfBase64": base64.b64encode(pdf).decode()}
+    resposta = await http_client.post(EMAIL_SERVICE_URL, json=payload, timeout=10)
+    resposta.raise_for_status()
+    print(f"E-mail enviado com Código de Entrega!")
 
 router = APIRouter(prefix="/api/pedidos", tags=["Pedidos (Cliente)"])
 
 @router.get("/{order_id}", response_model=schemas.OrderResponse)
-def get_order(order_id: int, db: Session = Depends(get_db)):
-    db_order = db.query(OrderModel).filter(OrderModel.id == order_id).first()
+async def get_order(
+    order_id: int,
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: schemas.UsuarioToken = Depends(get_current_user)
+):
+    db_order = await db.scalar(
+        select(OrderModel).options(selectinload(OrderModel.itens)).where(
+            OrderModel.id == order_id,
+            OrderModel.user_id == usuario_atual.id
+        )
+    )
     if not db_order:
         raise HTTPException(status_code=404, detail="Pedido não encontrado.")
     return db_order
 
+async def _usuario_e_endereco(db: AsyncSession, user_id: int, endereco_id: int):
+    """1 query: usuário + endereço de entrega juntos. Retorna (usuario, 'rua, numero')."""
+    linha = (await db.execute(
+        select(Usuario, Endereco).select_from(Usuario).outerjoin(
+            Endereco, and_(Endereco.id == endereco_id, Endereco.user_id == Usuario.id)
+        ).where(Usuario.id == user_id)
+    )).first()
+    if not linha: raise HTTPException(status_code=404, detail="Usuário não autenticado.")
+    db_usuario, db_endereco = linha
+    if not db_endereco: raise HTTPException(status_code=404, detail="Endereço não encontrado.")
+    return db_usuario, f"{db_endereco.rua}, {db_endereco.numero}"
+
 @router.post("/", response_model=schemas.OrderResponse, status_code=status.HTTP_201_CREATED)
-async def create_order(pedido_data: schemas.PedidoCreate, db: Session = Depends(get_db)):
-    user_id_mock = 2 
-    db_usuario = db.query(Usuario).filter(Usuario.id == user_id_mock).first()
-    if not db_usuario: raise HTTPException(status_code=404, detail="Usuário não autenticado.")
-    db_endereco = db.query(Endereco).filter(Endereco.id == pedido_data.endereco_id).first()
-    endereco_str = f"{db_endereco.rua}, {db_endereco.numero}" if db_endereco else "N/A"
-    
-    itens_para_salvar_no_db = []
-    preco_total_calculado = 0.0
-    taxa_entrega_extra = 5.00 if pedido_data.tipo_entrega == TipoEntrega.RAPIDA else 0.00
-
-    for item_carrinho in pedido_data.itens_do_carrinho:
-        item_db = db.query(ItemModel).filter(ItemModel.id == item_carrinho.item_id).first()
-        if not item_db: raise HTTPException(status_code=404, detail=f"Item {item_carrinho.item_id} não encontrado.")
-        preco_unitario_real = item_db.preco
-        preco_total_calculado += (preco_unitario_real * item_carrinho.quantidade)
-        novo_item_pedido = PedidoItem(item_id=item_db.id, quantidade=item_carrinho.quantidade, preco_unitario_pago=preco_unitario_real)
-        novo_item_pedido.item = item_db 
-        itens_para_salvar_no_db.append(novo_item_pedido)
-
-    if not itens_para_salvar_no_db: raise HTTPException(status_code=400, detail="Carrinho vazio.")
-    preco_total_calculado += taxa_entrega_extra
-
-    # --- GERAÇÃO DO CÓDIGO ---
-    # Gera um número aleatório de 0000 a 9999
-    codigo_gerado = f"{random.randint(0, 9999):04d}"
-
-    novo_pedido = OrderModel(
-        user_id=db_usuario.id, 
-        status=OrderStatus.PENDENTE,
-        total_price=preco_total_calculado,
-        restaurant_id=pedido_data.restaurante_id, 
-        endereco_id=pedido_data.endereco_id,
-        tipo_entrega=pedido_data.tipo_entrega,
-        horario_entrega=pedido_data.horario_entrega,
-        # Salva o código
-        codigo_entrega=codigo_gerado 
+async def create_order(
+    pedido_data: schemas.PedidoCreate,
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: schemas.UsuarioToken = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Cria o pedido. Com o header Idempotency-Key, retentativas do app devolvem
+    o pedido já criado (sem novo pedido, código de entrega ou e-mail de NF).
+    """
+    return await executar_idempotente(
+        idempotency_key, f"pedido:{usuario_atual.id}", pedido_data.model_dump_json(),
+        lambda: _criar_pedido(pedido_data, db, usuario_atual),
     )
-    novo_pedido.itens = itens_para_salvar_no_db
-    
-    try:
-        db.add(novo_pedido) 
-        db.commit()
-        db.refresh(novo_pedido)
+
+async def _criar_pedido(
+    pedido_data: schemas.PedidoCreate,
+    db: AsyncSession,
+    usuario_atual: schemas.UsuarioToken
+) -> Response:
+    # Todo o checkout roda com um número fixo de queries, independente do
+    # tamanho do carrinho. Com DEBUG ligado, o total vai no header X-Debug-Query-Count.
+    with contador_de_queries() as contador:
+        db_usuario, endereco_str = await _usuario_e_endereco(db, usuario_atual.id, pedido_data.endereco_id)
+
+        if not pedido_data.itens_do_carrinho: raise HTTPException(status_code=400, detail="Carrinho vazio.")
+
+        # 1 query: todos os itens do carrinho com um único IN (...)
+        ids_carrinho = {item_carrinho.item_id for item_carrinho in pedido_data.itens_do_carrinho}
+        itens_db = {
+            item_db.id: item_db
+            for item_db in (await db.scalars(select(ItemModel).where(ItemModel.id.in_(ids_carrinho)))).all()
+        }
+
+        linhas_pedido = []
+        preco_total_calculado = 0.0
+        taxa_entrega_extra = 5.00 if pedido_data.tipo_entrega == TipoEntrega.RAPIDA else 0.00
+
+        for item_carrinho in pedido_data.itens_do_carrinho:
+            item_db = itens_db.get(item_carrinho.item_id)
+            if not item_db: raise HTTPException(status_code=404, detail=f"Item {item_carrinho.item_id} não encontrado.")
+            if not item_db.ativo: raise HTTPException(status_code=400, detail=f"Item {item_db.id} indisponível no momento.")
+            if item_db.restaurant_id != pedido_data.restaurante_id:
+                raise HTTPException(status_code=400, detail=f"Item {item_db.id} não pertence a este restaurante.")
+            preco_unitario_real = item_db.preco
+            preco_total_calculado += (preco_unitario_real * item_carrinho.quantidade)
+            linhas_pedido.append({"item_id": item_db.id, "quantidade": item_carrinho.quantidade, "preco_unitario_pago": preco_unitario_real})
+
+        preco_total_calculado += taxa_entrega_extra
+
+        # --- GERAÇÃO DO CÓDIGO ---
+        # Gera um número aleatório de 0000 a 9999
+        codigo_gerado = f"{random.randint(0, 9999):04d}"
+
+        novo_pedido = OrderModel(
+            user_id=db_usuario.id, 
+            status=OrderStatus.PENDENTE,
+            criado_em=datetime.utcnow(),
+            total_price=preco_total_calculado,
+            restaurant_id=pedido_data.restaurante_id, 
+            endereco_id=pedido_data.endereco_id,
+            tipo_entrega=pedido_data.tipo_entrega,
+            horario_entrega=pedido_data.horario_entrega,
+            # Salva o código
+            codigo_entrega=codigo_gerado 
+        )
         
-        asyncio.create_task(enviar_nf_microsservico(
-            destinatario=db_usuario.email, 
-            order_id=novo_pedido.id,
-            nome_cliente=db_usuario.nome_completo,
-            endereco_cliente=endereco_str,
-            itens=itens_para_salvar_no_db,
-            total=preco_total_calculado,
-            tipo_entrega=pedido_data.tipo_entrega.value,
+        try:
+            db.add(novo_pedido) 
+            # flush para ter o id do pedido nos itens e no e-mail da NF (mesma transação)
+            await db.flush()
+            # Todos os itens num único INSERT: pelo flush do ORM seria um INSERT
+            # por item nos bancos sem RETURNING ordenado em lote (SQLite)
+            await db.execute(insert(PedidoItem).values([
+                {**linha, "order_id": novo_pedido.id} for linha in linhas_pedido
+            ]))
+            novo_pedido = await db.scalar(
+                select(OrderModel)
+                .options(selectinload(OrderModel.itens).selectinload(PedidoItem.item))
+                .where(OrderModel.id == novo_pedido.id)
+                .execution_options(populate_existing=True)
+            )
+            # Rollup diário na mesma transação do pedido
+            await vendas_rollup.registrar_pedido(db, novo_pedido)
+            payload_nf = montar_payload_nf(
+                destinatario=db_usuario.email, 
+                order_id=novo_pedido.id,
+                nome_cliente=db_usuario.nome_completo,
+                endereco_cliente=endereco_str,
+                itens=novo_pedido.itens,
+                total=preco_total_calculado,
+                tipo_entrega=pedido_data.tipo_entrega.value,
+                horario_entrega=pedido_data.horario_entrega,
+                codigo_entrega=codigo_gerado,
+                criado_em=novo_pedido.criado_em
+            )
+            if payload_nf:
+                outbox.enfileirar(db, "nf_pedido", payload_nf)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            print(f"ERRO AO SALVAR: {e}")
+            raise HTTPException(status_code=500, detail=f"Erro ao salvar: {e}")
+
+    resposta = serializers.resposta_json(serializers.pedido, novo_pedido, status.HTTP_201_CREATED)
+    if settings.DEBUG:
+        resposta.headers["X-Debug-Query-Count"] = str(contador[0])
+
+    await notificar_cozinha_pedido_criado(novo_pedido)
+    outbox.outbox_worker.acordar()
+    
+    return resposta
+
+# --- CHECKOUT DIRETO DA SACOLA ---
+# Diferença aceitável entre o preço guardado na sacola e o atual (arredondamento)
+TOLERANCIA_PRECO = 0.005
+
+@router.post("/from-sacola/{user_id}", response_model=schemas.OrderResponse, status_code=status.HTTP_201_CREATED)
+async def create_order_from_sacola(
+    user_id: str,
+    pedido_data: schemas.PedidoFromSacola,
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: schemas.UsuarioToken = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Fecha o pedido com as linhas da sacola (sacola_items) deste restaurante,
+    sem itens no corpo. Uma transação, só SQL por conjunto:
+    1 query valida a sacola e detecta preço divergente de Item.preco,
+    INSERT ... SELECT copia as linhas para pedido_itens e um DELETE limpa a sacola.
+    Preço mudou: 409 com os itens afetados e a sacola já atualizada para o preço atual.
+    Aceita Idempotency-Key como o POST /.
+    """
+    exigir_mesmo_usuario(user_id, usuario_atual)
+    return await executar_idempotente(
+        idempotency_key, f"pedido:{usuario_atual.id}", pedido_data.model_dump_json(),
+        lambda: _criar_pedido_da_sacola(user_id, pedido_data, db, usuario_atual),
+    )
+
+async def _criar_pedido_da_sacola(
+    user_id: str,
+    pedido_data: schemas.PedidoFromSacola,
+    db: AsyncSession,
+    usuario_atual: schemas.UsuarioToken
+) -> Response:
+    # Quantidades/remoções ainda no write-behind (inclusive um flush já em
+    # andamento) entram no banco antes da leitura, e a sacola fica travada até
+    # o 'esquecer': o flusher não devolve à sacola as linhas compradas
+    async with sacola_travada(user_id):
+        return await _fechar_sacola(user_id, pedido_data, db, usuario_atual)
+
+async def _fechar_sacola(
+    user_id: str,
+    pedido_data: schemas.PedidoFromSacola,
+    db: AsyncSession,
+    usuario_atual: schemas.UsuarioToken
+) -> Response:
+    da_sacola = and_(
+        SacolaItemModel.user_id == user_id,
+        SacolaItemModel.restaurant_id == pedido_data.restaurante_id,
+    )
+    item_da_linha = and_(
+        ItemModel.id == SacolaItemModel.item_id,
+        ItemModel.restaurant_id == SacolaItemModel.restaurant_id,
+    )
+    divergente = func.abs(ItemModel.preco - SacolaItemModel.preco_unitario) > TOLERANCIA_PRECO
+
+    with contador_de_queries() as contador:
+        db_usuario, endereco_str = await _usuario_e_endereco(db, usuario_atual.id, pedido_data.endereco_id)
+
+        # 1 query: validação, preço divergente e subtotal, agregados no banco
+        resumo = (await db.execute(
+            select(
+                func.count(SacolaItemModel.id).label("linhas"),
+                func.count(ItemModel.id).label("encontrados"),
+                func.coalesce(func.sum(case((ItemModel.ativo.is_not(True), 1), else_=0)), 0).label("inativos"),
+                func.coalesce(func.sum(case((divergente, 1), else_=0)), 0).label("divergentes"),
+                func.coalesce(func.sum(SacolaItemModel.quantidade * ItemModel.preco), 0.0).label("subtotal"),
+            ).select_from(SacolaItemModel).outerjoin(ItemModel, item_da_linha).where(da_sacola)
+        )).one()
+
+        if not resumo.linhas: raise HTTPException(status_code=400, detail="Sacola vazia.")
+        if resumo.encontrados < resumo.linhas:
+            raise HTTPException(status_code=404, detail="A sacola tem itens que não existem mais neste restaurante.")
+        if resumo.inativos: raise HTTPException(status_code=400, detail="A sacola tem itens indisponíveis no momento.")
+
+        if resumo.divergentes:
+            # Só no caminho de erro: lista os itens e atualiza o preço guardado na sacola
+            alterados = (await db.execute(
+                select(SacolaItemModel.item_id, ItemModel.nome, SacolaItemModel.preco_unitario, ItemModel.preco)
+                .join(ItemModel, item_da_linha).where(da_sacola, divergente)
+            )).all()
+            await db.execute(
+                update(SacolaItemModel).where(da_sacola).values(
+                    preco_unitario=select(ItemModel.preco).where(item_da_linha).scalar_subquery()
+                )
+            )
+            await db.commit()
+            await sacola_store.esquecer(user_id)
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={
+                "mensagem": "Os preços mudaram. A sacola foi atualizada; confira e confirme o pedido.",
+                "itens": [
+                    {"item_id": a.item_id, "nome": a.nome, "preco_sacola": a.preco_unitario, "preco_atual": a.preco}
+                    for a in alterados
+                ],
+            })
+
+        taxa_entrega_extra = 5.00 if pedido_data.tipo_entrega == TipoEntrega.RAPIDA else 0.00
+        codigo_gerado = f"{random.randint(0, 9999):04d}"
+
+        novo_pedido = OrderModel(
+            user_id=db_usuario.id,
+            status=OrderStatus.PENDENTE,
+            criado_em=datetime.utcnow(),
+            total_price=float(resumo.subtotal) + taxa_entrega_extra,
+            restaurant_id=pedido_data.restaurante_id,
+            endereco_id=pedido_data.endereco_id,
+            tipo_entrega=pedido_data.tipo_entrega,
             horario_entrega=pedido_data.horario_entrega,
+            observacoes=pedido_data.observacoes,
             codigo_entrega=codigo_gerado
-        ))
-        
-        return novo_pedido
-    except Exception as e:
-        db.rollback()
-        print(f"ERRO AO SALVAR: {e}")
-        raise HTTPException(status_code=500, detail=f"Erro ao salvar: {e}")
+        )
+
+        try:
+            db.add(novo_pedido)
+            await db.flush()
+
+            # INSERT ... SELECT: as linhas da sacola viram itens do pedido, ao preço atual
+            await db.execute(insert(PedidoItem).from_select(
+                ["order_id", "item_id", "quantidade", "preco_unitario_pago"],
+                select(literal(novo_pedido.id), SacolaItemModel.item_id, SacolaItemModel.quantidade, ItemModel.preco)
+                .join(ItemModel, item_da_linha).where(da_sacola).order_by(SacolaItemModel.id),
+            ))
+
+            # Limpa a sacola. Outro checkout da mesma sacola ao mesmo tempo espera
+            # o lock destas linhas e, depois, não apaga nada: esse é desfeito.
+            removidas = (await db.execute(delete(SacolaItemModel).where(da_sacola))).rowcount
+            if removidas != resumo.linhas:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A sacola mudou durante o checkout. Tente novamente.")
+
+            # Itens (com o prato, para a NF) para rollup, e-mail e resposta
+            novo_pedido = await db.scalar(
+                select(OrderModel)
+                .options(selectinload(OrderModel.itens).selectinload(PedidoItem.item))
+                .where(OrderModel.id == novo_pedido.id)
+                .execution_options(populate_existing=True)
+            )
+
+            await vendas_rollup.registrar_pedido(db, novo_pedido)
+            payload_nf = montar_payload_nf(
+                destinatario=db_usuario.email,
+                order_id=novo_pedido.id,
+                nome_cliente=db_usuario.nome_completo,
+                endereco_cliente=endereco_str,
+                itens=novo_pedido.itens,
+                total=novo_pedido.total_price,
+                tipo_entrega=pedido_data.tipo_entrega.value,
+                horario_entrega=pedido_data.horario_entrega,
+                codigo_entrega=codigo_gerado,
+                criado_em=novo_pedido.criado_em
+            )
+            if payload_nf:
+                outbox.enfileirar(db, "nf_pedido", payload_nf)
+            await db.commit()
+        except HTTPException:
+            await db.rollback()
+            raise
+        except Exception as e:
+            await db.rollback()
+            print(f"ERRO AO SALVAR: {e}")
+            raise HTTPException(status_code=500, detail=f"Erro ao salvar: {e}")
+
+    resposta = serializers.resposta_json(serializers.pedido, novo_pedido, status.HTTP_201_CREATED)
+    if settings.DEBUG:
+        resposta.headers["X-Debug-Query-Count"] = str(contador[0])
+
+    # A sacola no store ainda tem as linhas apagadas: relê do banco no próximo acesso
+    await sacola_store.esquecer(user_id)
+    await notificar_cozinha_pedido_criado(novo_pedido)
+    outbox.outbox_worker.acordar()
+
+    return resposta
 
 # --- NOVA ROTA: VALIDAR ENTREGA (USADA PELO ENTREGADOR) ---
 @router.post("/{order_id}/entregar")
-def validar_entrega(order_id: int, dados: schemas.ValidacaoEntrega, db: Session = Depends(get_db)):
+async def validar_entrega(order_id: int, dados: schemas.ValidacaoEntrega, db: AsyncSession = Depends(get_db)):
     """
     Rota para o entregador validar o código. Se correto, finaliza o pedido.
     """
-    pedido = db.query(OrderModel).filter(OrderModel.id == order_id).first()
+    pedido = await db.scalar(select(OrderModel).where(OrderModel.id == order_id))
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido não encontrado")
 
@@ -159,8 +421,10 @@ def validar_entrega(order_id: int, dados: schemas.ValidacaoEntrega, db: Session
 
     # Verifica o código
     if pedido.codigo_entrega == dados.codigo:
+        await vendas_rollup.registrar_mudanca_status(db, pedido, pedido.status, OrderStatus.CONCLUIDO)
         pedido.status = OrderStatus.CONCLUIDO
-        db.commit()
+        await db.commit()
+        await notificar_cozinha_status(pedido)
         return {"mensagem": "Código correto! Pedido CONCLUÍDO com sucesso."}
     else:
         raise HTTPException(status_code=400, detail="Código de entrega incorreto!")
@@ -168,16 +432,21 @@ def validar_entrega(order_id: int, dados: schemas.ValidacaoEntrega, db: Session
 
 
 @router.get("/", response_model=List[schemas.OrderResponse])
-def list_orders(db: Session = Depends(get_db)):
+async def list_orders(
+    db: AsyncSession = Depends(get_db),
+    usuario_atual: schemas.UsuarioToken = Depends(get_current_user)
+):
     """
-    Lista todos os pedidos do usuário logado (mockado como 2).
+    Lista todos os pedidos do usuário logado (vindo do token).
     """
-    user_id_mock = 2 # Mesmo mock usado no create_order
-    
+
     # Busca pedidos do usuário, ordenados por data (mais recente primeiro)
-    # Usa joinedload para trazer os itens junto, se necessário no schema
-    orders = db.query(OrderModel).filter(
-        OrderModel.user_id == user_id_mock
-    ).order_by(OrderModel.criado_em.desc()).all()
+    # Usa selectinload para trazer os itens junto (o schema precisa deles)
+    orders = (await db.scalars(
+        select(OrderModel).options(selectinload(OrderModel.itens)).where(
+            OrderModel.user_id == usuario_atual.id
+        ).order_by(OrderModel.criado_em.desc())
+    )).all()
     
-    return orders
\ No newline at end of file
+    # Serializador pré-compilado: bytes direto, sem jsonable_encoder
+    return serializers.resposta_json(serializers.lista_pedidos, orders)
\ No newline at end of file
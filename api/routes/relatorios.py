@@ -1,10 +1,11 @@
 # ARQUIVO FINAL: api/routes/relatorios.py (Corrigido para corresponder ao Histórico)
 
 from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, cast, String, Text, desc, Integer 
-from datetime import datetime, date
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from collections import defaultdict
+from datetime import datetime, date, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
 from pydantic import BaseModel
 
 # --- Importações de Modelos ---
@@ -13,6 +14,7 @@ from src.models.pedidos import OrderModel, PedidoItem, OrderStatus
 from src.models.restaurante import RestaurantModel 
 from src.models.avaliacao import Avaliacao 
 from src.models.items import Item 
+from src.models.vendas_diarias import VendaDiariaRestaurante, VendaDiariaItem
 
 # --- SCHEMAS DE RESPOSTA ---
 # (Manter Schemas aqui para evitar conflitos de importação)
@@ -49,29 +51,137 @@ class DailyMetricResponse(BaseModel):
 # --- Configuração do Router ---
 router = APIRouter(prefix="/api/relatorios", tags=["Relatórios"])
 
+# -----------------------------------------------------
+# LEITURA DO ROLLUP (vendas_diarias_*)
+# Dias fechados vêm do rollup; o dia de hoje (ainda em andamento)
+# é consultado direto em 'pedidos', só no intervalo de hoje.
+# -----------------------------------------------------
+
+def _dividir_periodo(data_inicio: Optional[date], data_fim: Optional[date]) -> Tuple[date, bool]:
+    """Retorna o último dia a ler do rollup e se o período inclui hoje."""
+    hoje = datetime.utcnow().date()
+    ontem = hoje - timedelta(days=1)
+    fim_rollup = min(data_fim, ontem) if data_fim else ontem
+    inclui_hoje = (data_inicio is None or data_inicio <= hoje) and (data_fim is None or data_fim >= hoje)
+    return fim_rollup, inclui_hoje
+
+
+def _intervalo_de_hoje() -> Tuple[datetime, datetime]:
+    inicio = datetime.combine(datetime.utcnow().date(), time.min)
+    return inicio, inicio + timedelta(days=1)
+
+
+async def _totais_por_restaurante(
+    db: AsyncSession, data_inicio: Optional[date], data_fim: Optional[date]
+) -> Dict[str, Dict[str, float]]:
+    """n_pedidos, faturamento, n_avaliacoes e soma_notas por restaurant_id."""
+    fim_rollup, inclui_hoje = _dividir_periodo(data_inicio, data_fim)
+    totais: Dict[str, Dict[str, float]] = defaultdict(
+        lambda: {"n_pedidos": 0, "faturamento": 0.0, "n_avaliacoes": 0, "soma_notas": 0}
+    )
+
+    def acumular(linhas):
+        for restaurant_id, n_pedidos, faturamento, n_avaliacoes, soma_notas in linhas:
+            total = totais[restaurant_id]
+            total["n_pedidos"] += n_pedidos or 0
+            total["faturamento"] += faturamento or 0.0
+            total["n_avaliacoes"] += n_avaliacoes or 0
+            total["soma_notas"] += soma_notas or 0
+
+    filtros = [VendaDiariaRestaurante.dia <= fim_rollup]
+    if data_inicio:
+        filtros.append(VendaDiariaRestaurante.dia >= data_inicio)
+    acumular((await db.execute(
+        select(
+            VendaDiariaRestaurante.restaurant_id,
+            func.sum(VendaDiariaRestaurante.n_pedidos),
+            func.sum(VendaDiariaRestaurante.faturamento),
+            func.sum(VendaDiariaRestaurante.n_avaliacoes),
+            func.sum(VendaDiariaRestaurante.soma_notas),
+        ).where(*filtros).group_by(VendaDiariaRestaurante.restaurant_id)
+    )).all())
+
+    if inclui_hoje:
+        de, ate = _intervalo_de_hoje()
+        acumular((await db.execute(
+            select(
+                OrderModel.restaurant_id,
+                func.count(OrderModel.id),
+                func.sum(OrderModel.total_price),
+                func.count(Avaliacao.id),
+                func.sum(Avaliacao.nota),
+            ).outerjoin(
+                Avaliacao, OrderModel.id == Avaliacao.pedido_id
+            ).where(
+                OrderModel.criado_em >= de, OrderModel.criado_em < ate
+            ).group_by(OrderModel.restaurant_id)
+        )).all())
+
+    return totais
+
+
+async def _totais_por_item(
+    db: AsyncSession, data_inicio: Optional[date], data_fim: Optional[date]
+) -> Dict[int, List[float]]:
+    """[quantidade, valor_faturado] por item_id."""
+    fim_rollup, inclui_hoje = _dividir_periodo(data_inicio, data_fim)
+    totais: Dict[int, List[float]] = defaultdict(lambda: [0, 0.0])
+
+    def acumular(linhas):
+        for item_id, quantidade, valor in linhas:
+            totais[item_id][0] += quantidade or 0
+            totais[item_id][1] += valor or 0.0
+
+    filtros = [VendaDiariaItem.dia <= fim_rollup]
+    if data_inicio:
+        filtros.append(VendaDiariaItem.dia >= data_inicio)
+    acumular((await db.execute(
+        select(
+            VendaDiariaItem.item_id,
+            func.sum(VendaDiariaItem.quantidade),
+            func.sum(VendaDiariaItem.valor_faturado),
+        ).where(*filtros).group_by(VendaDiariaItem.item_id)
+    )).all())
+
+    if inclui_hoje:
+        de, ate = _intervalo_de_hoje()
+        acumular((await db.execute(
+            select(
+                PedidoItem.item_id,
+                func.sum(PedidoItem.quantidade),
+                func.sum(PedidoItem.quantidade * PedidoItem.preco_unitario_pago),
+            ).join(
+                OrderModel, PedidoItem.order_id == OrderModel.id
+            ).where(
+                OrderModel.criado_em >= de, OrderModel.criado_em < ate
+            ).group_by(PedidoItem.item_id)
+        )).all())
+
+    return totais
+
+
+async def _nomes_restaurantes(db: AsyncSession, ids: Iterable[str]) -> Dict[str, str]:
+    linhas = (await db.execute(
+        select(RestaurantModel.id, RestaurantModel.name).where(RestaurantModel.id.in_(list(ids)))
+    )).all()
+    return {restaurant_id: nome for restaurant_id, nome in linhas}
+
+
 # -----------------------------------------------------
 # ROTA 1: Pedidos por Período (DADOS AGREGADOS)
 # -----------------------------------------------------
 
 @router.get("/pedidos_por_periodo", response_model=RelatorioPedidosPorPeriodo)
-def get_relatorio_pedidos_por_periodo(
+async def get_relatorio_pedidos_por_periodo(
     data_inicio: date = Query(..., description="Data de início do período"),
     data_fim: date = Query(..., description="Data de fim do período"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # 🛑 FILTRO DE STATUS REMOVIDO: Agora inclui todos os pedidos no período
-    query_filtro = db.query(OrderModel).filter(
-        func.date(OrderModel.criado_em).between(data_inicio, data_fim) 
-        # Removido: OrderModel.status == OrderStatus.PENDENTE
-    )
-
-    metricas = query_filtro.with_entities(
-        func.count(OrderModel.id).label('total_pedidos'),
-        func.sum(OrderModel.total_price).label('faturamento_total'),
-    ).first()
+    totais = await _totais_por_restaurante(db, data_inicio, data_fim)
 
-    total_pedidos = metricas.total_pedidos if metricas.total_pedidos else 0
-    faturamento_total = metricas.faturamento_total if metricas.faturamento_total else 0.0
+    total_pedidos = sum(t["n_pedidos"] for t in totais.values())
+    faturamento_total = sum(t["faturamento"] for t in totais.values())
 
     if total_pedidos == 0:
         return RelatorioPedidosPorPeriodo(
@@ -80,18 +190,14 @@ def get_relatorio_pedidos_por_periodo(
     
     ticket_medio = faturamento_total / total_pedidos
     
-    # ✅ JOIN: Corrigido e funcional
-    top_restaurante = query_filtro.join(
-        RestaurantModel, 
-        RestaurantModel.id.cast(Text) == OrderModel.restaurant_id.cast(Text)
-    ).with_entities(
-        RestaurantModel.name,
-        func.count(OrderModel.id).label('contagem_pedidos')
-    ).group_by(RestaurantModel.name).order_by(
-        func.count(OrderModel.id).desc()
-    ).first()
+    # Restaurante com mais pedidos (agrupado pelo nome, como antes)
+    nomes = await _nomes_restaurantes(db, totais.keys())
+    pedidos_por_nome: Dict[str, int] = defaultdict(int)
+    for restaurant_id, total in totais.items():
+        if restaurant_id in nomes:
+            pedidos_por_nome[nomes[restaurant_id]] += total["n_pedidos"]
     
-    nome_top_restaurante = top_restaurante.name if top_restaurante else "N/A"
+    nome_top_restaurante = max(pedidos_por_nome, key=pedidos_por_nome.get) if pedidos_por_nome else "N/A"
 
     return RelatorioPedidosPorPeriodo(
         data_inicio_periodo=data_inicio, data_fim_periodo=data_fim, total_pedidos=total_pedidos,
@@ -105,39 +211,38 @@ def get_relatorio_pedidos_por_periodo(
 # -----------------------------------------------------
 
 @router.get("/restaurantes_mais_vendas", response_model=List[RestauranteMaisVendasResponse])
-def get_relatorio_restaurantes(
+async def get_relatorio_restaurantes(
     data_inicio: Optional[date] = Query(None),
     data_fim: Optional[date] = Query(None),
     top_n: int = Query(5, description="Número de restaurantes no ranking"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(
-        RestaurantModel.name.label('restaurante'),
-        func.count(OrderModel.id).label('n_pedidos'),
-        func.sum(OrderModel.total_price).label('faturamento'),
-        func.avg(Avaliacao.nota).label('avaliacao_media')
-    ).join(
-        OrderModel, 
-        RestaurantModel.id.cast(Text) == OrderModel.restaurant_id.cast(Text)
-    ).outerjoin(
-        Avaliacao, OrderModel.id == Avaliacao.pedido_id 
-    ) # 🛑 FILTRO DE STATUS REMOVIDO AQUI
-
-    if data_inicio and data_fim:
-        query = query.filter(func.date(OrderModel.criado_em).between(data_inicio, data_fim))
-
-    resultados = query.group_by(
-        RestaurantModel.name
-    ).order_by(
-        desc(func.sum(OrderModel.total_price))
-    ).limit(top_n).all()
+    # 🛑 FILTRO DE STATUS REMOVIDO AQUI
+    if not (data_inicio and data_fim):
+        data_inicio = data_fim = None
+
+    totais = await _totais_por_restaurante(db, data_inicio, data_fim)
+    nomes = await _nomes_restaurantes(db, totais.keys())
+
+    por_nome: Dict[str, Dict[str, float]] = defaultdict(
+        lambda: {"n_pedidos": 0, "faturamento": 0.0, "n_avaliacoes": 0, "soma_notas": 0}
+    )
+    for restaurant_id, total in totais.items():
+        if restaurant_id not in nomes:
+            continue
+        acumulado = por_nome[nomes[restaurant_id]]
+        for campo, valor in total.items():
+            acumulado[campo] += valor
+
+    resultados = sorted(por_nome.items(), key=lambda par: par[1]["faturamento"], reverse=True)[:top_n]
 
     relatorio = []
-    for i, res in enumerate(resultados):
+    for i, (nome, res) in enumerate(resultados):
+        avaliacao_media = res["soma_notas"] / res["n_avaliacoes"] if res["n_avaliacoes"] else 0.0
         relatorio.append(RestauranteMaisVendasResponse(
-            rank=i + 1, restaurante=res.restaurante, n_pedidos=res.n_pedidos,
-            faturamento=round(res.faturamento if res.faturamento else 0.0, 2),
-            avaliacao_media=round(res.avaliacao_media if res.avaliacao_media else 0.0, 1)
+            rank=i + 1, restaurante=nome, n_pedidos=res["n_pedidos"],
+            faturamento=round(res["faturamento"], 2),
+            avaliacao_media=round(avaliacao_media, 1)
         ))
         
     return relatorio
@@ -148,36 +253,35 @@ def get_relatorio_restaurantes(
 # -----------------------------------------------------
 
 @router.get("/produtos_mais_vendidos", response_model=List[ProdutoMaisVendidoResponse])
-def get_relatorio_produtos(
+async def get_relatorio_produtos(
     data_inicio: Optional[date] = Query(None),
     data_fim: Optional[date] = Query(None),
     top_n: int = Query(5, description="Número de produtos no ranking"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(
-        func.sum(PedidoItem.quantidade).label('quantidade'),
-        func.sum(PedidoItem.quantidade * PedidoItem.preco_unitario_pago).label('valor_faturado'),
-        Item.nome.label('produto') 
-    ).join(
-        OrderModel, PedidoItem.order_id == OrderModel.id
-    ).join(
-        Item, PedidoItem.item_id == Item.id 
-    ) # 🛑 FILTRO DE STATUS REMOVIDO AQUI
-
-    if data_inicio and data_fim:
-        query = query.filter(func.date(OrderModel.criado_em).between(data_inicio, data_fim))
-
-    resultados = query.group_by(
-        Item.nome
-    ).order_by(
-        desc(func.sum(PedidoItem.quantidade))
-    ).limit(top_n).all()
+    # 🛑 FILTRO DE STATUS REMOVIDO AQUI
+    if not (data_inicio and data_fim):
+        data_inicio = data_fim = None
+
+    totais = await _totais_por_item(db, data_inicio, data_fim)
+    nomes = dict((await db.execute(
+        select(Item.id, Item.nome).where(Item.id.in_(list(totais.keys())))
+    )).all())
+
+    # Agrupa pelo nome do produto, como a consulta original
+    por_nome: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+    for item_id, (quantidade, valor) in totais.items():
+        if item_id in nomes:
+            por_nome[nomes[item_id]][0] += quantidade
+            por_nome[nomes[item_id]][1] += valor
+
+    resultados = sorted(por_nome.items(), key=lambda par: par[1][0], reverse=True)[:top_n]
 
     relatorio = []
-    for i, res in enumerate(resultados):
+    for i, (produto, (quantidade, valor_faturado)) in enumerate(resultados):
         relatorio.append(ProdutoMaisVendidoResponse(
-            rank=i + 1, produto=res.produto, quantidade=int(res.quantidade),
-            valor_faturado=round(res.valor_faturado if res.valor_faturado else 0.0, 2)
+            rank=i + 1, produto=produto, quantidade=int(quantidade),
+            valor_faturado=round(valor_faturado, 2)
         ))
         
     return relatorio
@@ -188,29 +292,49 @@ def get_relatorio_produtos(
 # -----------------------------------------------------
 
 @router.get("/pedidos_por_dia", response_model=List[DailyMetricResponse])
-def get_pedidos_por_dia(
+async def get_pedidos_por_dia(
     data_inicio: date = Query(..., description="Data de início (YYYY-MM-DD)"),
     data_fim: date = Query(..., description="Data de fim (YYYY-MM-DD)"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # 🛑 FILTRO DE STATUS REMOVIDO AQUI
-    resultados = db.query(
-        func.date(OrderModel.criado_em).label('data'),
-        func.sum(OrderModel.total_price).label('faturamento')
-    ).filter(
-        func.date(OrderModel.criado_em).between(data_inicio, data_fim)
-    ).group_by(
-        func.date(OrderModel.criado_em)
-    ).order_by(
-        func.date(OrderModel.criado_em)
-    ).all()
+    fim_rollup, inclui_hoje = _dividir_periodo(data_inicio, data_fim)
+
+    resultados = (await db.execute(
+        select(
+            VendaDiariaRestaurante.dia.label('data'),
+            func.sum(VendaDiariaRestaurante.faturamento).label('faturamento')
+        ).where(
+            VendaDiariaRestaurante.dia >= data_inicio,
+            VendaDiariaRestaurante.dia <= fim_rollup,
+            VendaDiariaRestaurante.n_pedidos > 0
+        ).group_by(
+            VendaDiariaRestaurante.dia
+        ).order_by(
+            VendaDiariaRestaurante.dia
+        )
+    )).all()
     
-    # ... (Restante da função)
     relatorio = []
     for res in resultados:
         relatorio.append(DailyMetricResponse(
             data=res.data,
             faturamento=round(res.faturamento, 2) if res.faturamento else 0.0
         ))
+
+    # Dia corrente: ainda não fechado, soma direto dos pedidos de hoje
+    if inclui_hoje:
+        de, ate = _intervalo_de_hoje()
+        hoje = (await db.execute(
+            select(
+                func.count(OrderModel.id).label('n_pedidos'),
+                func.sum(OrderModel.total_price).label('faturamento')
+            ).where(OrderModel.criado_em >= de, OrderModel.criado_em < ate)
+        )).first()
+        if hoje.n_pedidos:
+            relatorio.append(DailyMetricResponse(
+                data=de.date(),
+                faturamento=round(hoje.faturamento, 2) if hoje.faturamento else 0.0
+            ))
         
-    return relatorio
\ No newline at end of file
+    return relatorio
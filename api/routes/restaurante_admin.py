@@ -1,16 +1,20 @@
 import os
-import requests
-import asyncio
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.encoders import jsonable_encoder 
-from sqlalchemy.orm import Session
-from typing import List 
-from datetime import datetime
+import json
+import base64
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from typing import List, Literal, Optional, Tuple
+from datetime import datetime, timedelta
 
 # --- IMPORTAÇÕES ---
-from src.database import get_db
+from api.config import settings
+from src.database import get_db, SessionLocal
 from api.connection_manager import manager
-from src import schemas 
+from api.http_client import http_client
+from api.routes.consulta_items import invalidar_cardapio
+from src import schemas, vendas_rollup, outbox, serializers
 
 from src.models.pedidos import OrderModel, OrderStatus
 from src.models.items import Item as ItemModel
@@ -19,13 +23,13 @@ from src.models.usuario import Usuario # Importar Usuário para pegar o e-mail
 # --- CONFIGURAÇÃO DO SERVIÇO DE E-MAIL (Reutilizado) ---
 EMAIL_SERVICE_URL = os.getenv("EMAIL_SERVICE_URL", "http://localhost:3001/api/nf/enviar")
 
-async def enviar_email_status(destinatario: str, order_id: int, novo_status: str):
+def montar_payload_status(destinatario: str, order_id: int, novo_status: str) -> Optional[dict]:
     """
-    Envia um e-mail de notificação de mudança de status.
+    Monta o e-mail de notificação de mudança de status (vai para a outbox).
     Reutiliza o endpoint /nf/enviar do Node.js, mas mudamos o assunto e corpo.
     """
     if not EMAIL_SERVICE_URL or not destinatario or 'placeholder' in destinatario:
-        return
+        return None
 
     # Mensagens personalizadas por status
     mensagens = {
@@ -49,15 +53,74 @@ async def enviar_email_status(destinatario: str, order_id: int, novo_status: str
         # Nota: Se sua API Node valida obrigatoriedade de PDF, você teria que ajustar lá 
         # ou mandar um PDF "dummy" aqui. Vou assumir que podemos adaptar ou mandar vazio.
     }
+    return payload
 
+
+@outbox.registrar_entrega("email_status")
+async def enviar_email_status(payload: dict):
+    """Entrega feita pelo worker da outbox; exceção = nova tentativa com backoff."""
+    # Se a API Node.js exigir PDF obrigatório, podemos precisar ajustar o 'schema' no Node.js
+    # para tornar o PDF opcional em notificações simples.
+    resposta = await http_client.post(EMAIL_SERVICE_URL, json=payload, timeout=5)
+    resposta.raise_for_status()
+    print(f"E-mail de status enviado para {payload['to']}")
+
+# ===================================================================
+# EVENTOS DA TELA DA COZINHA (WebSocket /ws/restaurant/{id})
+# ===================================================================
+
+STATUS_ABERTOS = [
+    OrderStatus.PENDENTE, OrderStatus.CONFIRMADO,
+    OrderStatus.EM_PREPARO, OrderStatus.SAIU_PARA_ENTREGA,
+]
+
+
+def resumo_pedido_cozinha(pedido: OrderModel) -> dict:
+    """Só o que a cozinha exibe (itens já carregados no pedido)."""
+    return {
+        "id": pedido.id,
+        "status": pedido.status.value,
+        "total_price": pedido.total_price,
+        "criado_em": pedido.criado_em.isoformat(),
+        "tipo_entrega": pedido.tipo_entrega.value if pedido.tipo_entrega else None,
+        "horario_entrega": pedido.horario_entrega,
+        "observacoes": pedido.observacoes,
+        "itens": [{"item_id": i.item_id, "quantidade": i.quantidade} for i in pedido.itens],
+    }
+
+
+async def notificar_cozinha_pedido_criado(pedido: OrderModel):
     try:
-        # Se a API Node.js exigir PDF obrigatório, podemos precisar ajustar o 'schema' no Node.js
-        # para tornar o PDF opcional em notificações simples.
-        # Por enquanto, vamos tentar enviar assim.
-        await asyncio.to_thread(requests.post, EMAIL_SERVICE_URL, json=payload, timeout=5)
-        print(f"E-mail de status {novo_status} enviado para {destinatario}")
+        await manager.broadcast_to_restaurant(
+            pedido.restaurant_id, {"tipo": "pedido_criado", "pedido": resumo_pedido_cozinha(pedido)}
+        )
     except Exception as e:
-        print(f"Erro ao enviar e-mail de status: {e}")
+        print(f"ALERTA: Falha ao notificar a cozinha: {e}")
+
+
+async def notificar_cozinha_status(pedido: OrderModel):
+    # Diff mínimo: só id e novo status
+    try:
+        await manager.broadcast_to_restaurant(
+            pedido.restaurant_id, {"tipo": "status", "id": pedido.id, "status": pedido.status.value}
+        )
+    except Exception as e:
+        print(f"ALERTA: Falha ao notificar a cozinha: {e}")
+
+
+async def pedidos_abertos_cozinha(restaurant_id: str) -> List[dict]:
+    """Snapshot enviado quando a tela conecta (sessão própria, fora de request)."""
+    async with SessionLocal() as db:
+        pedidos = (await db.scalars(
+            select(OrderModel).options(
+                selectinload(OrderModel.itens)
+            ).where(
+                OrderModel.restaurant_id == restaurant_id,
+                OrderModel.status.in_(STATUS_ABERTOS)
+            ).order_by(OrderModel.criado_em)
+        )).all()
+    return [resumo_pedido_cozinha(p) for p in pedidos]
+
 
 # ===================================================================
 # ROTEADOR 1: ADMIN DE PEDIDOS
@@ -72,18 +135,18 @@ router_pedidos = APIRouter(
 async def update_order_status(
     order_id: int, 
     update_data: schemas.OrderStatusUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Endpoint para o restaurante atualizar o status de um pedido.
     """
-    from sqlalchemy.orm import joinedload
-    
     # Busca o pedido E o usuário dono do pedido (para pegar o e-mail)
-    db_order = db.query(OrderModel).options(
-        joinedload(OrderModel.itens),
-        joinedload(OrderModel.usuario) # <--- Carrega o usuário junto
-    ).filter(OrderModel.id == order_id).first()
+    db_order = await db.scalar(
+        select(OrderModel).options(
+            selectinload(OrderModel.itens),
+            joinedload(OrderModel.usuario) # <--- Carrega o usuário junto
+        ).where(OrderModel.id == order_id)
+    )
     
     if not db_order:
         raise HTTPException(
@@ -93,13 +156,19 @@ async def update_order_status(
         
     # Atualiza o status no banco
     novo_status = update_data.status
+    status_anterior = db_order.status
     db_order.status = novo_status
     
     try:
-        db.commit()
-        db.refresh(db_order)
+        await vendas_rollup.registrar_mudanca_status(db, db_order, status_anterior, novo_status)
+        # E-mail ao cliente vai para a outbox na mesma transação
+        if db_order.usuario:
+            payload_email = montar_payload_status(db_order.usuario.email, order_id, novo_status.value)
+            if payload_email:
+                outbox.enfileirar(db, "email_status", payload_email)
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Erro ao atualizar status no DB: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -107,35 +176,140 @@ async def update_order_status(
         )
     
     # --- 1. ENVIO DO WEBSOCKET ---
+    # Só publica/enfileira: a entrega para cada socket acontece na tarefa
+    # de envio daquele socket, sem segurar esta resposta.
     try:
-        order_dict = jsonable_encoder(db_order)
+        order_dict = serializers.pedido.dump_python(
+            serializers.pedido.validate_python(db_order, from_attributes=True), mode="json"
+        )
         await manager.broadcast_to_order(order_id, order_dict)
     except Exception as e:
         print(f"ALERTA: Falha ao enviar notificação WebSocket: {e}")
+    await notificar_cozinha_status(db_order)
         
-    # --- 2. ENVIO DE E-MAIL (NOVO) ---
-    if db_order.usuario and db_order.usuario.email:
-        # Dispara em background para não travar a resposta
-        asyncio.create_task(enviar_email_status(
-            destinatario=db_order.usuario.email,
-            order_id=order_id,
-            novo_status=novo_status
-        ))
+    # --- 2. ENVIO DE E-MAIL: já está na outbox, só acorda o worker ---
+    outbox.outbox_worker.acordar()
     
     return db_order
 
-@router_pedidos.get("/", response_model=List[schemas.OrderResponse])
-async def get_all_orders_for_restaurant(db: Session = Depends(get_db)):
+@router_pedidos.get("/", response_model=List[schemas.OrderResponse], deprecated=True)
+async def get_all_orders_for_restaurant(db: AsyncSession = Depends(get_db)):
     """
-    Endpoint para o restaurante ver todos os pedidos
+    Endpoint para o restaurante ver todos os pedidos.
+    Obsoleto: use /feed/{restaurant_id}, que é filtrado e paginado.
     """
-    from sqlalchemy.orm import joinedload
-    
-    orders = db.query(OrderModel).options(
-        joinedload(OrderModel.itens)
-    ).order_by(OrderModel.id.desc()).all()
+    orders = (await db.scalars(
+        select(OrderModel).options(
+            selectinload(OrderModel.itens)
+        ).order_by(OrderModel.id.desc())
+    )).all()
     
-    return orders
+    return serializers.resposta_json(serializers.lista_pedidos, orders)
+
+
+# --- FEED PAGINADO (KEYSET) ---
+# O cursor é opaco para o cliente: base64 de {"m": modo, "t": timestamp, "id": id}.
+# 'historico' anda para trás em (criado_em, id); 'alteracoes' anda para frente
+# em (atualizado_em, id) e devolve só o que mudou desde o último cursor.
+#
+# atualizado_em é gravado antes do commit: uma transação lenta pode aparecer
+# com um atualizado_em menor que o de linhas já lidas. Por isso o cursor de
+# 'alteracoes' nunca passa do horizonte (agora - FEED_JANELA_ALTERACOES): o que
+# mudou depois dele é relido no próximo polling, e o cliente aplica por id.
+
+def _codificar_cursor(modo: str, momento: datetime, order_id: int) -> str:
+    dados = json.dumps({"m": modo, "t": momento.isoformat(), "id": order_id})
+    return base64.urlsafe_b64encode(dados.encode()).decode()
+
+
+def _horizonte_alteracoes() -> Tuple[datetime, int]:
+    return datetime.utcnow() - timedelta(seconds=settings.FEED_JANELA_ALTERACOES), 0
+
+
+def _decodificar_cursor(cursor: str, modo: str) -> Tuple[datetime, int]:
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if dados["m"] != modo:
+            raise ValueError("cursor de outro modo")
+        return datetime.fromisoformat(dados["t"]), int(dados["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido.")
+
+
+@router_pedidos.get("/feed/{restaurant_id}", response_model=schemas.OrderPageResponse)
+async def get_order_feed(
+    restaurant_id: str,
+    status_pedido: Optional[schemas.OrderStatus] = Query(None, alias="status"),
+    modo: Literal["historico", "alteracoes"] = Query("historico"),
+    cursor: Optional[str] = Query(None),
+    limite: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Pedidos do restaurante, página a página.
+
+    - historico: mais novos primeiro; passe o next_cursor para a próxima página
+      (null quando acabou). A primeira página traz também cursor_alteracoes.
+    - alteracoes: pedidos criados/alterados depois do cursor, do mais antigo para
+      o mais novo. next_cursor sempre vem preenchido para o próximo polling.
+      Alterações dos últimos segundos podem vir de novo no polling seguinte:
+      aplique por id. O filtro de status é ignorado aqui (um pedido que saiu
+      do status filtrado também é uma alteração que o cliente precisa ver).
+    """
+    filtros = [OrderModel.restaurant_id == restaurant_id]
+    if status_pedido and modo == "historico":
+        filtros.append(OrderModel.status == status_pedido)
+
+    if modo == "historico":
+        if cursor:
+            criado_em, ultimo_id = _decodificar_cursor(cursor, modo)
+            filtros.append(or_(
+                OrderModel.criado_em < criado_em,
+                and_(OrderModel.criado_em == criado_em, OrderModel.id < ultimo_id),
+            ))
+        ordem = (OrderModel.criado_em.desc(), OrderModel.id.desc())
+    else:
+        posicao = (datetime.min, 0)
+        if cursor:
+            atualizado_em, ultimo_id = posicao = _decodificar_cursor(cursor, modo)
+            filtros.append(or_(
+                OrderModel.atualizado_em > atualizado_em,
+                and_(OrderModel.atualizado_em == atualizado_em, OrderModel.id > ultimo_id),
+            ))
+        ordem = (OrderModel.atualizado_em, OrderModel.id)
+
+    # Busca um a mais para saber se existe próxima página
+    pedidos = (await db.scalars(
+        select(OrderModel).options(
+            selectinload(OrderModel.itens)
+        ).where(*filtros).order_by(*ordem).limit(limite + 1)
+    )).all()
+    tem_mais = len(pedidos) > limite
+    pedidos = pedidos[:limite]
+
+    resposta = schemas.OrderPageResponse(pedidos=pedidos)
+    if modo == "historico":
+        if tem_mais:
+            ultimo = pedidos[-1]
+            resposta.next_cursor = _codificar_cursor(modo, ultimo.criado_em, ultimo.id)
+        if not cursor:
+            mais_recente = (await db.execute(
+                select(OrderModel.atualizado_em, OrderModel.id).where(
+                    OrderModel.restaurant_id == restaurant_id
+                ).order_by(OrderModel.atualizado_em.desc(), OrderModel.id.desc()).limit(1)
+            )).first()
+            if mais_recente:
+                inicio_alteracoes = min(tuple(mais_recente), _horizonte_alteracoes())
+                resposta.cursor_alteracoes = _codificar_cursor("alteracoes", *inicio_alteracoes)
+    elif pedidos:
+        ultimo = pedidos[-1]
+        # Só avança até o horizonte; nunca volta para trás do cursor recebido
+        proximo = max(posicao, min((ultimo.atualizado_em, ultimo.id), _horizonte_alteracoes()))
+        resposta.next_cursor = _codificar_cursor(modo, *proximo)
+    else:
+        resposta.next_cursor = cursor
+
+    return serializers.resposta_json(serializers.pagina_pedidos, resposta)
 
 # ===================================================================
 # ROTEADOR 2: ADMIN DE CARDÁPIO (CADASTRAR ITENS)
@@ -147,10 +321,10 @@ router_cardapio = APIRouter(
 )
 
 @router_cardapio.post("/{google_place_id}/items", response_model=schemas.ItemResponse)
-def create_item_for_restaurant(
+async def create_item_for_restaurant(
     google_place_id: str,
     item_data: schemas.ItemCreate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Cadastra um novo item (produto) para um restaurante específico.
@@ -163,12 +337,13 @@ def create_item_for_restaurant(
     
     try:
         db.add(db_item)
-        db.commit()
-        db.refresh(db_item) 
+        await db.commit()
+        await db.refresh(db_item) 
+        await invalidar_cardapio(google_place_id)
         return db_item
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Não foi possível cadastrar o item: {e}"
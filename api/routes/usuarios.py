@@ -1,11 +1,12 @@
 # Em: api/routes/usuarios.py (ARQUIVO NOVO)
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # --- Imports no estilo 'src' que funciona no seu projeto ---
 from src.database import get_db
-from src.models.usuario import User
+from src.models.usuario import Usuario
 from src.models.endereco import Endereco # 👈 Importe o modelo de Endereco
 
 # ---------------------------------------------------------
@@ -23,10 +24,10 @@ router = APIRouter(
     "/{user_id}/endereco",
     summary="Busca o endereço de um usuário específico"
 )
-async def get_user_address(user_id: int, db: Session = Depends(get_db)):
+async def get_user_address(user_id: int, db: AsyncSession = Depends(get_db)):
     
     # 1. Busca o usuário (para pegar o nome)
-    usuario_db = db.query(User).filter(User.id == user_id).first()
+    usuario_db = await db.scalar(select(Usuario).where(Usuario.id == user_id))
 
     if not usuario_db:
         raise HTTPException(
@@ -35,7 +36,7 @@ async def get_user_address(user_id: int, db: Session = Depends(get_db)):
         )
 
     # 2. Busca o endereço
-    endereco_db = db.query(Endereco).filter(Endereco.user_id == user_id).first()
+    endereco_db = await db.scalar(select(Endereco).where(Endereco.user_id == user_id))
 
     if not endereco_db:
         raise HTTPException(
@@ -0,0 +1,405 @@
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from api.config import settings
+from api.redis_client import get_redis
+
+# Uma linha da sacola: mesmos campos do SacolaItemResponse. Linha com
+# quantidade 0 é "lápide": removida na sacola, falta apagar no banco.
+Linha = Dict[str, object]
+Linhas = Dict[int, Linha]
+
+
+class SacolaStore(ABC):
+    """
+    Sacolas ativas fora do banco (write-behind).
+    Alterações de quantidade/remoções ficam aqui e marcam a sacola como
+    'suja'; o flusher de cadastro_sacola.py grava as sujas em lote no
+    sacola_items. Sacola parada por SACOLA_TTL sai do store, mas só depois
+    de gravada: sacola suja não expira.
+    Checkout e PUT em lote escrevem no banco por fora do flusher: enquanto
+    durarem, seguram a trava do usuário, e o flusher não pega essa sacola.
+    """
+
+    @abstractmethod
+    async def linhas(self, user_id: str) -> Optional[Linhas]:
+        """Linhas em cache (inclui lápides) ou None se a sacola não está carregada."""
+
+    @abstractmethod
+    async def definir_linhas(self, user_id: str, linhas: Linhas):
+        """Carrega a sacola lida do banco (não fica suja)."""
+
+    @abstractmethod
+    async def gravar_linha(self, user_id: str, linha: Linha, suja: bool = True):
+        ...
+
+    @abstractmethod
+    async def somar_quantidade(self, user_id: str, linha_id: int, delta: int) -> Optional[Linha]:
+        """Soma atômica na quantidade; None se a linha não está no store (ou é lápide)."""
+
+    @abstractmethod
+    async def pegar_sujas(self, limite: int, token: str) -> List[Tuple[str, Linhas]]:
+        """
+        Retira até 'limite' sacolas da lista de sujas, com suas linhas, e trava
+        cada uma com 'token' (o flusher destrava depois de gravar). Sacola
+        travada por outro fica na lista para o próximo flush.
+        """
+
+    @abstractmethod
+    async def pegar_suja(self, user_id: str) -> Optional[Linhas]:
+        """
+        Flush imediato de um usuário: lê as linhas e tira da lista de sujas
+        numa só operação. None se a sacola não estava suja.
+        """
+
+    @abstractmethod
+    async def marcar_suja(self, user_id: str):
+        ...
+
+    @abstractmethod
+    async def travar(self, user_id: str, token: str, espera: float) -> bool:
+        """Espera até 'espera' segundos pela trava da sacola. False = não conseguiu."""
+
+    @abstractmethod
+    async def destravar(self, user_id: str, token: str):
+        """Solta a trava, se ainda for de 'token'."""
+
+    @abstractmethod
+    async def remover_lapides(self, user_id: str, ids: List[int]):
+        """
+        Apaga do store as lápides já removidas do banco. Linha revivida nesse
+        meio tempo fica, e a sacola volta a ficar suja (precisa ser regravada).
+        """
+
+    @abstractmethod
+    async def esquecer(self, user_id: str):
+        """Descarta a sacola do store (o banco mudou por fora: checkout, etc.)."""
+
+
+class MemorySacolaStore(SacolaStore):
+    """Um único processo. LRU limitado; sacolas sujas nunca são despejadas."""
+
+    def __init__(self, max_usuarios: int = 50_000):
+        self.max_usuarios = max_usuarios
+        # user_id -> (último_toque, linhas)
+        self._sacolas: "OrderedDict[str, Tuple[float, Linhas]]" = OrderedDict()
+        self._sujas: Set[str] = set()
+        # user_id -> token de quem segura a trava; quem espera dorme num Event
+        self._travas: Dict[str, str] = {}
+        self._liberadas: Dict[str, asyncio.Event] = {}
+
+    def _tocar(self, user_id: str, linhas: Linhas):
+        self._sacolas[user_id] = (time.monotonic(), linhas)
+        self._sacolas.move_to_end(user_id)
+        self._limpar()
+
+    def _limpar(self):
+        agora = time.monotonic()
+        for user_id in list(self._sacolas):
+            if len(self._sacolas) <= self.max_usuarios and agora - self._sacolas[user_id][0] < settings.SACOLA_TTL:
+                break  # do mais antigo para o mais novo: o resto é recente
+            if user_id not in self._sujas:
+                del self._sacolas[user_id]
+
+    async def linhas(self, user_id: str) -> Optional[Linhas]:
+        entrada = self._sacolas.get(user_id)
+        if entrada is None:
+            return None
+        if time.monotonic() - entrada[0] >= settings.SACOLA_TTL and user_id not in self._sujas:
+            del self._sacolas[user_id]
+            return None
+        self._tocar(user_id, entrada[1])
+        return dict(entrada[1])
+
+    async def definir_linhas(self, user_id: str, linhas: Linhas):
+        self._tocar(user_id, dict(linhas))
+
+    async def gravar_linha(self, user_id: str, linha: Linha, suja: bool = True):
+        entrada = self._sacolas.get(user_id)
+        linhas = entrada[1] if entrada else {}
+        linhas[int(linha["id"])] = dict(linha)
+        self._tocar(user_id, linhas)
+        if suja:
+            self._sujas.add(user_id)
+
+    async def somar_quantidade(self, user_id: str, linha_id: int, delta: int) -> Optional[Linha]:
+        entrada = self._sacolas.get(user_id)
+        linha = entrada[1].get(linha_id) if entrada else None
+        if not linha or linha["quantidade"] <= 0:
+            return None
+        linha["quantidade"] += delta
+        self._tocar(user_id, entrada[1])
+        self._sujas.add(user_id)
+        return dict(linha)
+
+    async def pegar_sujas(self, limite: int, token: str) -> List[Tuple[str, Linhas]]:
+        livres = [user_id for user_id in self._sujas if user_id not in self._travas][:limite]
+        resultado = []
+        for user_id in livres:
+            self._travas[user_id] = token
+            linhas = await self.pegar_suja(user_id)
+            if linhas is not None:
+                resultado.append((user_id, linhas))
+        return resultado
+
+    async def pegar_suja(self, user_id: str) -> Optional[Linhas]:
+        if user_id not in self._sujas:
+            return None
+        self._sujas.discard(user_id)
+        entrada = self._sacolas.get(user_id)
+        return dict(entrada[1]) if entrada else None
+
+    async def marcar_suja(self, user_id: str):
+        self._sujas.add(user_id)
+
+    async def travar(self, user_id: str, token: str, espera: float) -> bool:
+        limite = time.monotonic() + espera
+        while user_id in self._travas:
+            liberada = self._liberadas.setdefault(user_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(liberada.wait(), max(limite - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                return False
+        self._travas[user_id] = token
+        return True
+
+    async def destravar(self, user_id: str, token: str):
+        if self._travas.get(user_id) == token:
+            del self._travas[user_id]
+            liberada = self._liberadas.pop(user_id, None)
+            if liberada:
+                liberada.set()
+
+    async def remover_lapides(self, user_id: str, ids: List[int]):
+        entrada = self._sacolas.get(user_id)
+        if entrada:
+            for linha_id in ids:
+                linha = entrada[1].get(linha_id)
+                if linha and linha["quantidade"] <= 0:
+                    del entrada[1][linha_id]
+                elif linha:
+                    self._sujas.add(user_id)
+
+    async def esquecer(self, user_id: str):
+        self._sacolas.pop(user_id, None)
+        self._sujas.discard(user_id)
+
+
+# Sacola suja não expira (PERSIST) até o flush; limpa volta a ter TTL.
+# KEYS[1] = sacola, KEYS[2] = set das sujas, ARGV[1] = user_id, ARGV[2] = TTL
+_LUA_TOCAR = """
+if redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 1 then
+  redis.call('PERSIST', KEYS[1])
+else
+  redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+"""
+
+# Soma atômica dentro do Redis (vários workers tocando a mesma sacola)
+_LUA_SOMAR = """
+local bruto = redis.call('HGET', KEYS[1], ARGV[1])
+if not bruto then return nil end
+local linha = cjson.decode(bruto)
+if linha['quantidade'] <= 0 then return nil end
+linha['quantidade'] = linha['quantidade'] + tonumber(ARGV[2])
+local novo = cjson.encode(linha)
+redis.call('HSET', KEYS[1], ARGV[1], novo)
+redis.call('SADD', KEYS[2], ARGV[3])
+redis.call('PERSIST', KEYS[1])
+return novo
+"""
+
+# Tira da lista de sujas e lê as linhas no mesmo passo; a sacola volta a ter TTL.
+# KEYS[1] = set das sujas, ARGV[1] = prefixo, ARGV[2] = TTL, ARGV[3] = 'lote' (SPOP
+# de até ARGV[4] sacolas, travando cada uma com o token ARGV[5] por ARGV[6] segundos;
+# as já travadas voltam para a lista) ou 'usuario' (ARGV[4] = user_id, já travado).
+# Retorna {user_id, {campo, valor, ...}, ...}
+_LUA_PEGAR_SUJAS = """
+local usuarios = {}
+if ARGV[3] == 'lote' then
+  for _, user_id in ipairs(redis.call('SPOP', KEYS[1], tonumber(ARGV[4]))) do
+    if redis.call('SET', ARGV[1] .. 'trava:' .. user_id, ARGV[5], 'NX', 'EX', ARGV[6]) then
+      table.insert(usuarios, user_id)
+    else
+      redis.call('SADD', KEYS[1], user_id)
+    end
+  end
+else
+  for i = 4, #ARGV do
+    if redis.call('SREM', KEYS[1], ARGV[i]) == 1 then table.insert(usuarios, ARGV[i]) end
+  end
+end
+local resultado = {}
+for _, user_id in ipairs(usuarios) do
+  local chave = ARGV[1] .. user_id
+  table.insert(resultado, user_id)
+  table.insert(resultado, redis.call('HGETALL', chave))
+  redis.call('EXPIRE', chave, ARGV[2])
+end
+return resultado
+"""
+
+# Solta a trava só se ainda for de quem pediu (a trava pode ter vencido)
+_LUA_DESTRAVAR = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then redis.call('DEL', KEYS[1]) end
+"""
+
+# Apaga só o que ainda é lápide; linha revivida marca a sacola como suja de novo.
+# KEYS[1] = sacola, KEYS[2] = set das sujas, ARGV[1] = user_id, ARGV[2..] = ids
+_LUA_REMOVER_LAPIDES = """
+local revivida = false
+for i = 2, #ARGV do
+  local bruto = redis.call('HGET', KEYS[1], ARGV[i])
+  if bruto then
+    if cjson.decode(bruto)['quantidade'] <= 0 then
+      redis.call('HDEL', KEYS[1], ARGV[i])
+    else
+      revivida = true
+    end
+  end
+end
+if revivida then
+  redis.call('SADD', KEYS[2], ARGV[1])
+  redis.call('PERSIST', KEYS[1])
+end
+"""
+
+
+class RedisSacolaStore(SacolaStore):
+    """
+    Vários workers: cada sacola é um hash (campo = id da linha, valor = JSON)
+    com EXPIRE renovado a cada toque; as sujas ficam num set e não expiram.
+    """
+
+    MARCADOR = "_carregada"  # distingue "sacola vazia em cache" de "não carregada"
+    INTERVALO_TRAVA = 0.05
+
+    def __init__(self, redis, prefixo: str = "ifome:sacola:"):
+        self.redis = redis
+        self.prefixo = prefixo
+        self.chave_sujas = f"{prefixo}sujas"
+        self._tocar = redis.register_script(_LUA_TOCAR)
+        self._somar = redis.register_script(_LUA_SOMAR)
+        self._pegar = redis.register_script(_LUA_PEGAR_SUJAS)
+        self._remover_lapides = redis.register_script(_LUA_REMOVER_LAPIDES)
+        self._destravar = redis.register_script(_LUA_DESTRAVAR)
+
+    def _chave(self, user_id: str) -> str:
+        return f"{self.prefixo}{user_id}"
+
+    def _chave_trava(self, user_id: str) -> str:
+        return f"{self.prefixo}trava:{user_id}"
+
+    def _renovar(self, user_id: str, client=None):
+        return self._tocar(
+            keys=[self._chave(user_id), self.chave_sujas],
+            args=[user_id, settings.SACOLA_TTL],
+            client=client,
+        )
+
+    def _decodificar(self, dados) -> Linhas:
+        # HGETALL vem como dict do cliente ou como lista plana de dentro do Lua
+        if isinstance(dados, list):
+            dados = dict(zip(dados[::2], dados[1::2]))
+        return {int(campo): json.loads(valor) for campo, valor in dados.items() if campo != self.MARCADOR}
+
+    async def linhas(self, user_id: str) -> Optional[Linhas]:
+        dados = await self.redis.hgetall(self._chave(user_id))
+        if not dados:
+            return None
+        await self._renovar(user_id)
+        return self._decodificar(dados)
+
+    async def definir_linhas(self, user_id: str, linhas: Linhas):
+        chave = self._chave(user_id)
+        mapa = {str(linha_id): json.dumps(linha) for linha_id, linha in linhas.items()}
+        mapa[self.MARCADOR] = "1"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(chave)
+            pipe.hset(chave, mapping=mapa)
+            await self._renovar(user_id, client=pipe)
+            await pipe.execute()
+
+    async def gravar_linha(self, user_id: str, linha: Linha, suja: bool = True):
+        chave = self._chave(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(chave, mapping={str(linha["id"]): json.dumps(linha), self.MARCADOR: "1"})
+            if suja:
+                pipe.sadd(self.chave_sujas, user_id)
+            await self._renovar(user_id, client=pipe)
+            await pipe.execute()
+
+    async def somar_quantidade(self, user_id: str, linha_id: int, delta: int) -> Optional[Linha]:
+        novo = await self._somar(
+            keys=[self._chave(user_id), self.chave_sujas],
+            args=[str(linha_id), delta, user_id],
+        )
+        return json.loads(novo) if novo else None
+
+    async def _pegar_sujas(self, modo: str, *argumentos) -> List[Tuple[str, Linhas]]:
+        bruto = await self._pegar(
+            keys=[self.chave_sujas],
+            args=[self.prefixo, settings.SACOLA_TTL, modo, *argumentos],
+        )
+        return [
+            (user_id, self._decodificar(dados))
+            for user_id, dados in zip(bruto[::2], bruto[1::2])
+            if dados
+        ]
+
+    async def pegar_sujas(self, limite: int, token: str) -> List[Tuple[str, Linhas]]:
+        return await self._pegar_sujas("lote", limite, token, settings.SACOLA_TRAVA_TTL)
+
+    async def pegar_suja(self, user_id: str) -> Optional[Linhas]:
+        sujas = await self._pegar_sujas("usuario", user_id)
+        return sujas[0][1] if sujas else None
+
+    async def marcar_suja(self, user_id: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.sadd(self.chave_sujas, user_id)
+            pipe.persist(self._chave(user_id))
+            await pipe.execute()
+
+    async def travar(self, user_id: str, token: str, espera: float) -> bool:
+        # A trava vence sozinha (SACOLA_TRAVA_TTL) se o worker cair segurando
+        limite = time.monotonic() + espera
+        while not await self.redis.set(self._chave_trava(user_id), token, nx=True, ex=settings.SACOLA_TRAVA_TTL):
+            if time.monotonic() >= limite:
+                return False
+            await asyncio.sleep(self.INTERVALO_TRAVA)
+        return True
+
+    async def destravar(self, user_id: str, token: str):
+        await self._destravar(keys=[self._chave_trava(user_id)], args=[token])
+
+    async def remover_lapides(self, user_id: str, ids: List[int]):
+        if ids:
+            await self._remover_lapides(
+                keys=[self._chave(user_id), self.chave_sujas],
+                args=[user_id, *[str(i) for i in ids]],
+            )
+
+    async def esquecer(self, user_id: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._chave(user_id))
+            pipe.srem(self.chave_sujas, user_id)
+            await pipe.execute()
+
+
+def criar_sacola_store() -> SacolaStore:
+    """Redis se REDIS_URL estiver configurada, senão memória (um worker só)."""
+    redis = get_redis()
+    if redis is not None:
+        return RedisSacolaStore(redis)
+    if settings.WEB_CONCURRENCY > 1:
+        # Cada worker teria a própria cópia da sacola e o flush de uma cópia
+        # velha sobrescreveria o que outro worker já gravou
+        raise RuntimeError("Sacola com mais de um worker exige REDIS_URL (WEB_CONCURRENCY > 1).")
+    return MemorySacolaStore(max_usuarios=settings.SACOLA_MAX_USUARIOS)
+
+
+sacola_store = criar_sacola_store()
@@ -0,0 +1,191 @@
+import asyncio
+import os
+import time
+from typing import Dict, List, Set, Tuple
+
+from twilio.base.exceptions import TwilioRestException
+from twilio.rest import Client
+
+from api.config import settings
+
+
+# (destino, enfileirado_em, tentativa)
+ItemFila = Tuple[str, float, int]
+
+
+def erro_transitorio(erro: Exception) -> bool:
+    """Vale tentar de novo? 4xx do Twilio (número inválido etc.) não, exceto 429."""
+    if isinstance(erro, TwilioRestException):
+        return erro.status is None or erro.status == 429 or erro.status >= 500
+    return True  # rede, timeout...
+
+
+class MetricasSms:
+    """Fila, latência (enfileirado -> enviado) e erros do provedor deste worker."""
+
+    def __init__(self):
+        self.enfileirados = 0
+        self.agrupados = 0
+        self.recusados = 0
+        self.enviados = 0
+        self.erros_provedor = 0
+        self.desistencias = 0
+        self.latencia_total = 0.0
+        self.latencia_max = 0.0
+
+    def estatisticas(self, na_fila: int, agendados: int) -> dict:
+        tentativas = self.enviados + self.erros_provedor
+        return {
+            "na_fila": na_fila,
+            "agendados": agendados,
+            "max_fila": settings.SMS_MAX_FILA,
+            "enfileirados": self.enfileirados,
+            "agrupados": self.agrupados,
+            "recusados": self.recusados,
+            "enviados": self.enviados,
+            "erros_provedor": self.erros_provedor,
+            "desistencias": self.desistencias,
+            "taxa_erro": round(self.erros_provedor / tentativas, 3) if tentativas else 0.0,
+            "latencia_media_s": round(self.latencia_total / self.enviados, 2) if self.enviados else 0.0,
+            "latencia_max_s": round(self.latencia_max, 2),
+        }
+
+
+class SmsDispatcher:
+    """
+    Envio de SMS fora do request.
+    O endpoint só enfileira; tarefas em segundo plano enviam com um único
+    cliente Twilio (reaproveitado), em thread para não travar o event loop,
+    com retentativas e um intervalo mínimo entre SMS para o mesmo número.
+    Nenhuma tarefa dorme esperando: SMS ainda no intervalo mínimo ou à espera
+    de retentativa volta para a fila na hora certa (call_later), e as tarefas
+    seguem atendendo os outros números.
+    """
+
+    def __init__(self):
+        self.account_sid = os.environ.get("TWILIO_ACCOUNT_SID")
+        self.auth_token = os.environ.get("TWILIO_AUTH_TOKEN")
+        self.remetente = os.environ.get("TWILIO_PHONE_NUMBER")
+        self._cliente = None
+        self._fila: asyncio.Queue = asyncio.Queue(maxsize=settings.SMS_MAX_FILA)
+        # destino -> texto mais recente ainda na fila (um código novo substitui o antigo)
+        self._pendentes: Dict[str, str] = {}
+        self._ultimo_envio: Dict[str, float] = {}
+        self._tarefas: List[asyncio.Task] = []
+        self._agendados: Set[asyncio.TimerHandle] = set()
+        self.metricas = MetricasSms()
+
+    @property
+    def configurado(self) -> bool:
+        return all([self.account_sid, self.auth_token, self.remetente])
+
+    def iniciar(self):
+        if not self._tarefas:
+            self._tarefas = [asyncio.create_task(self._trabalhar()) for _ in range(settings.SMS_CONCORRENCIA)]
+
+    async def parar(self):
+        for agendado in self._agendados:
+            agendado.cancel()
+        self._agendados.clear()
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
+
+    def enfileirar(self, destino: str, texto: str) -> bool:
+        """Não bloqueia. False = fila cheia (quem chamou decide o que responder)."""
+        if destino in self._pendentes:
+            # Já tem SMS para este número na fila: envia só o texto mais novo
+            self._pendentes[destino] = texto
+            self.metricas.agrupados += 1
+            return True
+        try:
+            self._fila.put_nowait((destino, time.monotonic(), 1))
+        except asyncio.QueueFull:
+            self.metricas.recusados += 1
+            return False
+        self._pendentes[destino] = texto
+        self.metricas.enfileirados += 1
+        return True
+
+    def _cliente_twilio(self):
+        if self._cliente is None:
+            self._cliente = Client(self.account_sid, self.auth_token)
+        return self._cliente
+
+    def _agendar(self, atraso: float, item: ItemFila):
+        """Devolve o item à fila daqui a 'atraso' segundos, sem ocupar uma tarefa."""
+        loop = asyncio.get_running_loop()
+
+        def reenfileirar():
+            self._agendados.discard(handle_ref[0])
+            try:
+                self._fila.put_nowait(item)
+            except asyncio.QueueFull:
+                # Item já aceito: não descarta, tenta de novo logo mais
+                self._agendar(0.5, item)
+
+        handle_ref = [loop.call_later(atraso, reenfileirar)]
+        self._agendados.add(handle_ref[0])
+
+    async def _trabalhar(self):
+        while True:
+            item = await self._fila.get()
+            try:
+                await self._enviar(*item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"!!! ERRO NO DISPATCHER DE SMS: {e}")
+            finally:
+                self._fila.task_done()
+
+    async def _enviar(self, destino: str, enfileirado_em: float, tentativa: int):
+        # Throttle por destino: ainda no intervalo mínimo -> volta para a fila depois
+        espera = self._ultimo_envio.get(destino, 0) + settings.SMS_INTERVALO_DESTINO - time.monotonic()
+        if espera > 0:
+            self._agendar(espera, (destino, enfileirado_em, tentativa))
+            return
+
+        # Lê o texto só agora: se chegou um código mais novo enquanto esperava, vai ele
+        texto = self._pendentes.pop(destino, None)
+        if texto is None:
+            return
+
+        try:
+            message = await asyncio.to_thread(
+                self._cliente_twilio().messages.create,
+                body=texto, from_=self.remetente, to=destino,
+            )
+        except Exception as e:
+            self.metricas.erros_provedor += 1
+            print(f"!!! ERRO AO ENVIAR SMS (tentativa {tentativa}): {e}")
+            if erro_transitorio(e) and tentativa < settings.SMS_MAX_TENTATIVAS:
+                # Se já chegou um código mais novo, ele tem o próprio item na fila
+                if destino not in self._pendentes:
+                    self._pendentes[destino] = texto
+                    self._agendar(2 ** tentativa, (destino, enfileirado_em, tentativa + 1))
+                return
+            self.metricas.desistencias += 1
+            return
+
+        latencia = time.monotonic() - enfileirado_em
+        self.metricas.enviados += 1
+        self.metricas.latencia_total += latencia
+        self.metricas.latencia_max = max(self.metricas.latencia_max, latencia)
+        self._ultimo_envio[destino] = time.monotonic()
+        self._limpar_throttle()
+        print(f"SMS enviado para {destino}. SID: {message.sid}")
+
+    def _limpar_throttle(self):
+        # Esquece destinos cujo intervalo já passou, para o dicionário não crescer sem limite
+        if len(self._ultimo_envio) > 10 * settings.SMS_MAX_FILA:
+            limite = time.monotonic() - settings.SMS_INTERVALO_DESTINO
+            self._ultimo_envio = {d: t for d, t in self._ultimo_envio.items() if t > limite}
+
+    def estatisticas(self) -> dict:
+        return self.metricas.estatisticas(self._fila.qsize(), len(self._agendados))
+
+
+# Instância única, iniciada/parada no lifespan do main.py
+sms_dispatcher = SmsDispatcher()
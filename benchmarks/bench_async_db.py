@@ -0,0 +1,138 @@
+"""
+Benchmark: latência com AsyncSession x sessão síncrona no event loop.
+
+Simula o endpoint "meus pedidos" (pedidos do usuário com selectinload dos
+itens) recebendo requisições a uma taxa fixa num único event loop, como o uvicorn.
+No modo síncrono cada consulta trava o loop inteiro (o que era o
+src/database.py antes da AsyncSession); um "ping" a cada 10 ms mede o que os
+WebSockets abertos sentem:
+
+    python -m benchmarks.bench_async_db --pedidos 20000 --taxa 100 --duracao 10 --rtt 2
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time as relogio
+from datetime import datetime, timedelta
+
+_BANCO = os.path.join(tempfile.mkdtemp(prefix="ifome_bench_"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_BANCO}"
+
+from sqlalchemy import create_engine, insert, select  # noqa: E402
+from sqlalchemy.orm import Session, selectinload  # noqa: E402
+
+from src.database import Base, SessionLocal, engine  # noqa: E402
+from src.models import usuario, endereco, items, restaurante, pedidos, avaliacao  # noqa: E402,F401
+from src.models.pedidos import OrderModel, OrderStatus, PedidoItem  # noqa: E402
+
+
+def _percentil(valores: list, p: float) -> float:
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+async def _popular(total: int, usuarios: int):
+    inicio = datetime.utcnow() - timedelta(days=90)
+    pedidos_linhas, itens_linhas = [], []
+    for pedido_id in range(1, total + 1):
+        pedidos_linhas.append({
+            "id": pedido_id, "user_id": random.randrange(1, usuarios + 1), "restaurant_id": "rest-1",
+            "endereco_id": 1, "total_price": 50.0, "status": OrderStatus.CONCLUIDO,
+            "criado_em": inicio + timedelta(seconds=random.randrange(90 * 86_400)),
+        })
+        for item_id in range(1, 4):
+            itens_linhas.append({"order_id": pedido_id, "item_id": item_id, "quantidade": 1, "preco_unitario_pago": 16.0})
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(OrderModel), pedidos_linhas)
+        await conn.execute(insert(PedidoItem), itens_linhas)
+
+
+def _consulta(user_id: int):
+    return (
+        select(OrderModel).options(selectinload(OrderModel.itens))
+        .where(OrderModel.user_id == user_id).order_by(OrderModel.criado_em.desc()).limit(50)
+    )
+
+
+async def _medir(nome: str, requisicao, args):
+    """
+    Carga aberta: as requisições chegam a --taxa por segundo, e a latência
+    conta do instante em que cada uma chegou (inclui a espera pelo loop).
+    """
+    latencias, atrasos = [], []
+    parar = asyncio.Event()
+
+    async def ping():
+        while not parar.is_set():
+            inicio = relogio.perf_counter()
+            await asyncio.sleep(0.01)
+            atrasos.append((relogio.perf_counter() - inicio - 0.01) * 1000)
+
+    async def atender(chegada: float):
+        await requisicao(random.randrange(1, args.usuarios + 1))
+        latencias.append((relogio.perf_counter() - chegada) * 1000)
+
+    pinger = asyncio.create_task(ping())
+    await asyncio.sleep(0.05)
+    inicio = relogio.perf_counter()
+    intervalo = 1 / args.taxa
+    tarefas = []
+    for n in range(int(args.taxa * args.duracao)):
+        chegada = inicio + n * intervalo
+        await asyncio.sleep(max(0.0, chegada - relogio.perf_counter()))
+        tarefas.append(asyncio.create_task(atender(chegada)))
+    await asyncio.gather(*tarefas)
+    segundos = relogio.perf_counter() - inicio
+    parar.set()
+    await pinger
+
+    print(
+        f"{nome:<16} {len(latencias) / segundos:6.0f} req/s   "
+        f"latência p50 {statistics.median(latencias):7.1f} ms  p99 {_percentil(latencias, 0.99):7.1f} ms   "
+        f"atraso do loop p99 {_percentil(atrasos, 0.99):6.1f} ms"
+    )
+
+
+async def _main(args):
+    await _popular(args.pedidos, args.usuarios)
+    print(f"{args.pedidos} pedidos, {args.taxa:.0f} req/s durante {args.duracao:.0f} s, rtt {args.rtt} ms")
+
+    motor_sincrono = create_engine(f"sqlite:///{_BANCO}")
+    # SQLite roda no processo; o Postgres de produção responde pela rede.
+    # --rtt soma essa ida e volta às duas consultas (pedidos + selectinload)
+    espera_rede = 2 * args.rtt / 1000
+
+    async def sincrona(user_id: int):
+        # Como antes: a sessão síncrona bloqueia o event loop durante a consulta
+        with Session(motor_sincrono) as db:
+            pedidos = db.scalars(_consulta(user_id)).all()
+            relogio.sleep(espera_rede)
+            return pedidos
+
+    async def assincrona(user_id: int):
+        async with SessionLocal() as db:
+            pedidos = (await db.scalars(_consulta(user_id))).all()
+            await asyncio.sleep(espera_rede)
+            return pedidos
+
+    await assincrona(1)
+    await sincrona(1)  # aquece
+    await _medir("sessão síncrona", sincrona, args)
+    await _medir("AsyncSession", assincrona, args)
+    motor_sincrono.dispose()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pedidos", type=int, default=20_000)
+    parser.add_argument("--usuarios", type=int, default=500)
+    parser.add_argument("--taxa", type=float, default=100)
+    parser.add_argument("--duracao", type=float, default=10)
+    parser.add_argument("--rtt", type=float, default=2.0, help="ida e volta até o banco, em ms (0 = SQLite puro)")
+    asyncio.run(_main(parser.parse_args()))
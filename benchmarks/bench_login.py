@@ -0,0 +1,86 @@
+"""
+Benchmark: vazão de login (bcrypt) e o que ela custa ao event loop.
+
+Compara verify_password chamado direto na rota (trava o loop durante cada
+hash) com verify_password_async (pool de HASH_WORKERS threads). Enquanto os
+logins rodam, um "ping" a cada 10 ms mede o atraso do loop, que é o que os
+WebSockets abertos sentem:
+
+    python -m benchmarks.bench_login --logins 200 --concorrencia 50 --rounds 12 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time as relogio
+
+
+def _percentil(valores: list, p: float) -> float:
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+async def _medir(nome: str, login, total: int, concorrencia: int):
+    atrasos = []
+    parar = asyncio.Event()
+
+    async def ping():
+        while not parar.is_set():
+            inicio = relogio.perf_counter()
+            await asyncio.sleep(0.01)
+            atrasos.append((relogio.perf_counter() - inicio - 0.01) * 1000)
+
+    fila = iter(range(total))
+
+    async def cliente():
+        for _ in fila:
+            assert await login()
+
+    pinger = asyncio.create_task(ping())
+    await asyncio.sleep(0.05)
+    inicio = relogio.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concorrencia)))
+    segundos = relogio.perf_counter() - inicio
+    parar.set()
+    await pinger
+
+    print(
+        f"{nome:<16} {total / segundos:7.1f} logins/s   "
+        f"atraso do loop: mediana {statistics.median(atrasos):7.1f} ms  p99 {_percentil(atrasos, 0.99):7.1f} ms"
+    )
+    return total / segundos
+
+
+async def _main(args):
+    # O pool de hash lê a configuração no import
+    from src import security
+
+    senha = "senha-de-teste"
+    hash_salvo = security.get_password_hash(senha)
+    security.verify_password(senha, hash_salvo)  # aquece
+
+    async def no_loop():
+        return security.verify_password(senha, hash_salvo)
+
+    async def no_pool():
+        return await security.verify_password_async(senha, hash_salvo)
+
+    nucleos = os.cpu_count() or 1
+    print(f"{args.logins} logins, {args.concorrencia} simultâneos, bcrypt rounds={args.rounds}, "
+          f"{args.workers} threads de hash, {nucleos} núcleos")
+    await _medir("no event loop", no_loop, args.logins, args.concorrencia)
+    vazao = await _medir("pool de hash", no_pool, args.logins, args.concorrencia)
+    print(f"por núcleo: {vazao / min(args.workers, nucleos):.1f} logins/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concorrencia", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["HASH_WORKERS"] = str(args.workers)
+    os.environ["HASH_MAX_FILA"] = str(max(args.concorrencia, 1) + 1)
+    asyncio.run(_main(args))
@@ -0,0 +1,85 @@
+"""
+Benchmark: geração do PDF da NF (src/nf_pdf.py).
+
+Mede PDFs/s renderizando num único núcleo (chamada direta de renderizar_nf)
+e pelo pool de processos, e quanto custa servir o mesmo PDF do cache em disco:
+
+    python -m benchmarks.bench_nf_pdf --itens 50 --pdfs 2000 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time as relogio
+from concurrent.futures import ProcessPoolExecutor
+
+from api.config import settings
+from src import nf_pdf
+
+
+def _dados(order_id: int, itens: int) -> dict:
+    """Mesmo formato do payload da outbox (_montar_email_nf)."""
+    return {
+        "orderId": order_id,
+        "clienteNome": "Maria da Silva",
+        "clienteEndereco": "Rua das Flores, 123 - Centro, São Paulo/SP",
+        "total": round(itens * 2 * 27.9 + 5.0, 2),
+        "tipoEntrega": "Tipo: RAPIDA",
+        "dataPedido": "17/10/2026 12:30",
+        "itens": [
+            {"nome": f"Prato número {i} (com acompanhamento)", "quantidade": 2, "preco_unitario": 27.9}
+            for i in range(itens)
+        ],
+    }
+
+
+def _um_nucleo(pedidos: list) -> float:
+    nf_pdf.renderizar_nf(pedidos[0])  # aquece
+    inicio = relogio.perf_counter()
+    tamanho = sum(len(nf_pdf.renderizar_nf(dados)) for dados in pedidos)
+    segundos = relogio.perf_counter() - inicio
+    print(f"{'1 núcleo':<22} {len(pedidos) / segundos:8.0f} PDFs/s   {tamanho / len(pedidos) / 1024:6.1f} KiB/PDF")
+    return len(pedidos) / segundos
+
+
+def _pool(pedidos: list, workers: int) -> float:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(nf_pdf.renderizar_nf, pedidos[:workers]))  # sobe os processos
+        inicio = relogio.perf_counter()
+        list(executor.map(nf_pdf.renderizar_nf, pedidos, chunksize=16))
+        segundos = relogio.perf_counter() - inicio
+    print(f"{f'pool ({workers} processos)':<22} {len(pedidos) / segundos:8.0f} PDFs/s")
+    return len(pedidos) / segundos
+
+
+async def _cache_em_disco(pedidos: list, repeticoes: int) -> float:
+    settings.NF_PDF_DIR = tempfile.mkdtemp(prefix="ifome_bench_nf_")
+    try:
+        await nf_pdf.gerar_pdf_nf(pedidos[0])  # grava no cache
+        inicio = relogio.perf_counter()
+        for _ in range(repeticoes):
+            await nf_pdf.gerar_pdf_nf(pedidos[0])
+        segundos = relogio.perf_counter() - inicio
+    finally:
+        nf_pdf.encerrar_pool()
+        shutil.rmtree(settings.NF_PDF_DIR, ignore_errors=True)
+    print(f"{'cache em disco':<22} {repeticoes / segundos:8.0f} PDFs/s")
+    return repeticoes / segundos
+
+
+def _main(args):
+    pedidos = [_dados(order_id, args.itens) for order_id in range(1, args.pdfs + 1)]
+    print(f"{args.pdfs} NFs com {args.itens} itens ({os.cpu_count()} núcleos na máquina)")
+    um = _um_nucleo(pedidos)
+    varios = _pool(pedidos, args.workers)
+    print(f"escala do pool: {varios / um:.1f}x")
+    asyncio.run(_cache_em_disco(pedidos, args.pdfs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--itens", type=int, default=50)
+    parser.add_argument("--pdfs", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=settings.NF_PDF_WORKERS)
+    _main(parser.parse_args())
@@ -0,0 +1,104 @@
+"""
+Benchmark: relatório de restaurantes lendo o rollup diário x varrendo 'pedidos'.
+
+Cria um SQLite temporário com pedidos espalhados por vários dias, preenche o
+rollup (mesma função da migração 5) e mede as duas consultas:
+
+    python -m benchmarks.bench_relatorios --dias 180 --pedidos-por-dia 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time as relogio
+from datetime import datetime, timedelta
+
+_BANCO = os.path.join(tempfile.mkdtemp(prefix="ifome_bench_"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_BANCO}"
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from src.database import Base, SessionLocal, engine  # noqa: E402
+from src.models import usuario, endereco, items, restaurante, pedidos, avaliacao, vendas_diarias  # noqa: E402,F401
+from src.models.avaliacao import Avaliacao  # noqa: E402
+from src.models.pedidos import OrderModel, PedidoItem, OrderStatus  # noqa: E402
+from src.vendas_rollup import preencher_ate_hoje  # noqa: E402
+from api.routes.relatorios import _totais_por_restaurante  # noqa: E402
+
+
+async def _popular(dias: int, pedidos_por_dia: int, restaurantes: int):
+    inicio = datetime.utcnow() - timedelta(days=dias)
+    pedidos_linhas, itens_linhas, avaliacoes_linhas = [], [], []
+    pedido_id = 0
+    for dia in range(dias + 1):
+        for _ in range(pedidos_por_dia):
+            pedido_id += 1
+            pedidos_linhas.append({
+                "id": pedido_id,
+                "user_id": 1,
+                "restaurant_id": f"rest-{random.randrange(restaurantes)}",
+                "endereco_id": 1,
+                "total_price": round(random.uniform(20, 200), 2),
+                "status": OrderStatus.CONCLUIDO,
+                "criado_em": inicio + timedelta(days=dia, seconds=random.randrange(86_400)),
+            })
+            itens_linhas.append({
+                "order_id": pedido_id, "item_id": random.randrange(1, 50),
+                "quantidade": random.randrange(1, 4), "preco_unitario_pago": 25.0,
+            })
+            if random.random() < 0.3:
+                avaliacoes_linhas.append({"pedido_id": pedido_id, "nota": random.randrange(1, 6)})
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(OrderModel), pedidos_linhas)
+        await conn.execute(insert(PedidoItem), itens_linhas)
+        if avaliacoes_linhas:
+            await conn.execute(insert(Avaliacao), avaliacoes_linhas)
+        await preencher_ate_hoje(conn)
+
+
+async def _varredura_completa(db):
+    """A consulta anterior ao rollup: agrega todos os pedidos a cada chamada."""
+    return (await db.execute(
+        select(
+            OrderModel.restaurant_id,
+            func.count(OrderModel.id),
+            func.sum(OrderModel.total_price),
+            func.count(Avaliacao.id),
+            func.sum(Avaliacao.nota),
+        ).outerjoin(Avaliacao, OrderModel.id == Avaliacao.pedido_id).group_by(OrderModel.restaurant_id)
+    )).all()
+
+
+async def _medir(nome: str, consulta, repeticoes: int) -> float:
+    tempos = []
+    async with SessionLocal() as db:
+        await consulta(db)  # aquece
+        for _ in range(repeticoes):
+            inicio = relogio.perf_counter()
+            await consulta(db)
+            tempos.append((relogio.perf_counter() - inicio) * 1000)
+    mediana = statistics.median(tempos)
+    print(f"{nome:<22} mediana {mediana:8.2f} ms   p95 {sorted(tempos)[int(len(tempos) * 0.95) - 1]:8.2f} ms")
+    return mediana
+
+
+async def _main(args):
+    await _popular(args.dias, args.pedidos_por_dia, args.restaurantes)
+    print(f"{args.dias * args.pedidos_por_dia} pedidos em {args.dias} dias, {args.restaurantes} restaurantes")
+    rollup = await _medir("rollup + hoje", lambda db: _totais_por_restaurante(db, None, None), args.repeticoes)
+    varredura = await _medir("varredura de pedidos", _varredura_completa, args.repeticoes)
+    print(f"ganho: {varredura / rollup:.1f}x")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dias", type=int, default=180)
+    parser.add_argument("--pedidos-por-dia", type=int, default=500)
+    parser.add_argument("--restaurantes", type=int, default=50)
+    parser.add_argument("--repeticoes", type=int, default=30)
+    asyncio.run(_main(parser.parse_args()))
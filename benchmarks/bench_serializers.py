@@ -0,0 +1,80 @@
+"""
+Benchmark: serialização das listas de pedidos (src/serializers.py).
+
+Compara o caminho padrão do FastAPI (response_model: validate +
+jsonable_encoder + json.dumps) com o TypeAdapter pronto do serializers
+(validate + dump_json), em bytes/s de JSON gerado:
+
+    python -m benchmarks.bench_serializers --pedidos 50 --itens 3 --repeticoes 500
+"""
+import argparse
+import json
+import statistics
+import time as relogio
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from src import schemas, serializers
+from src.models import usuario, endereco, items, restaurante, pedidos, avaliacao  # noqa: F401
+from src.models.pedidos import OrderModel, OrderStatus, PedidoItem, TipoEntrega
+
+
+def _pedidos(quantidade: int, itens: int) -> List[OrderModel]:
+    """Objetos ORM como os que saem do select com selectinload(itens)."""
+    agora = datetime(2026, 10, 17, 12, 0)
+    return [
+        OrderModel(
+            id=pedido_id, user_id=7, restaurant_id="ChIJN1t_tDeuEmsRUsoyG83frY4", endereco_id=3,
+            total_price=round(itens * 2 * 27.9, 2), status=OrderStatus.EM_PREPARO, tipo_entrega=TipoEntrega.NORMAL,
+            horario_entrega=None, codigo_entrega="4821",
+            criado_em=agora - timedelta(minutes=pedido_id), atualizado_em=agora,
+            itens=[
+                PedidoItem(id=pedido_id * 100 + i, item_id=i, quantidade=2, preco_unitario_pago=27.9)
+                for i in range(itens)
+            ],
+        )
+        for pedido_id in range(1, quantidade + 1)
+    ]
+
+
+_lista = TypeAdapter(List[schemas.OrderResponse])
+
+
+def _como_o_fastapi(valor) -> bytes:
+    """O que o response_model padrão fazia: validate + jsonable_encoder + json.dumps."""
+    return json.dumps(jsonable_encoder(_lista.validate_python(valor, from_attributes=True))).encode()
+
+
+def _serializers(valor) -> bytes:
+    return serializers.json_bytes(serializers.lista_pedidos, valor)
+
+
+def _medir(nome: str, serializar, valor, repeticoes: int) -> float:
+    serializar(valor)  # aquece
+    tempos, tamanho = [], 0
+    for _ in range(repeticoes):
+        inicio = relogio.perf_counter()
+        tamanho = len(serializar(valor))
+        tempos.append(relogio.perf_counter() - inicio)
+    mediana = statistics.median(tempos)
+    print(f"{nome:<22} mediana {mediana * 1000:7.3f} ms   {tamanho / mediana / 1024 / 1024:8.1f} MiB/s")
+    return mediana
+
+
+def _main(args):
+    valor = _pedidos(args.pedidos, args.itens)
+    print(f"lista de {args.pedidos} pedidos com {args.itens} itens: {len(_serializers(valor)) / 1024:.1f} KiB de JSON")
+    padrao = _medir("jsonable_encoder", _como_o_fastapi, valor, args.repeticoes)
+    pronto = _medir("TypeAdapter.dump_json", _serializers, valor, args.repeticoes)
+    print(f"ganho: {padrao / pronto:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pedidos", type=int, default=50)
+    parser.add_argument("--itens", type=int, default=3)
+    parser.add_argument("--repeticoes", type=int, default=500)
+    _main(parser.parse_args())
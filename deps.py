@@ -1,8 +1,5 @@
 from src.database import SessionLocal
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
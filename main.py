@@ -1,16 +1,23 @@
 import os
+from contextlib import asynccontextmanager
+from typing import Optional
 from dotenv import load_dotenv
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from api.config import settings 
 from src.database import Base, engine 
+from src.migracoes import aplicar_migracoes, travar_schema
 from src.models import (
     usuario, 
     endereco, 
     items, 
     pedidos,
-    avaliacao
+    avaliacao,
+    geocode_cache,
+    vendas_diarias,
+    outbox
 )
 from api.routes import cadastro_sacola as sacola_model 
 from api.routes import relatorios
@@ -24,18 +31,46 @@ from api.routes import (
     payment_methods,
     pedidos, 
     restaurante_admin,
-    avaliacao 
+    avaliacao,
+    monitoramento
 ) 
 
 # Importa o manager
 from api.connection_manager import manager
+from api.redis_client import fechar_redis
+from api.http_client import http_client
+from src.outbox import outbox_worker
+from api.sms import sms_dispatcher
+from src.nf_pdf import encerrar_pool
 
 load_dotenv()
 
-# Cria as tabelas se não existirem
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cria as tabelas se não existirem
+    async with engine.begin() as conn:
+        # Vários workers sobem juntos: um de cada vez cria tabelas e migra
+        await travar_schema(conn)
+        await conn.run_sync(Base.metadata.create_all)
+        # Alterações em tabelas que já existiam (índices etc.)
+        await aplicar_migracoes(conn)
+    await http_client.iniciar()
+    await manager.startup()
+    outbox_worker.iniciar()
+    sms_dispatcher.iniciar()
+    sacola_model.sacola_flusher.iniciar()
+    yield
+    await sacola_model.sacola_flusher.parar()
+    await sms_dispatcher.parar()
+    await outbox_worker.parar()
+    encerrar_pool()
+    await manager.shutdown()
+    await http_client.fechar()
+    await fechar_redis()
+    await engine.dispose()
 
-app = FastAPI(title="Backend Integrado")
+# ORJSONResponse: rotas que devolvem dict/list serializam com orjson
+app = FastAPI(title="Backend Integrado", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # --- Middlewares ---
 origins = ["*"] 
@@ -64,6 +99,7 @@ app.include_router(relatorios.router)
 app.include_router(avaliacao.router)
 app.include_router(restaurante_admin.router_pedidos)
 app.include_router(restaurante_admin.router_cardapio)
+app.include_router(monitoramento.router)
 
 app.include_router(
     consulta_items.router,
@@ -96,6 +132,21 @@ async def websocket_endpoint(websocket: WebSocket, order_id: int):
         print(f"Erro no WebSocket [Order ID: {order_id}]: {e}")
         manager.disconnect(websocket, order_id)
 
+@app.websocket("/ws/restaurant/{restaurant_id}")
+async def websocket_restaurante(websocket: WebSocket, restaurant_id: str, desde: Optional[int] = None):
+    """Tela da cozinha. '?desde=<seq>' retoma sem recarregar tudo."""
+    await manager.connect_restaurant(websocket, restaurant_id, desde, restaurante_admin.pedidos_abertos_cozinha)
+    try:
+        while True:
+            await websocket.receive_text()
+
+    except WebSocketDisconnect:
+        manager.disconnect_restaurant(websocket, restaurant_id)
+
+    except Exception as e:
+        print(f"Erro no WebSocket [Restaurante: {restaurant_id}]: {e}")
+        manager.disconnect_restaurant(websocket, restaurant_id)
+
 @app.get("/")
 async def root():
     return {"message": "Backend funcionando"}
\ No newline at end of file
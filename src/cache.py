@@ -0,0 +1,155 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Todos os caches nomeados ficam aqui para o endpoint /internal/caches
+caches_registrados: Dict[str, "TTLCache"] = {}
+
+
+def _tamanho_json(valor: Any) -> int:
+    """Estimativa de memória: tamanho do valor serializado em JSON."""
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    return len(json.dumps(valor, default=str))
+
+
+class TTLCache:
+    """
+    Cache em memória (por worker) com TTL por entrada, despejo LRU,
+    limite de itens e de bytes, contadores de hit/miss e single-flight:
+    várias buscas simultâneas pela mesma chave disparam um único carregamento.
+    """
+
+    def __init__(
+        self,
+        nome: str,
+        ttl: float,
+        max_itens: int = 1024,
+        max_bytes: Optional[int] = None,
+        tamanho: Callable[[Any], int] = _tamanho_json,
+    ):
+        self.nome = nome
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self._tamanho = tamanho
+        # chave -> (expira_em, bytes, valor), na ordem do menos para o mais recente
+        self._dados: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._em_voo: Dict[Hashable, asyncio.Future] = {}
+        # Gerações: 'invalidate' com carregamento em andamento anota a geração da
+        # chave, e o carregamento que começou antes dela não grava o valor (já velho)
+        self._geracao = 0
+        self._invalidada_em: Dict[Hashable, int] = {}
+        self._carregando = 0
+        self.bytes_usados = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalescidos = 0
+        self.despejos = 0
+        caches_registrados[nome] = self
+
+    def get(self, chave: Hashable) -> Optional[Any]:
+        entrada = self._dados.get(chave)
+        if entrada is None:
+            self.misses += 1
+            return None
+        expira_em, _, valor = entrada
+        if expira_em < time.monotonic():
+            self._remover(chave)
+            self.misses += 1
+            return None
+        self._dados.move_to_end(chave)
+        self.hits += 1
+        return valor
+
+    def set(self, chave: Hashable, valor: Any, ttl: Optional[float] = None):
+        tamanho = self._tamanho(valor) if self.max_bytes else 0
+        if self.max_bytes and tamanho > self.max_bytes:
+            return  # maior que o cache inteiro: não vale guardar
+        if chave in self._dados:
+            self._remover(chave)
+        self._dados[chave] = (time.monotonic() + (self.ttl if ttl is None else ttl), tamanho, valor)
+        self.bytes_usados += tamanho
+        while len(self._dados) > self.max_itens or (self.max_bytes and self.bytes_usados > self.max_bytes):
+            chave_antiga = next(iter(self._dados))
+            self._remover(chave_antiga)
+            self.despejos += 1
+
+    def invalidate(self, chave: Hashable):
+        if chave in self._dados:
+            self._remover(chave)
+        if self._carregando:
+            self._geracao += 1
+            self._invalidada_em[chave] = self._geracao
+            # Quem chegar agora não espera o carregamento velho: carrega de novo
+            self._em_voo.pop(chave, None)
+
+    def clear(self):
+        self._dados.clear()
+        self.bytes_usados = 0
+
+    async def get_or_load(self, chave: Hashable, carregar: Callable[[], Awaitable[Any]]) -> Any:
+        """Retorna do cache ou carrega uma única vez, mesmo com chamadas concorrentes."""
+        while True:
+            valor = self.get(chave)
+            if valor is not None:
+                return valor
+
+            em_voo = self._em_voo.get(chave)
+            if em_voo is None:
+                break
+            self.coalescidos += 1
+            try:
+                return await asyncio.shield(em_voo)
+            except asyncio.CancelledError:
+                # Quem carregava foi cancelado (ex.: o cliente dele desconectou):
+                # esta chamada não foi, então tenta carregar de novo
+                if em_voo.cancelled():
+                    continue
+                raise
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._em_voo[chave] = futuro
+        inicio = self._geracao
+        self._carregando += 1
+        try:
+            valor = await carregar()
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+        except BaseException as e:
+            futuro.set_exception(e)
+            # Evita "Future exception was never retrieved" quando ninguém esperava
+            futuro.exception()
+            raise
+        else:
+            if self._invalidada_em.get(chave, 0) <= inicio:
+                self.set(chave, valor)
+            futuro.set_result(valor)
+            return valor
+        finally:
+            if self._em_voo.get(chave) is futuro:
+                del self._em_voo[chave]
+            self._carregando -= 1
+            if not self._carregando:
+                self._invalidada_em.clear()
+
+    def _remover(self, chave: Hashable):
+        _, tamanho, _ = self._dados.pop(chave)
+        self.bytes_usados -= tamanho
+
+    def estatisticas(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "itens": len(self._dados),
+            "bytes": self.bytes_usados,
+            "max_itens": self.max_itens,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "coalescidos": self.coalescidos,
+            "despejos": self.despejos,
+        }
@@ -1,27 +1,152 @@
 # CORREÇÃO FINAL: Removed import of EnderecoModel to break the circular dependency.
-from sqlalchemy import create_engine
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-import os
-
-# --- CONEXÃO USANDO VARIÁVEIS DE AMBIENTE ---
-SQLALCHEMY_DATABASE_URL = "postgresql://{user}:{password}@{host}:{port}/{db}".format(
-    user=os.getenv("DB_USER", "postgres"),
-    password=os.getenv("DB_PASSWORD", "senha"),
-    host=os.getenv("DB_HOST", "localhost"),
-    port=os.getenv("DB_PORT", "5432"),
-    db=os.getenv("DB_NAME", "ifome")
-)
-
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from api.config import settings
+
+
+# --- MÉTRICAS DO POOL ---
+class MetricasPool:
+    """Contadores acumulados de checkout do pool (por processo/worker)."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.overflow_max = 0
+        self.conexoes_criadas = 0
+        self.conexoes_invalidadas = 0
+
+    def registrar_espera(self, segundos: float):
+        self.checkouts += 1
+        self.espera_total += segundos
+        if segundos > self.espera_max:
+            self.espera_max = segundos
+
+
+metricas_pool = MetricasPool()
+
+
+class PoolComMetricas(AsyncAdaptedQueuePool):
+    """QueuePool que mede quanto tempo cada checkout esperou por uma conexão livre."""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            metricas_pool.timeouts += 1
+            raise
+        finally:
+            metricas_pool.registrar_espera(time.perf_counter() - inicio)
+            metricas_pool.overflow_max = max(metricas_pool.overflow_max, self.overflow())
+
+
+# --- CONEXÃO (ENGINE ÚNICO, CONFIGURADO PELO Settings) ---
+def criar_engine(config=settings) -> AsyncEngine:
+    """
+    Cria o engine assíncrono a partir do Settings (api/config.py).
+    O pool é configurável pelo .env; no SQLite o pool padrão do driver é mantido.
+    """
+    url = config.DATABASE_URL
+    if url.startswith("sqlite"):
+        return create_async_engine(url)
+
+    novo_engine = create_async_engine(
+        url,
+        poolclass=PoolComMetricas,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+    )
+
+    @event.listens_for(novo_engine.sync_engine, "connect")
+    def _conexao_criada(dbapi_connection, connection_record):
+        metricas_pool.conexoes_criadas += 1
+
+    @event.listens_for(novo_engine.sync_engine, "invalidate")
+    def _conexao_invalidada(dbapi_connection, connection_record, exception):
+        metricas_pool.conexoes_invalidadas += 1
+
+    return novo_engine
+
+
+def estatisticas_pool() -> Dict[str, Any]:
+    """Fotografia do pool atual + métricas acumuladas, para dimensionar workers."""
+    pool = engine.pool
+    dados: Dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        dados.update({
+            "tamanho": pool.size(),
+            "em_uso": pool.checkedout(),
+            "livres": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "timeout": settings.DB_POOL_TIMEOUT,
+        })
+    dados.update({
+        "checkouts": metricas_pool.checkouts,
+        "timeouts": metricas_pool.timeouts,
+        "espera_media_ms": round(metricas_pool.espera_total / metricas_pool.checkouts * 1000, 3) if metricas_pool.checkouts else 0.0,
+        "espera_max_ms": round(metricas_pool.espera_max * 1000, 3),
+        "overflow_max": metricas_pool.overflow_max,
+        "conexoes_criadas": metricas_pool.conexoes_criadas,
+        "conexoes_invalidadas": metricas_pool.conexoes_invalidadas,
+    })
+    return dados
+
+
+engine = criar_engine()
+# expire_on_commit=False: depois do commit os objetos continuam legíveis sem
+# disparar lazy loads (que não existem na sessão assíncrona).
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
-# função para fornecer sessão do banco
-def get_db():
-    db = SessionLocal()
+# --- CONTADOR DE QUERIES (DEBUG) ---
+# Cada requisição que quiser medir abre um contador no contexto atual;
+# o listener abaixo soma 1 a cada comando enviado ao banco.
+_contador_atual: ContextVar[Optional[List[int]]] = ContextVar("contador_queries", default=None)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _contar_query(conn, cursor, statement, parameters, context, executemany):
+    contador = _contador_atual.get()
+    if contador is not None:
+        contador[0] += 1
+
+
+@contextmanager
+def contador_de_queries():
+    """Conta quantos round trips ao banco acontecem dentro do bloco."""
+    contador = [0]
+    token = _contador_atual.set(contador)
     try:
-        yield db
+        yield contador
     finally:
-        db.close()
+        _contador_atual.reset(token)
+
+
+# --- INSERT COM ON CONFLICT (Postgres e SQLite) ---
+def dialect_insert(db: AsyncSession, tabela):
+    """INSERT do dialeto em uso, que aceita on_conflict_do_nothing/do_update."""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(tabela)
+
+
+# função para fornecer sessão do banco
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
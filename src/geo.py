@@ -0,0 +1,70 @@
+from typing import Tuple
+
+# Alfabeto base32 padrão do geohash
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat: float, lng: float, precisao: int = 6) -> str:
+    """
+    Codifica lat/lng em geohash. Com precisão 6 a célula tem ~1,2 km x 0,6 km,
+    ou seja, usuários do mesmo bairro caem na mesma célula.
+    """
+    lat_min, lat_max = -90.0, 90.0
+    lng_min, lng_max = -180.0, 180.0
+    resultado = []
+    bits = 0
+    valor = 0
+    usar_lng = True
+
+    while len(resultado) < precisao:
+        if usar_lng:
+            meio = (lng_min + lng_max) / 2
+            if lng >= meio:
+                valor = (valor << 1) | 1
+                lng_min = meio
+            else:
+                valor <<= 1
+                lng_max = meio
+        else:
+            meio = (lat_min + lat_max) / 2
+            if lat >= meio:
+                valor = (valor << 1) | 1
+                lat_min = meio
+            else:
+                valor <<= 1
+                lat_max = meio
+        usar_lng = not usar_lng
+        bits += 1
+        if bits == 5:
+            resultado.append(_BASE32[valor])
+            bits = 0
+            valor = 0
+
+    return "".join(resultado)
+
+
+def centro_geohash(celula: str) -> Tuple[float, float]:
+    """Retorna (lat, lng) do centro da célula."""
+    lat_min, lat_max = -90.0, 90.0
+    lng_min, lng_max = -180.0, 180.0
+    usar_lng = True
+
+    for caractere in celula:
+        valor = _BASE32.index(caractere)
+        for deslocamento in range(4, -1, -1):
+            bit = (valor >> deslocamento) & 1
+            if usar_lng:
+                meio = (lng_min + lng_max) / 2
+                if bit:
+                    lng_min = meio
+                else:
+                    lng_max = meio
+            else:
+                meio = (lat_min + lat_max) / 2
+                if bit:
+                    lat_min = meio
+                else:
+                    lat_max = meio
+            usar_lng = not usar_lng
+
+    return (lat_min + lat_max) / 2, (lng_min + lng_max) / 2
@@ -0,0 +1,139 @@
+"""
+Migrações versionadas do schema.
+
+O create_all do lifespan só cria tabelas novas; alterações em tabelas que já
+existem em produção (índices, colunas, constraints) entram aqui, cada uma com
+um número de versão. A tabela 'schema_migrations' guarda o que já foi aplicado,
+então cada migração roda uma única vez por banco.
+
+Para aplicar fora do app:
+    python -m src.migracoes
+"""
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, List, Tuple, Union
+
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.database import engine
+
+Passo = Union[str, Callable[[AsyncConnection], Awaitable[None]]]
+
+
+def adicionar_coluna(tabela: str, coluna: str, tipo: str) -> Passo:
+    """
+    ALTER TABLE ... ADD COLUMN só se a coluna ainda não existir: em banco novo
+    o create_all já cria a tabela com ela (e SQLite não tem ADD COLUMN IF NOT EXISTS).
+    """
+    async def passo(conn: AsyncConnection):
+        colunas = await conn.run_sync(lambda sync: {c["name"] for c in inspect(sync).get_columns(tabela)})
+        if coluna not in colunas:
+            await conn.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}"))
+    return passo
+
+
+async def _preencher_rollup(conn: AsyncConnection):
+    # Import tardio: o rollup importa os modelos, que só precisam existir aqui
+    from src.vendas_rollup import preencher_ate_hoje
+    await preencher_ate_hoje(conn)
+
+
+# (versão, descrição, passos). Passo = SQL ou função async(conn).
+# Só acrescentar no fim, nunca editar uma já publicada.
+MIGRACOES: List[Tuple[int, str, List[Passo]]] = [
+    (1, "índices compostos de pedidos e pedido_itens", [
+        "CREATE INDEX IF NOT EXISTS ix_pedidos_restaurant_criado_em ON pedidos (restaurant_id, criado_em)",
+        "CREATE INDEX IF NOT EXISTS ix_pedidos_user_criado_em ON pedidos (user_id, criado_em DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_pedidos_status_criado_em ON pedidos (status, criado_em)",
+        "CREATE INDEX IF NOT EXISTS ix_pedidos_criado_em ON pedidos (criado_em)",
+        "CREATE INDEX IF NOT EXISTS ix_pedido_itens_order_id ON pedido_itens (order_id)",
+        "CREATE INDEX IF NOT EXISTS ix_pedido_itens_item_id ON pedido_itens (item_id)",
+    ]),
+    (2, "pedidos.atualizado_em para o feed de alterações do restaurante", [
+        adicionar_coluna("pedidos", "atualizado_em", "TIMESTAMP"),
+        "UPDATE pedidos SET atualizado_em = criado_em WHERE atualizado_em IS NULL",
+        "CREATE INDEX IF NOT EXISTS ix_pedidos_restaurant_atualizado_em ON pedidos (restaurant_id, atualizado_em, id)",
+    ]),
+    (3, "sacola_items única por (user_id, restaurant_id, item_id) para o upsert", [
+        # Junta as linhas duplicadas (toques simultâneos) na de menor id antes do índice único
+        "UPDATE sacola_items SET quantidade = ("
+        " SELECT SUM(s2.quantidade) FROM sacola_items s2"
+        " WHERE s2.user_id = sacola_items.user_id AND s2.restaurant_id = sacola_items.restaurant_id"
+        " AND s2.item_id = sacola_items.item_id"
+        ") WHERE id IN ("
+        " SELECT MIN(id) FROM sacola_items GROUP BY user_id, restaurant_id, item_id HAVING COUNT(*) > 1"
+        ")",
+        "DELETE FROM sacola_items WHERE id NOT IN ("
+        " SELECT MIN(id) FROM sacola_items GROUP BY user_id, restaurant_id, item_id"
+        ")",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_sacola_user_restaurante_item"
+        " ON sacola_items (user_id, restaurant_id, item_id)",
+    ]),
+    (4, "nota agregada por restaurante (avaliacoes_restaurante) a partir das avaliações existentes", [
+        "DELETE FROM avaliacoes_restaurante",
+        "INSERT INTO avaliacoes_restaurante"
+        " (restaurant_id, n_avaliacoes, soma_notas, notas_1, notas_2, notas_3, notas_4, notas_5)"
+        " SELECT p.restaurant_id, COUNT(*), SUM(a.nota),"
+        " SUM(CASE WHEN a.nota = 1 THEN 1 ELSE 0 END),"
+        " SUM(CASE WHEN a.nota = 2 THEN 1 ELSE 0 END),"
+        " SUM(CASE WHEN a.nota = 3 THEN 1 ELSE 0 END),"
+        " SUM(CASE WHEN a.nota = 4 THEN 1 ELSE 0 END),"
+        " SUM(CASE WHEN a.nota = 5 THEN 1 ELSE 0 END)"
+        " FROM avaliacoes a JOIN pedidos p ON p.id = a.pedido_id"
+        " GROUP BY p.restaurant_id",
+    ]),
+    (5, "rollup diário de vendas dos pedidos anteriores à sua criação (até hoje)", [
+        _preencher_rollup,
+    ]),
+]
+
+
+# Chave do advisory lock do Postgres que serializa create_all + migrações
+# entre workers que sobem ao mesmo tempo (qualquer inteiro fixo serve)
+CHAVE_LOCK_SCHEMA = 7_310_001
+
+
+async def travar_schema(conn: AsyncConnection):
+    """
+    Só um worker por vez mexe no schema: os outros esperam aqui e, quando
+    entram, já encontram as tabelas e as migrações aplicadas. O lock é da
+    transação (some no commit/rollback) e reentrante na mesma conexão.
+    SQLite não tem advisory lock (e já serializa escritas no arquivo).
+    """
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:chave)"), {"chave": CHAVE_LOCK_SCHEMA})
+
+
+async def aplicar_migracoes(conn: AsyncConnection):
+    """Aplica, em ordem, as migrações que ainda não constam em schema_migrations."""
+    await travar_schema(conn)
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "versao INTEGER PRIMARY KEY, descricao VARCHAR NOT NULL, aplicada_em TIMESTAMP NOT NULL)"
+    ))
+    aplicadas = set((await conn.execute(text("SELECT versao FROM schema_migrations"))).scalars())
+
+    for versao, descricao, passos in MIGRACOES:
+        if versao in aplicadas:
+            continue
+        for passo in passos:
+            if isinstance(passo, str):
+                await conn.execute(text(passo))
+            else:
+                await passo(conn)
+        await conn.execute(
+            text("INSERT INTO schema_migrations (versao, descricao, aplicada_em) VALUES (:v, :d, :a)"),
+            {"v": versao, "d": descricao, "a": datetime.utcnow()},
+        )
+        print(f"Migração {versao} aplicada: {descricao}")
+
+
+async def _main():
+    async with engine.begin() as conn:
+        await aplicar_migracoes(conn)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -14,3 +14,30 @@ class Avaliacao(Base):
 
     # Relacionamento
     pedido = relationship("OrderModel", backref="avaliacao")
+
+
+class AvaliacaoRestaurante(Base):
+    """
+    Nota agregada por restaurante (todas as avaliações), mantida incrementalmente
+    em src/vendas_rollup.py junto com a avaliação. Lida por chave primária na
+    página do restaurante e na busca de restaurantes próximos.
+    """
+    __tablename__ = "avaliacoes_restaurante"
+
+    restaurant_id = Column(String, primary_key=True)
+    n_avaliacoes = Column(Integer, nullable=False, default=0)
+    soma_notas = Column(Integer, nullable=False, default=0)
+    # Histograma: quantas avaliações com cada nota
+    notas_1 = Column(Integer, nullable=False, default=0)
+    notas_2 = Column(Integer, nullable=False, default=0)
+    notas_3 = Column(Integer, nullable=False, default=0)
+    notas_4 = Column(Integer, nullable=False, default=0)
+    notas_5 = Column(Integer, nullable=False, default=0)
+
+    @property
+    def media(self) -> float:
+        return round(self.soma_notas / self.n_avaliacoes, 1) if self.n_avaliacoes else 0.0
+
+    @property
+    def histograma(self) -> dict:
+        return {nota: getattr(self, f"notas_{nota}") for nota in range(1, 6)}
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON
+from datetime import datetime
+from src.database import Base
+
+class GeocodeCache(Base):
+    """
+    Cache persistente de geocodificação.
+    A chave é o endereço normalizado (CEP + rua + número), então o mesmo
+    endereço salvo de novo não volta a consultar o Google.
+    """
+    __tablename__ = "geocode_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    chave = Column(String, unique=True, index=True, nullable=False)
+    endereco_consultado = Column(String, nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+
+    # Metadados do provedor, para revalidar as entradas em segundo plano
+    provedor = Column(String, nullable=False, default="google")
+    place_id = Column(String, nullable=True)
+    endereco_formatado = Column(String, nullable=True)
+    tipo_localizacao = Column(String, nullable=True)  # ROOFTOP, APPROXIMATE...
+    resposta = Column(JSON, nullable=True)            # results[0] bruto
+
+    criado_em = Column(DateTime, default=datetime.utcnow)
+    validado_em = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index
+from datetime import datetime
+from src.database import Base
+
+class OutboxMensagem(Base):
+    """
+    Mensagem a entregar fora do request (NF, e-mail de status...).
+    É gravada na MESMA transação do pedido/mudança de status e entregue
+    depois pelo worker de src/outbox.py, com retentativas.
+    """
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String, nullable=False)          # nf_pedido, email_status...
+    payload = Column(JSON, nullable=False)
+
+    # pendente -> processando -> enviado | morto (esgotou as tentativas)
+    status = Column(String, nullable=False, default="pendente")
+    tentativas = Column(Integer, nullable=False, default=0)
+    # Próxima tentativa (pendente) ou fim da reserva do worker (processando)
+    proxima_tentativa_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+    ultimo_erro = Column(String, nullable=True)
+
+    criado_em = Column(DateTime, default=datetime.utcnow)
+    enviado_em = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_status_proxima", "status", "proxima_tentativa_em"),
+    )
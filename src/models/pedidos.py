@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum as SqlEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, Enum as SqlEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -38,6 +38,7 @@ class OrderModel(Base):
     codigo_entrega = Column(String, nullable=True) 
     observacoes = Column(String, nullable=True) # Novo campo de observações
     criado_em = Column(DateTime, default=datetime.utcnow)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # RELACIONAMENTOS (Corrigidos e Completos)
     usuario = relationship("Usuario", back_populates="pedidos") 
@@ -45,12 +46,20 @@ class OrderModel(Base):
     endereco = relationship("Endereco", back_populates="pedidos")
     restaurant = relationship("RestaurantModel", back_populates="pedidos")
 
+# Índices dos relatórios e listagens (mesmos nomes das migrações em src/migracoes.py,
+# que os cria em bancos que já existiam antes deles)
+Index("ix_pedidos_restaurant_criado_em", OrderModel.restaurant_id, OrderModel.criado_em)
+Index("ix_pedidos_user_criado_em", OrderModel.user_id, OrderModel.criado_em.desc())
+Index("ix_pedidos_status_criado_em", OrderModel.status, OrderModel.criado_em)
+Index("ix_pedidos_criado_em", OrderModel.criado_em)
+Index("ix_pedidos_restaurant_atualizado_em", OrderModel.restaurant_id, OrderModel.atualizado_em, OrderModel.id)
+
 class PedidoItem(Base):
     __tablename__ = "pedido_itens"
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("pedidos.id"))
-    item_id = Column(Integer, ForeignKey("items.id"))
+    order_id = Column(Integer, ForeignKey("pedidos.id"), index=True)
+    item_id = Column(Integer, ForeignKey("items.id"), index=True)
     quantidade = Column(Integer, nullable=False)
     preco_unitario_pago = Column(Float, nullable=False)
     order = relationship("OrderModel", back_populates="itens")
-    item = relationship("Item")
\ No newline at end of file
+    item = relationship("Item")
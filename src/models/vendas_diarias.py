@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, Float, Date
+from src.database import Base
+
+# Rollup diário das vendas, mantido incrementalmente (src/vendas_rollup.py)
+# e lido pelos relatórios no lugar de varrer a tabela 'pedidos'.
+
+class VendaDiariaRestaurante(Base):
+    """Totais por dia x restaurante (nível do pedido)."""
+    __tablename__ = "vendas_diarias_restaurante"
+
+    dia = Column(Date, primary_key=True)
+    restaurant_id = Column(String, primary_key=True)
+    n_pedidos = Column(Integer, nullable=False, default=0)
+    faturamento = Column(Float, nullable=False, default=0.0)   # soma de total_price
+    n_cancelados = Column(Integer, nullable=False, default=0)
+    faturamento_cancelado = Column(Float, nullable=False, default=0.0)
+    n_avaliacoes = Column(Integer, nullable=False, default=0)
+    soma_notas = Column(Integer, nullable=False, default=0)
+
+
+class VendaDiariaItem(Base):
+    """Totais por dia x restaurante x item (nível do item do pedido)."""
+    __tablename__ = "vendas_diarias_item"
+
+    dia = Column(Date, primary_key=True)
+    restaurant_id = Column(String, primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    quantidade = Column(Integer, nullable=False, default=0)
+    valor_faturado = Column(Float, nullable=False, default=0.0)  # soma de quantidade x preço pago
@@ -0,0 +1,256 @@
+"""
+Geração do PDF da Nota Fiscal do pedido, em Python puro (sem dependências).
+
+- O layout é montado uma vez no import (_TEMPLATE_*): cada página só
+  preenche os campos variáveis nos fragmentos já prontos.
+- A renderização é CPU pura e roda num ProcessPoolExecutor, nunca no event loop.
+- O PDF fica em cache no disco por pedido + hash do conteúdo: o mesmo pedido
+  com os mesmos dados não é renderizado de novo (ex.: retentativa da outbox).
+  Arquivos sem uso há NF_PDF_CACHE_DIAS saem, e a pasta não passa de
+  NF_PDF_CACHE_MAX_BYTES (os menos usados saem primeiro).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from api.config import settings
+
+# Muda quando o layout mudar, para não servir PDFs antigos do cache
+VERSAO_TEMPLATE = "1"
+
+# --- LAYOUT (A4, pontos) ---
+LARGURA, ALTURA = 595, 842
+MARGEM = 50
+COL_QTD, COL_NOME, COL_UNIT_DIR, COL_TOTAL_DIR = MARGEM, MARGEM + 40, 430, LARGURA - MARGEM
+ITENS_POR_PAGINA = 38
+
+# Larguras (1/1000 do corpo) da Helvetica para alinhar valores à direita
+_LARGURAS = {" ": 278, ",": 278, ".": 278, "R": 722, "$": 556, "-": 333}
+
+
+def _largura(texto: str, tamanho: float) -> float:
+    return sum(_LARGURAS.get(c, 556) for c in texto) * tamanho / 1000
+
+
+def _escapar(texto: str) -> str:
+    """Texto de string PDF: WinAnsi (cp1252) e parênteses/barra escapados."""
+    texto = texto.encode("cp1252", "replace").decode("latin-1")
+    return texto.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _moeda(valor: float) -> str:
+    return "R$ " + f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _texto(fonte: str, tamanho: float, x: float, y: float, texto: str) -> str:
+    return f"BT /{fonte} {tamanho} Tf {x:.1f} {y:.1f} Td ({_escapar(texto)}) Tj ET\n"
+
+
+def _direita(fonte: str, tamanho: float, x_dir: float, y: float, texto: str) -> str:
+    return _texto(fonte, tamanho, x_dir - _largura(texto, tamanho), y, texto)
+
+
+# --- TEMPLATE PRÉ-COMPILADO ---
+# Partes fixas de toda página; só '{...}' muda por pedido.
+_TEMPLATE_CABECALHO = (
+    "0.9 g 0 {topo} {largura} 70 re f 0 g\n"
+    + _texto("F2", 18, MARGEM, ALTURA - 45, "iFome - Nota Fiscal")
+    + "{linha_pedido}"
+    + _texto("F2", 9, COL_QTD, ALTURA - 190, "Qtd")
+    + _texto("F2", 9, COL_NOME, ALTURA - 190, "Item")
+    + _direita("F2", 9, COL_UNIT_DIR, ALTURA - 190, "Unitário")
+    + _direita("F2", 9, COL_TOTAL_DIR, ALTURA - 190, "Total")
+    + f"0.5 w {MARGEM} {ALTURA - 196} m {LARGURA - MARGEM} {ALTURA - 196} l S\n"
+).replace("{topo}", str(ALTURA - 70)).replace("{largura}", str(LARGURA))
+_TEMPLATE_RODAPE = f"0.5 w {MARGEM} 60 m {LARGURA - MARGEM} 60 l S\n"
+_Y_PRIMEIRO_ITEM = ALTURA - 212
+_ALTURA_LINHA = 15
+
+_OBJETOS_FIXOS = (
+    b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+)
+
+
+def _conteudo_pagina(dados: Dict[str, Any], itens: List[dict], pagina: int, total_paginas: int, ultima: bool) -> str:
+    partes = [_TEMPLATE_CABECALHO.replace("{linha_pedido}", (
+        _texto("F1", 10, MARGEM, ALTURA - 95, f"Pedido #{dados['orderId']}")
+        + _texto("F1", 10, MARGEM, ALTURA - 110, f"Data: {dados.get('dataPedido') or '-'}")
+        + _texto("F1", 10, MARGEM, ALTURA - 130, f"Cliente: {dados.get('clienteNome') or '-'}")
+        + _texto("F1", 10, MARGEM, ALTURA - 145, f"Endereço: {dados.get('clienteEndereco') or '-'}")
+        + _texto("F1", 10, MARGEM, ALTURA - 160, f"Entrega: {dados.get('tipoEntrega') or '-'}")
+    ))]
+
+    y = _Y_PRIMEIRO_ITEM
+    for item in itens:
+        quantidade = item["quantidade"]
+        unitario = item["preco_unitario"]
+        partes.append(_texto("F1", 9, COL_QTD, y, f"{quantidade}x"))
+        partes.append(_texto("F1", 9, COL_NOME, y, str(item["nome"])[:55]))
+        partes.append(_direita("F1", 9, COL_UNIT_DIR, y, _moeda(unitario)))
+        partes.append(_direita("F1", 9, COL_TOTAL_DIR, y, _moeda(quantidade * unitario)))
+        y -= _ALTURA_LINHA
+
+    if ultima:
+        y -= 10
+        partes.append(f"0.5 w {COL_UNIT_DIR - 80} {y + 12} m {LARGURA - MARGEM} {y + 12} l S\n")
+        partes.append(_texto("F2", 11, COL_UNIT_DIR - 80, y - 4, "Total do pedido"))
+        partes.append(_direita("F2", 11, COL_TOTAL_DIR, y - 4, _moeda(dados["total"])))
+
+    partes.append(_TEMPLATE_RODAPE)
+    partes.append(_direita("F1", 8, COL_TOTAL_DIR, 45, f"Página {pagina} de {total_paginas}"))
+    return "".join(partes)
+
+
+def renderizar_nf(dados: Dict[str, Any]) -> bytes:
+    """
+    Gera o PDF (bytes) a partir dos dados da NF (mesmo formato do payload
+    do e-mail: orderId, clienteNome, clienteEndereco, total, itens...).
+    Função pura e de módulo, para poder rodar no pool de processos.
+    """
+    itens = dados.get("itens") or []
+    blocos = [itens[i:i + ITENS_POR_PAGINA] for i in range(0, len(itens), ITENS_POR_PAGINA)] or [[]]
+    total_paginas = len(blocos)
+
+    # Objetos: 1 catálogo, 2 páginas, 3-4 fontes, depois (página, conteúdo) por página
+    objetos: List[bytes] = [b"", b""] + list(_OBJETOS_FIXOS)
+    ids_paginas = []
+    for numero, bloco in enumerate(blocos, start=1):
+        conteudo = _conteudo_pagina(dados, bloco, numero, total_paginas, numero == total_paginas).encode("latin-1")
+        id_pagina = len(objetos) + 1
+        ids_paginas.append(id_pagina)
+        objetos.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {LARGURA} {ALTURA}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {id_pagina + 1} 0 R >>".encode()
+        )
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(conteudo) + conteudo + b"\nendstream")
+
+    objetos[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(f"{i} 0 R" for i in ids_paginas)
+    objetos[1] = f"<< /Type /Pages /Kids [{kids}] /Count {total_paginas} >>".encode()
+
+    saida = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for numero, corpo in enumerate(objetos, start=1):
+        offsets.append(len(saida))
+        saida += b"%d 0 obj\n" % numero + corpo + b"\nendobj\n"
+
+    inicio_xref = len(saida)
+    saida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    for offset in offsets:
+        saida += b"%010d 00000 n \n" % offset
+    saida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, inicio_xref)
+    return bytes(saida)
+
+
+# --- CACHE EM DISCO + POOL DE PROCESSOS ---
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.NF_PDF_WORKERS)
+    return _executor
+
+
+def encerrar_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _caminho_cache(dados: Dict[str, Any]) -> str:
+    """<dir>/<pedido>-<hash>.pdf; o hash cobre os dados que aparecem no PDF + versão do layout."""
+    campos = {k: dados.get(k) for k in ("orderId", "dataPedido", "clienteNome", "clienteEndereco", "tipoEntrega", "total", "itens")}
+    digest = hashlib.sha256(
+        (VERSAO_TEMPLATE + json.dumps(campos, sort_keys=True, ensure_ascii=False, default=str)).encode()
+    ).hexdigest()[:20]
+    return os.path.join(settings.NF_PDF_DIR, f"{dados['orderId']}-{digest}.pdf")
+
+
+def _ler(caminho: str) -> Optional[bytes]:
+    try:
+        with open(caminho, "rb") as arquivo:
+            pdf = arquivo.read()
+        # mtime = último uso: a limpeza tira primeiro os PDFs parados
+        os.utime(caminho)
+        return pdf
+    except FileNotFoundError:
+        return None
+
+
+def _gravar(caminho: str, pdf: bytes):
+    # Grava num temporário e renomeia: quem ler nunca vê um PDF pela metade
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(pdf)
+    os.replace(temporario, caminho)
+
+
+# Limpeza do cache em disco, no máximo uma vez por intervalo por worker
+_INTERVALO_LIMPEZA = 600
+_ultima_limpeza = 0.0
+
+
+def limpar_cache(pasta: str, max_idade_s: float, max_bytes: int) -> int:
+    """Apaga PDFs parados há mais de max_idade_s e, se ainda passar de max_bytes, os mais antigos."""
+    arquivos = []
+    try:
+        entradas = list(os.scandir(pasta))
+    except FileNotFoundError:
+        return 0
+    for entrada in entradas:
+        if not entrada.name.endswith(".pdf"):
+            continue
+        try:
+            info = entrada.stat()
+        except FileNotFoundError:
+            continue
+        arquivos.append((info.st_mtime, info.st_size, entrada.path))
+
+    arquivos.sort()
+    limite_idade = time.time() - max_idade_s
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    apagados = 0
+    for mtime, tamanho, caminho in arquivos:
+        if mtime >= limite_idade and total <= max_bytes:
+            break  # do mais antigo para o mais novo: o resto fica
+        try:
+            os.remove(caminho)
+            apagados += 1
+        except FileNotFoundError:
+            pass  # outro worker apagou antes
+        total -= tamanho
+    return apagados
+
+
+async def _limpar_se_preciso():
+    global _ultima_limpeza
+    if time.monotonic() - _ultima_limpeza < _INTERVALO_LIMPEZA:
+        return
+    _ultima_limpeza = time.monotonic()
+    await asyncio.to_thread(
+        limpar_cache, settings.NF_PDF_DIR, settings.NF_PDF_CACHE_DIAS * 86400, settings.NF_PDF_CACHE_MAX_BYTES
+    )
+
+
+async def gerar_pdf_nf(dados: Dict[str, Any]) -> bytes:
+    """PDF da NF: do cache em disco ou renderizado no pool de processos."""
+    caminho = _caminho_cache(dados)
+    pdf = await asyncio.to_thread(_ler, caminho)
+    if pdf is not None:
+        return pdf
+
+    loop = asyncio.get_running_loop()
+    pdf = await loop.run_in_executor(_pool(), renderizar_nf, dados)
+    await asyncio.to_thread(_gravar, caminho, pdf)
+    await _limpar_se_preciso()
+    return pdf
@@ -0,0 +1,236 @@
+"""
+Outbox transacional: NF e e-mails de status saem do request sem se perder.
+
+O request grava a mensagem com 'enfileirar' na mesma transação do pedido.
+O OutboxWorker (um por processo, iniciado no lifespan) reserva lotes de
+mensagens vencidas, entrega com concorrência limitada e, em caso de falha,
+reagenda com backoff exponencial até OUTBOX_MAX_TENTATIVAS -> 'morto'.
+"""
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.config import settings
+from src.database import SessionLocal
+from src.models.outbox import OutboxMensagem
+
+Entrega = Callable[[Dict[str, Any]], Awaitable[None]]
+
+ERRO_RESERVA_VENCIDA = "reserva vencida: o worker caiu ou travou durante a entrega"
+
+# tipo -> função que entrega o payload (levanta exceção se falhar)
+_entregas: Dict[str, Entrega] = {}
+
+
+def registrar_entrega(tipo: str):
+    """Decorator: associa a função de entrega a um tipo de mensagem."""
+    def decorator(funcao: Entrega) -> Entrega:
+        _entregas[tipo] = funcao
+        return funcao
+    return decorator
+
+
+def enfileirar(db: AsyncSession, tipo: str, payload: Dict[str, Any]):
+    """Adiciona a mensagem na sessão; ela só existe se a transação for commitada."""
+    db.add(OutboxMensagem(tipo=tipo, payload=payload, proxima_tentativa_em=datetime.utcnow()))
+
+
+def backoff(tentativas: int) -> float:
+    """Segundos até a próxima tentativa (exponencial com jitter, com teto)."""
+    espera = min(settings.OUTBOX_BACKOFF_BASE ** tentativas, settings.OUTBOX_BACKOFF_MAX)
+    return espera * random.uniform(0.8, 1.2)
+
+
+class MetricasOutbox:
+    """Entregas e latência (criação -> entrega) deste worker."""
+
+    def __init__(self):
+        self.enviados = 0
+        self.falhas = 0
+        self.mortos = 0
+        self.em_andamento = 0
+        self.latencia_total = 0.0
+        self.latencia_max = 0.0
+        self.ultimo_ciclo_ms = 0.0
+
+    def registrar_envio(self, latencia: float):
+        self.enviados += 1
+        self.latencia_total += latencia
+        self.latencia_max = max(self.latencia_max, latencia)
+
+    def estatisticas(self) -> dict:
+        return {
+            "enviados": self.enviados,
+            "falhas": self.falhas,
+            "mortos": self.mortos,
+            "em_andamento": self.em_andamento,
+            "latencia_media_s": round(self.latencia_total / self.enviados, 2) if self.enviados else 0.0,
+            "latencia_max_s": round(self.latencia_max, 2),
+            "ultimo_ciclo_ms": round(self.ultimo_ciclo_ms, 1),
+        }
+
+
+metricas_outbox = MetricasOutbox()
+
+
+async def profundidade_fila(db: AsyncSession) -> Dict[str, int]:
+    """Quantidade de mensagens por status (pendente = backlog)."""
+    linhas = (await db.execute(
+        select(OutboxMensagem.status, func.count(OutboxMensagem.id)).group_by(OutboxMensagem.status)
+    )).all()
+    return {status: total for status, total in linhas}
+
+
+class OutboxWorker:
+    def __init__(self):
+        self._tarefa: Optional[asyncio.Task] = None
+        self._acordar = asyncio.Event()
+        self._semaforo = asyncio.Semaphore(settings.OUTBOX_CONCORRENCIA)
+
+    def iniciar(self):
+        if self._tarefa is None:
+            self._tarefa = asyncio.create_task(self._loop())
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+    def acordar(self):
+        """Chamado após o commit de uma mensagem nova: entrega sem esperar o próximo ciclo."""
+        self._acordar.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                inicio = time.perf_counter()
+                processadas = await self.processar_lote()
+                metricas_outbox.ultimo_ciclo_ms = (time.perf_counter() - inicio) * 1000
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Erro no worker da outbox: {e}")
+                processadas = 0
+
+            # Lote cheio: provavelmente há mais, segue direto
+            if processadas >= settings.OUTBOX_LOTE:
+                continue
+            try:
+                await asyncio.wait_for(self._acordar.wait(), timeout=settings.OUTBOX_INTERVALO)
+            except asyncio.TimeoutError:
+                pass
+            self._acordar.clear()
+
+    async def _reservar(self) -> List[OutboxMensagem]:
+        """
+        Pega um lote vencido e marca como 'processando' até OUTBOX_RESERVA.
+        SKIP LOCKED (Postgres) deixa vários workers dividirem a fila; uma
+        reserva vencida (worker caiu no meio) volta a ser elegível, mas conta
+        como tentativa: mensagem que derruba o worker acaba em 'morto'.
+        """
+        agora = datetime.utcnow()
+        async with SessionLocal() as db:
+            mensagens = (await db.scalars(
+                select(OutboxMensagem).where(
+                    or_(OutboxMensagem.status == "pendente", OutboxMensagem.status == "processando"),
+                    OutboxMensagem.proxima_tentativa_em <= agora,
+                ).order_by(
+                    OutboxMensagem.proxima_tentativa_em
+                ).limit(settings.OUTBOX_LOTE).with_for_update(skip_locked=True)
+            )).all()
+            # Reserva vencida conta como tentativa; esgotou -> 'morto'
+            retomadas = [m for m in mensagens if m.status == "processando"]
+            mortas = [m for m in retomadas if m.tentativas + 1 >= settings.OUTBOX_MAX_TENTATIVAS]
+            reservar = [m for m in mensagens if m not in mortas]
+            sem_sincronizar = {"synchronize_session": False}
+
+            if retomadas:
+                await db.execute(
+                    update(OutboxMensagem).where(
+                        OutboxMensagem.id.in_([m.id for m in retomadas])
+                    ).values(
+                        tentativas=OutboxMensagem.tentativas + 1,
+                        ultimo_erro=ERRO_RESERVA_VENCIDA,
+                    ),
+                    execution_options=sem_sincronizar,
+                )
+            if mortas:
+                metricas_outbox.mortos += len(mortas)
+                print(f"☠️ Outbox: {len(mortas)} mensagem(ns) desistidas após reservas vencidas seguidas")
+                await db.execute(
+                    update(OutboxMensagem).where(
+                        OutboxMensagem.id.in_([m.id for m in mortas])
+                    ).values(status="morto"),
+                    execution_options=sem_sincronizar,
+                )
+            if reservar:
+                await db.execute(
+                    update(OutboxMensagem).where(
+                        OutboxMensagem.id.in_([m.id for m in reservar])
+                    ).values(
+                        status="processando",
+                        proxima_tentativa_em=agora + timedelta(seconds=settings.OUTBOX_RESERVA),
+                    ),
+                    execution_options=sem_sincronizar,
+                )
+            await db.commit()
+
+        # Fora da sessão (objetos já desanexados): acerta a contagem usada em _entregar
+        for m in retomadas:
+            m.tentativas += 1
+        return reservar
+
+    async def processar_lote(self) -> int:
+        mensagens = await self._reservar()
+        if mensagens:
+            resultados = await asyncio.gather(*(self._entregar(m) for m in mensagens))
+            async with SessionLocal() as db:
+                for valores in resultados:
+                    await db.execute(
+                        update(OutboxMensagem).where(OutboxMensagem.id == valores.pop("id")).values(**valores)
+                    )
+                await db.commit()
+        return len(mensagens)
+
+    async def _entregar(self, mensagem: OutboxMensagem) -> Dict[str, Any]:
+        """Entrega uma mensagem e devolve as colunas a atualizar."""
+        async with self._semaforo:
+            metricas_outbox.em_andamento += 1
+            try:
+                entrega = _entregas.get(mensagem.tipo)
+                if entrega is None:
+                    raise RuntimeError(f"Nenhuma entrega registrada para '{mensagem.tipo}'")
+                await entrega(mensagem.payload)
+            except Exception as e:
+                tentativas = mensagem.tentativas + 1
+                metricas_outbox.falhas += 1
+                if tentativas >= settings.OUTBOX_MAX_TENTATIVAS:
+                    metricas_outbox.mortos += 1
+                    print(f"☠️ Outbox #{mensagem.id} ({mensagem.tipo}) desistiu após {tentativas} tentativas: {e}")
+                    return {"id": mensagem.id, "status": "morto", "tentativas": tentativas, "ultimo_erro": str(e)[:500]}
+                return {
+                    "id": mensagem.id,
+                    "status": "pendente",
+                    "tentativas": tentativas,
+                    "ultimo_erro": str(e)[:500],
+                    "proxima_tentativa_em": datetime.utcnow() + timedelta(seconds=backoff(tentativas)),
+                }
+            finally:
+                metricas_outbox.em_andamento -= 1
+
+        agora = datetime.utcnow()
+        metricas_outbox.registrar_envio((agora - mensagem.criado_em).total_seconds())
+        return {"id": mensagem.id, "status": "enviado", "enviado_em": agora, "ultimo_erro": None}
+
+
+# Instância única, iniciada/parada no lifespan do main.py
+outbox_worker = OutboxWorker()
@@ -1,6 +1,6 @@
 import re
 from pydantic import BaseModel, Field, field_validator, ConfigDict, EmailStr
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from enum import Enum 
 
@@ -123,6 +123,17 @@ class PedidoCreate(BaseModel):
     horario_entrega: Optional[str] = None
 
 
+class PedidoFromSacola(BaseModel):
+    """Checkout com a sacola guardada no servidor: os itens não vêm no corpo"""
+    restaurante_id: str
+    endereco_id: int
+    codigo_pagamento: str = Field(..., description="Código do método (PIX, CARTAO, DINHEIRO).")
+    card_token: Optional[str] = Field(None, description="Token seguro do cartão salvo, se aplicável.")
+    observacoes: Optional[str] = Field(None, description="Observações gerais sobre o pedido.")
+    tipo_entrega: TipoEntrega = TipoEntrega.NORMAL
+    horario_entrega: Optional[str] = None
+
+
 class ValidacaoEntrega(BaseModel):
     codigo: str
 
@@ -135,6 +146,7 @@ class OrderResponse(BaseSchema):
     status: OrderStatus
     total_price: float
     criado_em: datetime
+    atualizado_em: Optional[datetime] = None
     
 
     tipo_entrega: TipoEntrega
@@ -144,13 +156,29 @@ class OrderResponse(BaseSchema):
 
     itens: List[PedidoItemResponse] = []
 
+class OrderPageResponse(BaseModel):
+    """Página do feed de pedidos do restaurante (paginação por cursor)"""
+    pedidos: List[OrderResponse]
+    next_cursor: Optional[str] = None
+    # Só na primeira página do histórico: ponto de partida do modo 'alteracoes'
+    cursor_alteracoes: Optional[str] = None
+
+# -------------------------------------------------------------------
+# --- SCHEMAS DE AUTENTICAÇÃO ---
+# -------------------------------------------------------------------
+
+class UsuarioToken(BaseModel):
+    """Identidade do usuário extraída do JWT (sem consultar o banco)."""
+    id: int
+    email: str
+
 # -------------------------------------------------------------------
 # --- SCHEMAS DE AVALIAÇÃO ---
 # -------------------------------------------------------------------
 
 class AvaliacaoCreate(BaseModel):
     pedido_id: int
-    nota: int
+    nota: int = Field(..., ge=1, le=5)
     comentario: Optional[str] = None
 
 class AvaliacaoResponse(BaseSchema):
@@ -159,6 +187,13 @@ class AvaliacaoResponse(BaseSchema):
     nota: int
     comentario: Optional[str]
     criado_em: datetime
+
+class AvaliacaoRestauranteResponse(BaseSchema):
+    """Nota agregada de um restaurante (histograma: nota -> quantidade)"""
+    restaurant_id: str
+    n_avaliacoes: int
+    media: float
+    histograma: Dict[int, int]
     
     class Config:
         from_attributes = True
@@ -1,12 +1,21 @@
+import asyncio
+import hashlib
+import time
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.config import Config
 
 # --- CORREÇÃO DE IMPORT ---
 # Importa o modelo 'Usuario' (em português)
 from src.models.usuario import Usuario
+from src.cache import TTLCache
+from src import schemas
 
 # --- Configurações de Segurança ---
 config = Config(".env")
@@ -15,12 +24,78 @@ SECRET_KEY = config("SECRET_KEY", default="sua_chave_secreta_super_segura")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30  # O token expira em 30 minutos
 
+# --- Configurações do bcrypt ---
+# Custo (work factor) dos hashes novos. Hashes antigos com custo menor são
+# atualizados automaticamente no próximo login bem-sucedido.
+BCRYPT_ROUNDS = config("BCRYPT_ROUNDS", cast=int, default=12)
+# Quantos hashes rodam ao mesmo tempo (bcrypt libera o GIL, então threads
+# usam núcleos de verdade) e quantos podem esperar na fila antes de recusar.
+HASH_WORKERS = config("HASH_WORKERS", cast=int, default=4)
+HASH_MAX_FILA = config("HASH_MAX_FILA", cast=int, default=200)
+
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_semaforo = asyncio.Semaphore(HASH_WORKERS)
+
+
+class MetricasHash:
+    """Fila e tempo das operações de bcrypt deste worker."""
+
+    def __init__(self):
+        self.em_execucao = 0
+        self.na_fila = 0
+        self.fila_max = 0
+        self.recusados = 0
+        self.total = 0
+        self.tempo_total = 0.0
+
+    def estatisticas(self) -> dict:
+        return {
+            "workers": HASH_WORKERS,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "em_execucao": self.em_execucao,
+            "na_fila": self.na_fila,
+            "fila_max": self.fila_max,
+            "max_fila": HASH_MAX_FILA,
+            "recusados": self.recusados,
+            "total": self.total,
+            "tempo_medio_ms": round(self.tempo_total / self.total * 1000, 1) if self.total else 0.0,
+        }
+
+
+metricas_hash = MetricasHash()
+
+
+async def _rodar_no_pool_de_hash(funcao, *args):
+    """Executa 'funcao' no pool de threads do bcrypt, fora do event loop."""
+    if metricas_hash.na_fila >= HASH_MAX_FILA:
+        metricas_hash.recusados += 1
+        raise HTTPException(status_code=503, detail="Servidor ocupado. Tente novamente em instantes.")
+
+    metricas_hash.na_fila += 1
+    metricas_hash.fila_max = max(metricas_hash.fila_max, metricas_hash.na_fila)
+    try:
+        await _hash_semaforo.acquire()
+    finally:
+        metricas_hash.na_fila -= 1
+
+    metricas_hash.em_execucao += 1
+    inicio = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, funcao, *args)
+    finally:
+        metricas_hash.em_execucao -= 1
+        metricas_hash.total += 1
+        metricas_hash.tempo_total += time.perf_counter() - inicio
+        _hash_semaforo.release()
+
+
 # --- Funções de Hash de Senha (bcrypt) ---
 
 def get_password_hash(password: str) -> str:
     """Gera o hash de uma senha em texto plano."""
     password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed_password = bcrypt.hashpw(password_bytes, salt)
     return hashed_password.decode('utf-8')
 
@@ -29,27 +104,55 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica se a senha em texto plano corresponde ao hash."""
     password_bytes = plain_password.encode('utf-8')
     hashed_password_bytes = hashed_password.encode('utf-8')
-    return bcrypt.checkpw(password_bytes, hashed_password_bytes)
+    try:
+        return bcrypt.checkpw(password_bytes, hashed_password_bytes)
+    except ValueError:
+        # Não é um hash bcrypt (ex: contas criadas via Google/Facebook/telefone)
+        return False
+
+
+def precisa_rehash(hashed_password: str) -> bool:
+    """True se o hash foi gerado com custo menor que o BCRYPT_ROUNDS atual."""
+    try:
+        # Formato: $2b$12$<salt+hash>
+        return int(hashed_password.split("$")[2]) < BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Versão para rotas async: o hash roda no pool, sem travar o event loop."""
+    return await _rodar_no_pool_de_hash(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Versão para rotas async de verify_password."""
+    return await _rodar_no_pool_de_hash(verify_password, plain_password, hashed_password)
 
 
 # --- Função de Autenticação (Usada pelo Login) ---
 
-def autenticar_usuario(db: Session, email: str, senha: str) -> Usuario | bool:
+async def autenticar_usuario(db: AsyncSession, email: str, senha: str) -> Usuario | bool:
     """
     Verifica se um usuário existe e se a senha está correta.
     """
     # 1. Encontra o usuário pelo email (usando 'Usuario')
-    db_user = db.query(Usuario).filter(Usuario.email == email).first()
+    db_user = await db.scalar(select(Usuario).where(Usuario.email == email))
 
     # 2. Se o usuário não existe, retorna Falso
     if not db_user:
         return False
         
     # 3. Se o usuário foi encontrado, verifica a senha
-    if not verify_password(senha, db_user.hashed_password):
+    if not await verify_password_async(senha, db_user.hashed_password):
         return False
 
-    # 4. Se a senha estiver correta, retorna o objeto do usuário
+    # 4. Senha correta: atualiza o hash se o custo configurado aumentou
+    if precisa_rehash(db_user.hashed_password):
+        db_user.hashed_password = await get_password_hash_async(senha)
+        await db.commit()
+
+    # 5. Retorna o objeto do usuário
     return db_user
 
 
@@ -68,4 +171,55 @@ def criar_token_de_acesso(data: dict) -> str:
     # Codifica o token com a chave secreta e o algoritmo
     token_jwt_codificado = jwt.encode(dados_para_codificar, SECRET_KEY, algorithm=ALGORITHM)
     
-    return token_jwt_codificado
\ No newline at end of file
+    return token_jwt_codificado
+
+
+# --- Dependência de Autenticação (Bearer JWT) ---
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+
+# Claims já validadas, indexadas pelo hash do token. A entrada expira junto
+# com o 'exp' do token, então repetir o mesmo token pula a verificação da
+# assinatura sem nunca aceitar um token vencido.
+_claims_cache = TTLCache("jwt_claims", ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60, max_itens=20000)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> schemas.UsuarioToken:
+    """
+    Valida o token Bearer e retorna o usuário dono dele.
+    Stateless: não consulta o banco; tudo vem das claims assinadas.
+    """
+    credenciais_invalidas = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Token inválido ou expirado.",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    chave = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    usuario = _claims_cache.get(chave)
+    if usuario is not None:
+        return usuario
+
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credenciais_invalidas
+
+    if claims.get("uid") is None or not claims.get("sub"):
+        # Tokens antigos (sem 'uid') precisam de um novo login
+        raise credenciais_invalidas
+
+    usuario = schemas.UsuarioToken(id=claims["uid"], email=claims["sub"])
+    restante = claims.get("exp", 0) - time.time()
+    if restante > 0:
+        _claims_cache.set(chave, usuario, ttl=restante)
+    return usuario
+
+
+def exigir_mesmo_usuario(user_id, usuario: schemas.UsuarioToken):
+    """Garante que o user_id da rota é o mesmo do token."""
+    if str(user_id) != str(usuario.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acesso negado aos dados de outro usuário."
+        )
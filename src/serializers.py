@@ -0,0 +1,33 @@
+"""
+Serialização rápida das respostas mais pesadas.
+
+Os TypeAdapter são montados uma vez no import: o pydantic-core já deixa
+o validador/serializador compilado, e 'dump_json' gera os bytes direto
+em Rust, sem passar por jsonable_encoder + json.dumps do FastAPI.
+"""
+from typing import Any, List
+
+import orjson
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from src import schemas
+
+pedido = TypeAdapter(schemas.OrderResponse)
+lista_pedidos = TypeAdapter(List[schemas.OrderResponse])
+pagina_pedidos = TypeAdapter(schemas.OrderPageResponse)
+lista_itens = TypeAdapter(List[schemas.ItemResponse])
+
+
+def json_bytes(adapter: TypeAdapter, valor: Any) -> bytes:
+    """Objetos ORM (ou dicts) -> bytes JSON, usando o schema do adapter."""
+    return adapter.dump_json(adapter.validate_python(valor, from_attributes=True))
+
+
+def resposta_json(adapter: TypeAdapter, valor: Any, status_code: int = 200) -> Response:
+    return Response(content=json_bytes(adapter, valor), media_type="application/json", status_code=status_code)
+
+
+def dumps(dados: Any) -> str:
+    """json.dumps rápido (orjson) para mensagens de WebSocket/pub-sub."""
+    return orjson.dumps(dados).decode()
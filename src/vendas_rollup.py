@@ -0,0 +1,190 @@
+"""
+Manutenção do rollup diário de vendas (vendas_diarias_restaurante/_item).
+
+Os incrementos rodam na MESMA transação da criação do pedido, da mudança de
+status ou da avaliação (que também soma na nota agregada do restaurante,
+avaliacoes_restaurante), com UPSERT atômico (INSERT ... ON CONFLICT DO UPDATE),
+então o rollup nunca fica à frente nem atrás do que foi commitado.
+
+O histórico anterior ao rollup é preenchido pela migração 5 (src/migracoes.py).
+Backfill manual (recalcula dias a partir de 'pedidos'):
+    python -m src.vendas_rollup --inicio 2025-01-01 --fim 2025-12-31
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from src.database import SessionLocal, dialect_insert
+from src.models.avaliacao import Avaliacao, AvaliacaoRestaurante
+from src.models.pedidos import OrderModel, PedidoItem, OrderStatus
+from src.models.vendas_diarias import VendaDiariaRestaurante, VendaDiariaItem
+
+CHAVES_RESTAURANTE = ["dia", "restaurant_id"]
+CHAVES_ITEM = ["dia", "restaurant_id", "item_id"]
+
+
+async def _incrementar(db: AsyncSession, modelo, chaves: List[str], linhas: List[dict]):
+    """UPSERT que soma os campos não-chave das linhas nas linhas já existentes."""
+    if not linhas:
+        return
+    tabela = modelo.__table__
+    stmt = dialect_insert(db, tabela).values(linhas)
+    campos = [campo for campo in linhas[0] if campo not in chaves]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=chaves,
+        set_={campo: tabela.c[campo] + stmt.excluded[campo] for campo in campos},
+    )
+    await db.execute(stmt)
+
+
+async def registrar_pedido(db: AsyncSession, pedido: OrderModel):
+    """Soma um pedido novo (e seus itens) no rollup do dia em que foi criado."""
+    dia = pedido.criado_em.date()
+    await _incrementar(db, VendaDiariaRestaurante, CHAVES_RESTAURANTE, [{
+        "dia": dia,
+        "restaurant_id": pedido.restaurant_id,
+        "n_pedidos": 1,
+        "faturamento": pedido.total_price,
+    }])
+
+    # Agrupa por item antes: a mesma chave duas vezes no mesmo UPSERT é erro no Postgres
+    por_item: Dict[int, Tuple[int, float]] = {}
+    for item in pedido.itens:
+        quantidade, valor = por_item.get(item.item_id, (0, 0.0))
+        por_item[item.item_id] = (
+            quantidade + item.quantidade,
+            valor + item.quantidade * item.preco_unitario_pago,
+        )
+    await _incrementar(db, VendaDiariaItem, CHAVES_ITEM, [
+        {
+            "dia": dia,
+            "restaurant_id": pedido.restaurant_id,
+            "item_id": item_id,
+            "quantidade": quantidade,
+            "valor_faturado": valor,
+        }
+        for item_id, (quantidade, valor) in por_item.items()
+    ])
+
+
+async def registrar_mudanca_status(
+    db: AsyncSession, pedido: OrderModel, status_anterior: OrderStatus, status_novo: OrderStatus
+):
+    """Mantém os contadores de cancelamento quando o pedido entra/sai de CANCELADO."""
+    entrou = status_novo == OrderStatus.CANCELADO and status_anterior != OrderStatus.CANCELADO
+    saiu = status_anterior == OrderStatus.CANCELADO and status_novo != OrderStatus.CANCELADO
+    if not (entrou or saiu):
+        return
+    sinal = 1 if entrou else -1
+    await _incrementar(db, VendaDiariaRestaurante, CHAVES_RESTAURANTE, [{
+        "dia": pedido.criado_em.date(),
+        "restaurant_id": pedido.restaurant_id,
+        "n_cancelados": sinal,
+        "faturamento_cancelado": sinal * pedido.total_price,
+    }])
+
+
+async def registrar_avaliacao(db: AsyncSession, pedido: OrderModel, nota: int):
+    """Soma a nota no dia/restaurante do pedido avaliado e na nota geral do restaurante."""
+    await _incrementar(db, VendaDiariaRestaurante, CHAVES_RESTAURANTE, [{
+        "dia": pedido.criado_em.date(),
+        "restaurant_id": pedido.restaurant_id,
+        "n_avaliacoes": 1,
+        "soma_notas": nota,
+    }])
+    # Nota geral do restaurante (contagem, soma e histograma)
+    await _incrementar(db, AvaliacaoRestaurante, ["restaurant_id"], [{
+        "restaurant_id": pedido.restaurant_id,
+        "n_avaliacoes": 1,
+        "soma_notas": nota,
+        f"notas_{nota}": 1,
+    }])
+
+
+async def backfill(db: Union[AsyncSession, AsyncConnection], inicio: date, fim: date):
+    """
+    Recalcula o rollup dos dias [inicio, fim] direto de 'pedidos'.
+    Idempotente: apaga os dias do intervalo e reinsere com INSERT ... SELECT.
+    """
+    de = datetime.combine(inicio, time.min)
+    ate = datetime.combine(fim + timedelta(days=1), time.min)
+    no_periodo = (OrderModel.criado_em >= de, OrderModel.criado_em < ate)
+    dia_do_pedido = func.date(OrderModel.criado_em)
+    cancelado = OrderModel.status == OrderStatus.CANCELADO
+
+    for modelo in (VendaDiariaRestaurante, VendaDiariaItem):
+        await db.execute(delete(modelo).where(modelo.dia >= inicio, modelo.dia <= fim))
+
+    await db.execute(insert(VendaDiariaRestaurante).from_select(
+        ["dia", "restaurant_id", "n_pedidos", "faturamento", "n_cancelados",
+         "faturamento_cancelado", "n_avaliacoes", "soma_notas"],
+        select(
+            dia_do_pedido,
+            OrderModel.restaurant_id,
+            func.count(OrderModel.id),
+            func.coalesce(func.sum(OrderModel.total_price), 0.0),
+            func.coalesce(func.sum(case((cancelado, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((cancelado, OrderModel.total_price), else_=0.0)), 0.0),
+            func.count(Avaliacao.id),
+            func.coalesce(func.sum(Avaliacao.nota), 0),
+        ).select_from(OrderModel).outerjoin(
+            Avaliacao, Avaliacao.pedido_id == OrderModel.id
+        ).where(*no_periodo).group_by(dia_do_pedido, OrderModel.restaurant_id)
+    ))
+
+    await db.execute(insert(VendaDiariaItem).from_select(
+        ["dia", "restaurant_id", "item_id", "quantidade", "valor_faturado"],
+        select(
+            dia_do_pedido,
+            OrderModel.restaurant_id,
+            PedidoItem.item_id,
+            func.sum(PedidoItem.quantidade),
+            func.sum(PedidoItem.quantidade * PedidoItem.preco_unitario_pago),
+        ).select_from(PedidoItem).join(
+            OrderModel, PedidoItem.order_id == OrderModel.id
+        ).where(*no_periodo).group_by(dia_do_pedido, OrderModel.restaurant_id, PedidoItem.item_id)
+    ))
+
+
+async def preencher_ate_hoje(db: Union[AsyncSession, AsyncConnection]):
+    """
+    Backfill do primeiro pedido até hoje, inclusive.
+    Roda como migração, antes de o worker atender: a partir daí os
+    incrementos mantêm o rollup. Hoje entra também porque amanhã os
+    relatórios leem este dia do rollup, e os pedidos feitos antes do
+    deploy não passaram pelos incrementos.
+    """
+    primeiro = await db.scalar(select(func.min(OrderModel.criado_em)))
+    if primeiro is None:
+        return
+    await backfill(db, primeiro.date(), datetime.utcnow().date())
+
+
+async def _main(inicio: Optional[date], fim: Optional[date]):
+    # Registra os demais modelos para o SQLAlchemy resolver os relacionamentos
+    from src.models import usuario, endereco, items, restaurante  # noqa: F401
+
+    async with SessionLocal() as db:
+        if inicio is None:
+            primeiro = await db.scalar(select(func.min(OrderModel.criado_em)))
+            if primeiro is None:
+                print("Nenhum pedido para processar.")
+                return
+            inicio = primeiro.date()
+        fim = fim or datetime.utcnow().date()
+
+        await backfill(db, inicio, fim)
+        await db.commit()
+        print(f"Rollup recalculado de {inicio} a {fim}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill do rollup diário de vendas.")
+    parser.add_argument("--inicio", type=date.fromisoformat, default=None, help="YYYY-MM-DD (padrão: primeiro pedido)")
+    parser.add_argument("--fim", type=date.fromisoformat, default=None, help="YYYY-MM-DD (padrão: hoje)")
+    args = parser.parse_args()
+    asyncio.run(_main(args.inicio, args.fim))
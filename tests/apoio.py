@@ -0,0 +1,40 @@
+import asyncio
+
+
+def rodar(corrotina):
+    """
+    asyncio.run + descarta as conexões do engine no fim: cada teste tem seu
+    event loop, e conexões do pool não podem passar de um loop para outro.
+    """
+    from src.database import engine
+
+    async def _com_dispose():
+        try:
+            return await corrotina
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(_com_dispose())
+
+
+async def criar_tabelas():
+    """Schema do app no SQLite dos testes (idempotente)."""
+    from src.database import Base, engine
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+def cliente():
+    """Cliente HTTP ligado direto no app (sem servidor e sem o lifespan)."""
+    import httpx
+    import main
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://teste")
+
+
+def autenticado(user_id: int, email: str = "cliente@teste.com") -> dict:
+    """Header Authorization com um JWT válido para o usuário."""
+    from src.security import criar_token_de_acesso
+
+    return {"Authorization": f"Bearer {criar_token_de_acesso({'sub': email, 'uid': user_id})}"}
@@ -0,0 +1,15 @@
+"""
+Configuração comum dos testes.
+
+Os testes rodam sem serviços externos: banco SQLite num arquivo temporário
+e, sem REDIS_URL, as implementações em memória dos stores.
+
+    pip install -r requirements.txt pytest
+    python -m pytest -q
+"""
+import os
+import tempfile
+
+# Antes de qualquer import do app: o engine e os stores são criados no import
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp(prefix='ifome_testes_')}/testes.db"
+os.environ.pop("REDIS_URL", None)
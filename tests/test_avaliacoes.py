@@ -0,0 +1,92 @@
+from collections import Counter
+
+from sqlalchemy import delete, select, text
+
+import main  # noqa: F401  (registra todos os modelos no metadata)
+from src.database import SessionLocal, engine
+from src.migracoes import MIGRACOES
+from src.models.avaliacao import Avaliacao, AvaliacaoRestaurante
+from src.models.pedidos import OrderModel, OrderStatus, PedidoItem
+from src.models.vendas_diarias import VendaDiariaItem, VendaDiariaRestaurante
+from tests.apoio import cliente, criar_tabelas, rodar
+
+# (restaurante, nota) de cada pedido avaliado
+NOTAS = [("rest-1", 5), ("rest-1", 4), ("rest-1", 5), ("rest-1", 1), ("rest-2", 3), ("rest-2", 2)]
+
+
+async def _pedidos(restaurantes) -> list:
+    await criar_tabelas()
+    async with SessionLocal() as db:
+        for modelo in (Avaliacao, AvaliacaoRestaurante, PedidoItem, OrderModel, VendaDiariaRestaurante, VendaDiariaItem):
+            await db.execute(delete(modelo))
+        pedidos = [
+            OrderModel(user_id=1, restaurant_id=r, endereco_id=1, status=OrderStatus.CONCLUIDO, total_price=10.0)
+            for r in restaurantes
+        ]
+        db.add_all(pedidos)
+        await db.commit()
+        return [p.id for p in pedidos]
+
+
+def _esperado(notas) -> dict:
+    """Agregado calculado direto da lista de notas: {restaurante: (n, média, histograma)}."""
+    por_restaurante = {}
+    for restaurante in {r for r, _ in notas}:
+        notas_do_restaurante = [n for r, n in notas if r == restaurante]
+        contagem = Counter(notas_do_restaurante)
+        por_restaurante[restaurante] = (
+            len(notas_do_restaurante), round(sum(notas_do_restaurante) / len(notas_do_restaurante), 1), {str(n): contagem[n] for n in range(1, 6)},
+        )
+    return por_restaurante
+
+
+async def _agregados(http, restaurantes) -> dict:
+    agregados = {}
+    for restaurante in restaurantes:
+        corpo = (await http.get(f"/api/avaliacoes/restaurante/{restaurante}")).json()
+        agregados[restaurante] = (corpo["n_avaliacoes"], corpo["media"], corpo["histograma"])
+    return agregados
+
+
+def test_agregado_acompanha_as_avaliacoes():
+    async def cenario():
+        ids = await _pedidos([r for r, _ in NOTAS])
+        async with cliente() as http:
+            vazio = await _agregados(http, ["rest-3"])
+            for pedido_id, (_, nota) in zip(ids, NOTAS):
+                resposta = await http.post("/api/avaliacoes/", json={"pedido_id": pedido_id, "nota": nota})
+                assert resposta.status_code == 201
+            # Segunda avaliação do mesmo pedido é recusada e não conta
+            repetida = await http.post("/api/avaliacoes/", json={"pedido_id": ids[0], "nota": 1})
+            return vazio, repetida.status_code, await _agregados(http, ["rest-1", "rest-2"])
+
+    vazio, repetida, agregados = rodar(cenario())
+    assert vazio == {"rest-3": (0, 0.0, {str(n): 0 for n in range(1, 6)})}
+    assert repetida == 400
+    assert agregados == _esperado(NOTAS)
+    for n, _, histograma in agregados.values():
+        assert sum(histograma.values()) == n
+
+
+def test_migracao_4_reconstroi_o_agregado_das_avaliacoes():
+    async def cenario():
+        ids = await _pedidos([r for r, _ in NOTAS])
+        async with SessionLocal() as db:
+            # Avaliações gravadas antes do agregado existir
+            db.add_all(Avaliacao(pedido_id=p, nota=nota) for p, (_, nota) in zip(ids, NOTAS))
+            db.add(AvaliacaoRestaurante(restaurant_id="rest-9", n_avaliacoes=7, soma_notas=7, notas_1=7))
+            await db.commit()
+
+        (passos,) = [passos for versao, _, passos in MIGRACOES if versao == 4]
+        async with engine.begin() as conn:
+            for passo in passos:
+                await conn.execute(text(passo))
+
+        async with SessionLocal() as db:
+            linhas = (await db.scalars(select(AvaliacaoRestaurante))).all()
+            return {
+                a.restaurant_id: (a.n_avaliacoes, a.media, {str(n): q for n, q in a.histograma.items()})
+                for a in linhas
+            }
+
+    assert rodar(cenario()) == _esperado(NOTAS)
@@ -0,0 +1,75 @@
+from sqlalchemy import delete, update
+
+import main  # noqa: F401  (registra todos os modelos no metadata)
+from api.routes.consulta_items import cardapio_cache
+from src.database import SessionLocal
+from src.models.items import Item
+from tests.apoio import cliente, criar_tabelas, rodar
+
+CARDAPIO = "/api/restaurants/items/rest-1"
+
+
+async def _cardapio(*itens):
+    """itens: [(nome, preço, ativo)] do rest-1, com o cache vazio."""
+    await criar_tabelas()
+    cardapio_cache.clear()
+    async with SessionLocal() as db:
+        await db.execute(delete(Item))
+        db.add_all(Item(restaurant_id="rest-1", nome=nome, preco=preco, ativo=ativo) for nome, preco, ativo in itens)
+        db.add(Item(restaurant_id="rest-2", nome="De outro", preco=1.0, ativo=True))
+        await db.commit()
+
+
+def test_etag_e_304_com_if_none_match():
+    async def cenario():
+        await _cardapio(("Pizza", 40.0, True), ("Fora do cardápio", 10.0, False))
+        async with cliente() as http:
+            primeira = await http.get(CARDAPIO)
+            etag = primeira.headers["etag"]
+            return (
+                primeira,
+                await http.get(CARDAPIO, headers={"If-None-Match": etag}),
+                await http.get(CARDAPIO, headers={"If-None-Match": f'"outra", W/{etag}'}),
+                await http.get(CARDAPIO, headers={"If-None-Match": '"outra"'}),
+            )
+
+    primeira, igual, fraca, diferente = rodar(cenario())
+    assert primeira.status_code == 200
+    assert [i["nome"] for i in primeira.json()] == ["Pizza"]
+    assert primeira.headers["cache-control"] == "public, no-cache"
+    assert igual.status_code == 304 and igual.content == b""
+    assert igual.headers["etag"] == primeira.headers["etag"]
+    assert fraca.status_code == 304
+    assert diferente.status_code == 200 and diferente.content == primeira.content
+
+
+def test_cache_nao_consulta_o_banco_de_novo():
+    async def cenario():
+        await _cardapio(("Pizza", 40.0, True))
+        async with cliente() as http:
+            primeira = await http.get(CARDAPIO)
+            # Mudança por fora da API: o cache só vê no fim do TTL ou na invalidação
+            async with SessionLocal() as db:
+                await db.execute(update(Item).values(preco=45.0))
+                await db.commit()
+            return primeira, await http.get(CARDAPIO)
+
+    primeira, segunda = rodar(cenario())
+    assert segunda.content == primeira.content
+    assert segunda.headers["etag"] == primeira.headers["etag"]
+
+
+def test_cadastrar_item_invalida_o_cardapio():
+    async def cenario():
+        await _cardapio(("Pizza", 40.0, True))
+        async with cliente() as http:
+            antes = await http.get(CARDAPIO)
+            criado = await http.post("/api/restaurante/cardapio/rest-1/items", json={"nome": "Suco", "preco": 8.0})
+            revalidado = await http.get(CARDAPIO, headers={"If-None-Match": antes.headers["etag"]})
+        return antes, criado, revalidado
+
+    antes, criado, revalidado = rodar(cenario())
+    assert criado.status_code == 200
+    assert revalidado.status_code == 200
+    assert revalidado.headers["etag"] != antes.headers["etag"]
+    assert sorted(i["nome"] for i in revalidado.json()) == ["Pizza", "Suco"]
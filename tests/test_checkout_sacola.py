@@ -0,0 +1,176 @@
+import asyncio
+
+from sqlalchemy import delete, event, select
+
+import main  # noqa: F401  (registra todos os modelos no metadata)
+from api.routes.cadastro_sacola import SacolaItemModel, _persistir
+from api.sacola_store import sacola_store
+from src.database import SessionLocal, engine
+from src.models.endereco import Endereco
+from src.models.items import Item
+from src.models.outbox import OutboxMensagem
+from src.models.pedidos import OrderModel, PedidoItem
+from src.models.usuario import Usuario
+from src.models.vendas_diarias import VendaDiariaItem, VendaDiariaRestaurante
+from tests.apoio import autenticado, cliente, criar_tabelas, rodar
+
+USUARIO = 1
+CHECKOUT = f"/api/pedidos/from-sacola/{USUARIO}"
+CORPO = {"restaurante_id": "rest-1", "endereco_id": 1, "codigo_pagamento": "PIX"}
+
+
+async def _preparar(itens, sacola):
+    """itens: [(id, restaurante, preço, ativo)]; sacola: [(restaurante, item_id, quantidade, preço guardado)]."""
+    await criar_tabelas()
+    await sacola_store.esquecer(str(USUARIO))
+    async with SessionLocal() as db:
+        for modelo in (SacolaItemModel, PedidoItem, OrderModel, OutboxMensagem, Item, Endereco, Usuario,
+                       VendaDiariaRestaurante, VendaDiariaItem):
+            await db.execute(delete(modelo))
+        db.add(Usuario(id=USUARIO, nome_completo="Cliente", email="cliente@teste.com", hashed_password="x"))
+        db.add(Endereco(id=1, user_id=USUARIO, rua="Rua A", numero="10", bairro="B", cidade="C", estado="SP", cep="01000-000"))
+        for item_id, restaurante, preco, ativo in itens:
+            db.add(Item(id=item_id, restaurant_id=restaurante, nome=f"Prato {item_id}", preco=preco, ativo=ativo))
+        for restaurante, item_id, quantidade, preco in sacola:
+            db.add(SacolaItemModel(
+                user_id=str(USUARIO), restaurant_id=restaurante, item_id=item_id,
+                nome=f"Prato {item_id}", quantidade=quantidade, preco_unitario=preco,
+            ))
+        await db.commit()
+
+
+async def _checkout(corpo=CORPO):
+    async with cliente() as http:
+        return await http.post(CHECKOUT, json=corpo, headers=autenticado(USUARIO))
+
+
+async def _sacola_no_banco():
+    async with SessionLocal() as db:
+        return sorted(
+            (s.restaurant_id, s.item_id, s.quantidade, s.preco_unitario)
+            for s in (await db.scalars(select(SacolaItemModel))).all()
+        )
+
+
+async def _pedidos():
+    async with SessionLocal() as db:
+        return (await db.scalars(select(OrderModel))).all()
+
+
+def test_sacola_vazia():
+    async def cenario():
+        await _preparar([(1, "rest-1", 10.0, True)], [("rest-2", 1, 1, 10.0)])
+        return await _checkout()
+
+    resposta = rodar(cenario())
+    assert resposta.status_code == 400
+    assert resposta.json()["detail"] == "Sacola vazia."
+
+
+def test_item_que_nao_existe_mais_no_restaurante():
+    async def cenario():
+        await _preparar([(1, "rest-1", 10.0, True), (2, "rest-2", 10.0, True)],
+                        [("rest-1", 1, 1, 10.0), ("rest-1", 2, 1, 10.0)])
+        return await _checkout(), await _pedidos()
+
+    resposta, pedidos = rodar(cenario())
+    assert resposta.status_code == 404
+    assert pedidos == []
+
+
+def test_item_inativo():
+    async def cenario():
+        await _preparar([(1, "rest-1", 10.0, True), (2, "rest-1", 10.0, False)],
+                        [("rest-1", 1, 1, 10.0), ("rest-1", 2, 1, 10.0)])
+        return await _checkout()
+
+    assert rodar(cenario()).status_code == 400
+
+
+def test_preco_mudou_responde_409_e_atualiza_a_sacola():
+    async def cenario():
+        await _preparar([(1, "rest-1", 12.0, True), (2, "rest-1", 5.0, True)],
+                        [("rest-1", 1, 2, 10.0), ("rest-1", 2, 1, 5.0)])
+        conflito = await _checkout()
+        sacola = await _sacola_no_banco()
+        return conflito, sacola, await _checkout()
+
+    conflito, sacola, confirmado = rodar(cenario())
+    assert conflito.status_code == 409
+    assert conflito.json()["detail"]["itens"] == [
+        {"item_id": 1, "nome": "Prato 1", "preco_sacola": 10.0, "preco_atual": 12.0}
+    ]
+    assert sacola == [("rest-1", 1, 2, 12.0), ("rest-1", 2, 1, 5.0)]
+    assert confirmado.status_code == 201
+    assert confirmado.json()["total_price"] == 29.0
+
+
+def test_insert_select_copia_as_linhas_ao_preco_atual():
+    async def cenario():
+        await _preparar([(1, "rest-1", 12.5, True), (2, "rest-1", 4.0, True), (3, "rest-2", 9.0, True)],
+                        [("rest-1", 1, 2, 12.5), ("rest-1", 2, 3, 4.0), ("rest-2", 3, 1, 9.0)])
+        resposta = await _checkout({**CORPO, "tipo_entrega": "RAPIDA"})
+        async with SessionLocal() as db:
+            itens = sorted(
+                (i.item_id, i.quantidade, i.preco_unitario_pago)
+                for i in (await db.scalars(select(PedidoItem))).all()
+            )
+            rollup = (await db.scalars(select(VendaDiariaRestaurante))).all()
+        return resposta, itens, rollup, await _sacola_no_banco()
+
+    resposta, itens, rollup, sacola = rodar(cenario())
+    assert resposta.status_code == 201
+    corpo = resposta.json()
+    assert corpo["total_price"] == 2 * 12.5 + 3 * 4.0 + 5.0   # + taxa da entrega rápida
+    assert sorted((i["item_id"], i["quantidade"], i["preco_unitario_pago"]) for i in corpo["itens"]) == itens
+    assert itens == [(1, 2, 12.5), (2, 3, 4.0)]
+    assert [(r.restaurant_id, r.n_pedidos, r.faturamento) for r in rollup] == [("rest-1", 1, 42.0)]
+    assert sacola == [("rest-2", 3, 1, 9.0)]  # só as linhas deste restaurante saem
+
+
+def test_checkout_simultaneo_da_mesma_sacola_responde_409():
+    async def cenario():
+        await _preparar([(1, "rest-1", 10.0, True), (2, "rest-1", 10.0, True)],
+                        [("rest-1", 1, 1, 10.0), ("rest-1", 2, 1, 10.0)])
+        async with SessionLocal() as db:
+            linha_levada = await db.scalar(select(SacolaItemModel.id).where(SacolaItemModel.item_id == 2))
+
+        def outro_checkout(conn, cursor, sql, parametros, contexto, executemany):
+            # Outro checkout já apagou uma das linhas entre a validação e o DELETE
+            if sql.startswith("DELETE FROM sacola_items"):
+                cursor.execute("DELETE FROM sacola_items WHERE id = ?", (linha_levada,))
+
+        event.listen(engine.sync_engine, "before_cursor_execute", outro_checkout)
+        try:
+            resposta = await _checkout()
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", outro_checkout)
+        return resposta, await _pedidos(), await _sacola_no_banco()
+
+    resposta, pedidos, sacola = rodar(cenario())
+    assert resposta.status_code == 409
+    assert pedidos == []             # a transação inteira foi desfeita
+    assert len(sacola) == 2
+
+
+def test_checkout_espera_o_flush_em_andamento():
+    async def cenario():
+        await _preparar([(1, "rest-1", 10.0, True)], [("rest-1", 1, 1, 10.0)])
+        async with cliente() as http:
+            await http.get(f"/api/sacola/{USUARIO}", headers=autenticado(USUARIO))  # carrega no store
+        linha_id = next(iter(await sacola_store.linhas(str(USUARIO))))
+        await sacola_store.somar_quantidade(str(USUARIO), linha_id, 2)
+        snapshot = await sacola_store.pegar_sujas(10, "flush")  # o flusher pegou a sacola
+
+        checkout = asyncio.create_task(_checkout())
+        await asyncio.sleep(0.1)
+        esperou = not checkout.done()
+        await _persistir(snapshot)
+        await sacola_store.destravar(str(USUARIO), "flush")
+        return esperou, await checkout, await _sacola_no_banco()
+
+    esperou, resposta, sacola = rodar(cenario())
+    assert esperou
+    assert resposta.status_code == 201
+    assert resposta.json()["total_price"] == 30.0
+    assert sacola == []
@@ -0,0 +1,144 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete
+
+import main  # noqa: F401  (registra todos os modelos no metadata)
+from api.config import settings
+from api.routes.restaurante_admin import _codificar_cursor
+from src.database import SessionLocal
+from src.models.avaliacao import Avaliacao
+from src.models.pedidos import OrderModel, OrderStatus, PedidoItem
+from tests.apoio import cliente, criar_tabelas, rodar
+
+FEED = "/api/restaurante/pedidos/feed/rest-1"
+AGORA = datetime.utcnow()
+
+
+async def _pedidos(*pedidos) -> list:
+    """pedidos: [(criado_em, atualizado_em, status)]; devolve os ids na ordem dada."""
+    await criar_tabelas()
+    async with SessionLocal() as db:
+        for modelo in (Avaliacao, PedidoItem, OrderModel):
+            await db.execute(delete(modelo))
+        modelos = [
+            OrderModel(user_id=1, restaurant_id="rest-1", endereco_id=1, status=status_pedido,
+                       total_price=10.0, criado_em=criado_em, atualizado_em=atualizado_em)
+            for criado_em, atualizado_em, status_pedido in pedidos
+        ]
+        # Outro restaurante nunca aparece
+        db.add(OrderModel(user_id=1, restaurant_id="rest-2", endereco_id=1, status=OrderStatus.PENDENTE,
+                          total_price=10.0, criado_em=AGORA, atualizado_em=AGORA))
+        db.add_all(modelos)
+        await db.commit()
+        return [m.id for m in modelos]
+
+
+def _cursor(cursor: str) -> tuple:
+    dados = json.loads(base64.urlsafe_b64decode(cursor))
+    return dados["m"], datetime.fromisoformat(dados["t"]), dados["id"]
+
+
+async def _todas_as_paginas(http, **params) -> tuple:
+    ids, paginas, cursor = [], 0, None
+    while True:
+        corpo = (await http.get(FEED, params={**params, **({"cursor": cursor} if cursor else {})})).json()
+        ids += [p["id"] for p in corpo["pedidos"]]
+        paginas += 1
+        cursor = corpo["next_cursor"]
+        if not cursor:
+            return ids, paginas
+
+
+def test_historico_desempata_criado_em_pelo_id():
+    antigo = AGORA - timedelta(hours=2)
+    empate = AGORA - timedelta(hours=1)
+
+    async def cenario():
+        ids = await _pedidos(*[(empate, empate, OrderStatus.PENDENTE)] * 5, (antigo, antigo, OrderStatus.PENDENTE))
+        async with cliente() as http:
+            return ids, await _todas_as_paginas(http, limite=2)
+
+    ids, (lidos, paginas) = rodar(cenario())
+    # Os cinco empatados em criado_em vêm do maior id para o menor, sem pular nem repetir
+    assert lidos == sorted(ids[:5], reverse=True) + [ids[5]]
+    assert paginas == 3
+
+
+def test_filtro_de_status_so_vale_no_historico():
+    antes = AGORA - timedelta(hours=1)
+
+    async def cenario():
+        pendente, cancelado = await _pedidos(
+            (antes, antes, OrderStatus.PENDENTE), (antes, antes, OrderStatus.CANCELADO),
+        )
+        async with cliente() as http:
+            historico, _ = await _todas_as_paginas(http, status="CANCELADO")
+            alteracoes = (await http.get(FEED, params={"modo": "alteracoes", "status": "CANCELADO"})).json()
+        return pendente, cancelado, historico, [p["id"] for p in alteracoes["pedidos"]]
+
+    pendente, cancelado, historico, alteracoes = rodar(cenario())
+    assert historico == [cancelado]
+    assert alteracoes == [pendente, cancelado]
+
+
+def test_cursor_de_alteracoes_para_no_horizonte(monkeypatch):
+    monkeypatch.setattr(settings, "FEED_JANELA_ALTERACOES", 60)
+    antigo = AGORA - timedelta(hours=1)
+    recente = datetime.utcnow()
+
+    async def cenario():
+        ids = await _pedidos((antigo, antigo, OrderStatus.PENDENTE), (recente, recente, OrderStatus.PENDENTE))
+        async with cliente() as http:
+            primeira = (await http.get(FEED)).json()
+            polling = (await http.get(FEED, params={"modo": "alteracoes", "cursor": primeira["cursor_alteracoes"]})).json()
+            de_novo = (await http.get(FEED, params={"modo": "alteracoes", "cursor": polling["next_cursor"]})).json()
+        return ids, primeira, polling, de_novo
+
+    (antigo_id, recente_id), primeira, polling, de_novo = rodar(cenario())
+    # O ponto de partida do polling não passa do horizonte (agora - janela)
+    modo, momento, order_id = _cursor(primeira["cursor_alteracoes"])
+    assert modo == "alteracoes" and momento < recente - timedelta(seconds=59) and order_id == 0
+    assert [p["id"] for p in polling["pedidos"]] == [recente_id]
+    # O pedido recente está dentro da janela: o cursor para antes dele e ele volta no próximo polling
+    _, momento, order_id = _cursor(polling["next_cursor"])
+    assert momento < recente and order_id == 0
+    assert [p["id"] for p in de_novo["pedidos"]] == [recente_id]
+
+
+def test_cursor_avanca_ate_o_ultimo_pedido_fora_da_janela(monkeypatch):
+    monkeypatch.setattr(settings, "FEED_JANELA_ALTERACOES", 60)
+    antigo = AGORA - timedelta(hours=1)
+
+    async def cenario():
+        (pedido_id,) = await _pedidos((antigo, antigo, OrderStatus.PENDENTE))
+        async with cliente() as http:
+            polling = (await http.get(FEED, params={"modo": "alteracoes"})).json()
+            vazio = (await http.get(FEED, params={"modo": "alteracoes", "cursor": polling["next_cursor"]})).json()
+        return pedido_id, polling, vazio
+
+    pedido_id, polling, vazio = rodar(cenario())
+    assert [p["id"] for p in polling["pedidos"]] == [pedido_id]
+    assert _cursor(polling["next_cursor"]) == ("alteracoes", antigo, pedido_id)
+    # Sem novidades, o mesmo cursor volta para o próximo polling
+    assert vazio["pedidos"] == [] and vazio["next_cursor"] == polling["next_cursor"]
+
+
+@pytest.mark.parametrize("modo, cursor", [
+    ("historico", "nao-e-um-cursor"),
+    ("historico", base64.urlsafe_b64encode(b'{"m": "historico", "t": "ontem", "id": 1}').decode()),
+    ("historico", base64.urlsafe_b64encode(b'["historico"]').decode()),
+    ("historico", _codificar_cursor("alteracoes", AGORA, 1)),
+    ("alteracoes", _codificar_cursor("historico", AGORA, 1)),
+])
+def test_cursor_invalido_ou_de_outro_modo(modo, cursor):
+    async def cenario():
+        await criar_tabelas()
+        async with cliente() as http:
+            return await http.get(FEED, params={"modo": modo, "cursor": cursor})
+
+    resposta = rodar(cenario())
+    assert resposta.status_code == 400
+    assert resposta.json()["detail"] == "Cursor inválido."
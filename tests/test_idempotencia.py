@@ -0,0 +1,167 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException, Response
+
+from api import idempotencia
+from api.config import settings
+from api.idempotencia import MemoryIdempotenciaStore, criar_idempotencia_store, executar_idempotente
+from tests.apoio import rodar
+
+
+@pytest.fixture(autouse=True)
+def store_limpo(monkeypatch):
+    monkeypatch.setattr(idempotencia, "idempotencia_store", MemoryIdempotenciaStore())
+
+
+class Checkout:
+    """Conta as execuções; cada uma devolve um pedido novo."""
+
+    def __init__(self, demora: float = 0, status_code: int = 201, erro: Exception = None):
+        self.execucoes = 0
+        self.demora = demora
+        self.status_code = status_code
+        self.erro = erro
+
+    async def __call__(self) -> Response:
+        self.execucoes += 1
+        await asyncio.sleep(self.demora)
+        if self.erro:
+            raise self.erro
+        return Response(
+            content=json.dumps({"pedido_id": self.execucoes}),
+            status_code=self.status_code,
+            media_type="application/json",
+        )
+
+
+def test_sem_chave_sempre_executa():
+    checkout = Checkout()
+
+    async def cenario():
+        await executar_idempotente(None, "checkout", "{}", checkout)
+        await executar_idempotente(None, "checkout", "{}", checkout)
+
+    rodar(cenario())
+    assert checkout.execucoes == 2
+
+
+def test_retentativa_devolve_a_resposta_guardada():
+    checkout = Checkout()
+
+    async def cenario():
+        primeira = await executar_idempotente("k1", "checkout", "{}", checkout)
+        segunda = await executar_idempotente("k1", "checkout", "{}", checkout)
+        return primeira, segunda
+
+    primeira, segunda = rodar(cenario())
+    assert checkout.execucoes == 1
+    assert segunda.status_code == 201
+    assert segunda.body == primeira.body
+    assert segunda.headers["Idempotent-Replayed"] == "true"
+
+
+def test_duplicadas_simultaneas_executam_uma_vez():
+    checkout = Checkout(demora=0.05)
+
+    async def cenario():
+        return await asyncio.gather(*(executar_idempotente("k1", "checkout", "{}", checkout) for _ in range(5)))
+
+    respostas = rodar(cenario())
+    assert checkout.execucoes == 1
+    assert {r.body for r in respostas} == {b'{"pedido_id": 1}'}
+
+
+def test_mesma_chave_com_outro_corpo_e_422():
+    checkout = Checkout()
+
+    async def cenario():
+        await executar_idempotente("k1", "checkout", '{"total": 10}', checkout)
+        await executar_idempotente("k1", "checkout", '{"total": 99}', checkout)
+
+    with pytest.raises(HTTPException) as erro:
+        rodar(cenario())
+    assert erro.value.status_code == 422
+
+
+def test_falha_libera_a_chave():
+    falha = Checkout(erro=RuntimeError("banco fora"))
+    recusa = Checkout(status_code=409)
+    sucesso = Checkout()
+
+    async def cenario():
+        with pytest.raises(RuntimeError):
+            await executar_idempotente("k1", "checkout", "{}", falha)
+        await executar_idempotente("k1", "checkout", "{}", recusa)
+        return await executar_idempotente("k1", "checkout", "{}", sucesso)
+
+    assert rodar(cenario()).status_code == 201
+    assert (falha.execucoes, recusa.execucoes, sucesso.execucoes) == (1, 1, 1)
+
+
+def test_execucao_mais_longa_que_o_lease_nao_deixa_duplicar(monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCIA_LEASE", 0.1)
+    checkout = Checkout(demora=0.4)
+
+    async def cenario():
+        primeira = asyncio.create_task(executar_idempotente("k1", "checkout", "{}", checkout))
+        await asyncio.sleep(0.25)  # sem renovação, a reserva já teria vencido
+        segunda = await executar_idempotente("k1", "checkout", "{}", checkout)
+        return await primeira, segunda
+
+    primeira, segunda = rodar(cenario())
+    assert checkout.execucoes == 1
+    assert segunda.body == primeira.body
+
+
+def test_so_o_dono_da_reserva_conclui_ou_libera():
+    async def cenario():
+        store = MemoryIdempotenciaStore()
+        await store.reservar("k1", "impressao", "token-a")
+        outro = [
+            await store.liberar("k1", "token-b"),
+            await store.renovar("k1", "token-b"),
+            await store.concluir("k1", "token-b", {"estado": "pronto", "impressao": "impressao"}),
+        ]
+        return outro, await store.liberar("k1", "token-a"), await store.reservar("k1", "impressao", "token-b")
+
+    outro, dono, nova = rodar(cenario())
+    assert outro == [False, False, False]
+    assert dono is True
+    assert nova is None
+
+
+def test_memoria_recusa_mais_de_um_worker(monkeypatch):
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 2)
+    with pytest.raises(RuntimeError):
+        criar_idempotencia_store()
+
+
+def test_store_cheio_nao_descarta_reserva_em_andamento():
+    async def cenario():
+        store = MemoryIdempotenciaStore(max_chaves=2)
+        await store.reservar("pronta", "i", "t1")
+        await store.concluir("pronta", "t1", {"estado": "pronto", "impressao": "i"})
+        await store.reservar("andamento", "i", "t2")
+        await store.reservar("nova", "i", "t3")  # descarta a pronta, nunca a em andamento
+        mantida = await store.reservar("andamento", "i", "t4")
+        with pytest.raises(HTTPException) as erro:
+            await store.reservar("mais-uma", "i", "t5")
+        return mantida, erro.value.status_code, sorted(store._registros)
+
+    mantida, status_code, chaves = rodar(cenario())
+    assert mantida["token"] == "t2"
+    assert status_code == 503
+    assert chaves == ["andamento", "nova"]
+
+
+def test_store_cheio_reaproveita_reserva_vencida(monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCIA_LEASE", 0)
+
+    async def cenario():
+        store = MemoryIdempotenciaStore(max_chaves=1)
+        await store.reservar("velha", "i", "t1")
+        return await store.reservar("nova", "i", "t2"), list(store._registros)
+
+    assert rodar(cenario()) == (None, ["nova"])
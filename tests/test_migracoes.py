@@ -0,0 +1,55 @@
+from sqlalchemy import text
+
+import main  # noqa: F401  (registra todos os modelos no metadata)
+from src.database import Base, engine
+from src.migracoes import MIGRACOES, aplicar_migracoes, travar_schema
+from tests.apoio import rodar
+
+# Consultas quentes -> índice que elas devem usar (criados pela migração 1/2)
+CONSULTAS = {
+    "ix_pedidos_user_criado_em":
+        "SELECT * FROM pedidos WHERE user_id = :u ORDER BY criado_em DESC LIMIT 20",
+    "ix_pedidos_restaurant_criado_em":
+        "SELECT count(*) FROM pedidos WHERE restaurant_id = :r AND criado_em >= :de AND criado_em < :ate",
+    "ix_pedidos_criado_em":
+        "SELECT restaurant_id, count(id), sum(total_price) FROM pedidos"
+        " WHERE criado_em >= :de AND criado_em < :ate GROUP BY restaurant_id",
+    "ix_pedidos_status_criado_em":
+        "SELECT id FROM pedidos WHERE status = :s AND criado_em >= :de",
+    "ix_pedidos_restaurant_atualizado_em":
+        "SELECT * FROM pedidos WHERE restaurant_id = :r AND atualizado_em > :de ORDER BY atualizado_em, id LIMIT 50",
+    "ix_pedido_itens_order_id":
+        "SELECT * FROM pedido_itens WHERE order_id IN (1, 2, 3)",
+}
+PARAMETROS = {"u": 1, "r": "rest", "s": "PENDENTE", "de": "2025-01-01", "ate": "2025-01-02"}
+
+
+async def _preparar():
+    async with engine.begin() as conn:
+        await travar_schema(conn)
+        await conn.run_sync(Base.metadata.create_all)
+        await aplicar_migracoes(conn)
+
+
+def test_migracoes_rodam_uma_vez_so():
+    async def consultar():
+        await _preparar()
+        await _preparar()  # segunda vez: nada a aplicar, sem erro
+        async with engine.connect() as conn:
+            return list((await conn.execute(text("SELECT versao FROM schema_migrations ORDER BY versao"))).scalars())
+
+    assert rodar(consultar()) == [versao for versao, _, _ in MIGRACOES]
+
+
+def test_consultas_usam_os_indices_novos():
+    async def consultar():
+        await _preparar()
+        planos = {}
+        async with engine.connect() as conn:
+            for indice, sql in CONSULTAS.items():
+                linhas = (await conn.execute(text("EXPLAIN QUERY PLAN " + sql), PARAMETROS)).all()
+                planos[indice] = " | ".join(str(linha[-1]) for linha in linhas)
+        return planos
+
+    for indice, plano in rodar(consultar()).items():
+        assert indice in plano, f"{indice} não usado: {plano}"
@@ -0,0 +1,98 @@
+from api.config import settings
+from api.otp_store import MemoryOtpStore, ResultadoOtp
+from tests.apoio import rodar
+
+
+def test_codigo_certo_vale_uma_vez():
+    async def cenario():
+        store = MemoryOtpStore()
+        await store.emitir("+5511999990000", "123456")
+        return [
+            await store.verificar("+5511999990000", "123456"),
+            await store.verificar("+5511999990000", "123456"),
+        ]
+
+    assert rodar(cenario()) == [ResultadoOtp.OK, ResultadoOtp.INEXISTENTE]
+
+
+def test_codigo_novo_substitui_o_anterior():
+    async def cenario():
+        store = MemoryOtpStore()
+        await store.emitir("+5511999990000", "111111")
+        await store.emitir("+5511999990000", "222222")
+        return [
+            await store.verificar("+5511999990000", "111111"),
+            await store.verificar("+5511999990000", "222222"),
+        ]
+
+    assert rodar(cenario()) == [ResultadoOtp.INVALIDO, ResultadoOtp.OK]
+
+
+def test_tentativas_esgotadas_descartam_o_codigo(monkeypatch):
+    monkeypatch.setattr(settings, "OTP_MAX_TENTATIVAS", 3)
+
+    async def cenario():
+        store = MemoryOtpStore()
+        await store.emitir("+5511999990000", "123456")
+        erros = [await store.verificar("+5511999990000", "000000") for _ in range(3)]
+        return erros, await store.verificar("+5511999990000", "123456")
+
+    erros, depois = rodar(cenario())
+    assert erros == [ResultadoOtp.INVALIDO, ResultadoOtp.INVALIDO, ResultadoOtp.BLOQUEADO]
+    assert depois == ResultadoOtp.INEXISTENTE
+
+
+def test_codigo_expirado(monkeypatch):
+    monkeypatch.setattr(settings, "OTP_TTL", 0)
+
+    async def cenario():
+        store = MemoryOtpStore()
+        await store.emitir("+5511999990000", "123456")
+        return await store.verificar("+5511999990000", "123456")
+
+    assert rodar(cenario()) == ResultadoOtp.INEXISTENTE
+
+
+def test_limite_de_envios_por_telefone(monkeypatch):
+    monkeypatch.setattr(settings, "OTP_MAX_ENVIOS", 2)
+
+    async def cenario():
+        store = MemoryOtpStore()
+        return [await store.emitir(telefone, "123456") for telefone in ("+551", "+551", "+551", "+552")]
+
+    assert rodar(cenario()) == [True, True, False, True]
+
+
+def test_store_cheio_recusa_telefone_novo_sem_zerar_os_limites(monkeypatch):
+    monkeypatch.setattr(settings, "OTP_MAX_ENVIOS", 1)
+
+    async def cenario():
+        store = MemoryOtpStore(max_telefones=2)
+        emitidos = [await store.emitir(telefone, "123456") for telefone in ("+551", "+552", "+553")]
+        # O limite de quem já estava no store continua valendo
+        return emitidos, await store.emitir("+551", "654321")
+
+    emitidos, de_novo = rodar(cenario())
+    assert emitidos == [True, True, False]
+    assert de_novo is False
+
+
+def test_janela_vencida_libera_espaco(monkeypatch):
+    monkeypatch.setattr(settings, "OTP_JANELA_ENVIOS", 0)
+
+    async def cenario():
+        store = MemoryOtpStore(max_telefones=1)
+        return [await store.emitir(telefone, "123456") for telefone in ("+551", "+552")]
+
+    assert rodar(cenario()) == [True, True]
+
+
+def test_store_guarda_so_o_hmac():
+    async def cenario():
+        store = MemoryOtpStore()
+        await store.emitir("+5511999990000", "123456")
+        return store._codigos["+5511999990000"][0]
+
+    guardado = rodar(cenario())
+    assert "123456" not in guardado
+    assert len(guardado) == 64
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+import main  # noqa: F401  (registra todos os modelos no metadata)
+from api.config import settings
+from src.database import SessionLocal
+from src.models.outbox import OutboxMensagem
+from src.outbox import ERRO_RESERVA_VENCIDA, OutboxWorker
+from tests.apoio import criar_tabelas, rodar
+
+
+async def _com_mensagens(*mensagens: OutboxMensagem):
+    await criar_tabelas()
+    async with SessionLocal() as db:
+        await db.execute(delete(OutboxMensagem))
+        db.add_all(mensagens)
+        await db.commit()
+
+
+async def _todas():
+    async with SessionLocal() as db:
+        return {m.tipo: m for m in (await db.scalars(select(OutboxMensagem))).all()}
+
+
+def _mensagem(tipo: str, status: str = "pendente", tentativas: int = 0, vencida_ha: int = 1) -> OutboxMensagem:
+    return OutboxMensagem(
+        tipo=tipo,
+        payload={},
+        status=status,
+        tentativas=tentativas,
+        proxima_tentativa_em=datetime.utcnow() - timedelta(seconds=vencida_ha),
+    )
+
+
+def test_reserva_so_o_que_venceu():
+    async def cenario():
+        futura = _mensagem("futura", vencida_ha=-60)
+        await _com_mensagens(_mensagem("vencida"), futura, _mensagem("enviada", status="enviado"))
+        reservadas = await OutboxWorker()._reservar()
+        return [m.tipo for m in reservadas], await _todas()
+
+    reservadas, todas = rodar(cenario())
+    assert reservadas == ["vencida"]
+    assert todas["vencida"].status == "processando"
+    assert todas["vencida"].proxima_tentativa_em > datetime.utcnow()
+    assert todas["vencida"].tentativas == 0
+    assert todas["futura"].status == "pendente"
+
+
+def test_reserva_vencida_conta_como_tentativa():
+    async def cenario():
+        await _com_mensagens(_mensagem("retomada", status="processando", tentativas=1))
+        reservadas = await OutboxWorker()._reservar()
+        return reservadas, await _todas()
+
+    reservadas, todas = rodar(cenario())
+    assert [m.tentativas for m in reservadas] == [2]
+    assert todas["retomada"].status == "processando"
+    assert todas["retomada"].tentativas == 2
+    assert todas["retomada"].ultimo_erro == ERRO_RESERVA_VENCIDA
+
+
+def test_reservas_vencidas_seguidas_acabam_em_morto():
+    async def cenario():
+        await _com_mensagens(
+            _mensagem("veneno", status="processando", tentativas=settings.OUTBOX_MAX_TENTATIVAS - 1),
+        )
+        reservadas = await OutboxWorker()._reservar()
+        return reservadas, await _todas()
+
+    reservadas, todas = rodar(cenario())
+    assert reservadas == []
+    assert todas["veneno"].status == "morto"
+    assert todas["veneno"].tentativas == settings.OUTBOX_MAX_TENTATIVAS
@@ -0,0 +1,64 @@
+from sqlalchemy import delete
+
+import main  # noqa: F401  (registra todos os modelos no metadata)
+from api.config import settings
+from src.database import SessionLocal
+from src.models.avaliacao import Avaliacao
+from src.models.endereco import Endereco
+from src.models.items import Item
+from src.models.outbox import OutboxMensagem
+from src.models.pedidos import OrderModel, PedidoItem
+from src.models.usuario import Usuario
+from src.models.vendas_diarias import VendaDiariaItem, VendaDiariaRestaurante
+from tests.apoio import autenticado, cliente, criar_tabelas, rodar
+
+USUARIO = 1
+ITENS = 12
+
+
+async def _preparar():
+    await criar_tabelas()
+    async with SessionLocal() as db:
+        for modelo in (Avaliacao, PedidoItem, OrderModel, OutboxMensagem, Item, Endereco, Usuario,
+                       VendaDiariaRestaurante, VendaDiariaItem):
+            await db.execute(delete(modelo))
+        db.add(Usuario(id=USUARIO, nome_completo="Cliente", email="cliente@teste.com", hashed_password="x"))
+        db.add(Endereco(id=1, user_id=USUARIO, rua="Rua A", numero="10", bairro="B", cidade="C", estado="SP", cep="01000-000"))
+        db.add_all(Item(id=i, restaurant_id="rest-1", nome=f"Prato {i}", preco=float(i), ativo=True) for i in range(1, ITENS + 1))
+        await db.commit()
+
+
+async def _pedir(quantidade_de_itens: int):
+    corpo = {
+        "restaurante_id": "rest-1", "endereco_id": 1, "codigo_pagamento": "PIX",
+        "itens_do_carrinho": [{"item_id": i, "quantidade": 2} for i in range(1, quantidade_de_itens + 1)],
+    }
+    async with cliente() as http:
+        return await http.post("/api/pedidos/", json=corpo, headers=autenticado(USUARIO))
+
+
+def test_numero_de_queries_nao_depende_do_tamanho_do_carrinho(monkeypatch):
+    monkeypatch.setattr(settings, "DEBUG", True)
+
+    async def cenario():
+        await _preparar()
+        return await _pedir(1), await _pedir(ITENS)
+
+    um, varios = rodar(cenario())
+    assert um.status_code == varios.status_code == 201
+    assert len(varios.json()["itens"]) == ITENS
+    assert varios.json()["total_price"] == sum(2 * float(i) for i in range(1, ITENS + 1))
+    assert int(um.headers["X-Debug-Query-Count"]) > 0
+    assert um.headers["X-Debug-Query-Count"] == varios.headers["X-Debug-Query-Count"]
+
+
+def test_header_de_queries_so_com_debug(monkeypatch):
+    monkeypatch.setattr(settings, "DEBUG", False)
+
+    async def cenario():
+        await _preparar()
+        return await _pedir(1)
+
+    resposta = rodar(cenario())
+    assert resposta.status_code == 201
+    assert "X-Debug-Query-Count" not in resposta.headers
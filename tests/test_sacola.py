@@ -0,0 +1,248 @@
+import asyncio
+
+import pytest
+from sqlalchemy import delete, select, text
+
+import main  # noqa: F401  (registra todos os modelos no metadata)
+from api.config import settings
+from api.routes.cadastro_sacola import (
+    SacolaItemModel, _carregar_sacola, _persistir, descarregar_sacolas, descarregar_usuario,
+)
+from api.sacola_store import MemorySacolaStore, criar_sacola_store, sacola_store
+from src.database import SessionLocal, engine
+from src.migracoes import MIGRACOES
+from tests.apoio import autenticado, cliente, criar_tabelas, rodar
+
+USUARIO = "42"
+
+
+def _linha(linha_id: int, quantidade: int) -> dict:
+    return {
+        "id": linha_id, "user_id": USUARIO, "item_id": linha_id, "restaurant_id": "rest-1",
+        "quantidade": quantidade, "observacao": None, "nome": f"Item {linha_id}", "preco_unitario": 10.0,
+    }
+
+
+# --- Store em memória ---
+
+def test_soma_na_quantidade_marca_suja():
+    async def cenario():
+        store = MemorySacolaStore()
+        await store.definir_linhas(USUARIO, {1: _linha(1, 1), 2: _linha(2, 0)})
+        somada = await store.somar_quantidade(USUARIO, 1, 2)
+        lapide = await store.somar_quantidade(USUARIO, 2, 1)
+        return somada, lapide, await store.pegar_sujas(10, "flush")
+
+    somada, lapide, sujas = rodar(cenario())
+    assert somada["quantidade"] == 3
+    assert lapide is None
+    assert [user_id for user_id, _ in sujas] == [USUARIO]
+
+
+def test_sacola_suja_nao_expira(monkeypatch):
+    async def cenario():
+        store = MemorySacolaStore()
+        await store.definir_linhas(USUARIO, {1: _linha(1, 1)})
+        await store.gravar_linha(USUARIO, _linha(1, 5))
+        monkeypatch.setattr(settings, "SACOLA_TTL", 0)
+        suja = await store.linhas(USUARIO)
+        linhas = await store.pegar_suja(USUARIO)
+        # Gravada (não está mais suja): agora pode expirar
+        return suja, linhas, await store.pegar_suja(USUARIO), await store.linhas(USUARIO)
+
+    suja, linhas, de_novo, depois = rodar(cenario())
+    assert suja[1]["quantidade"] == 5
+    assert linhas[1]["quantidade"] == 5
+    assert de_novo is None
+    assert depois is None
+
+
+def test_remover_lapides_preserva_linha_revivida():
+    async def cenario():
+        store = MemorySacolaStore()
+        await store.definir_linhas(USUARIO, {1: _linha(1, 0), 2: _linha(2, 0)})
+        await store.gravar_linha(USUARIO, _linha(2, 3))  # revivida depois do snapshot do flush
+        await store.pegar_sujas(10, "flush")
+        await store.remover_lapides(USUARIO, [1, 2])
+        return await store.linhas(USUARIO), await store.pegar_suja(USUARIO)
+
+    linhas, suja = rodar(cenario())
+    assert list(linhas) == [2]
+    assert suja is not None  # precisa ser regravada
+
+
+def test_sacola_travada_fica_fora_do_flush_e_trava_espera():
+    async def cenario():
+        store = MemorySacolaStore()
+        await store.definir_linhas(USUARIO, {1: _linha(1, 1)})
+        await store.gravar_linha(USUARIO, _linha(1, 2))
+        assert await store.travar(USUARIO, "checkout", espera=0)
+        durante = await store.pegar_sujas(10, "flush")
+        ocupada = await store.travar(USUARIO, "outro", espera=0.01)
+        await store.destravar(USUARIO, "outro")  # não é dono: nada muda
+        esperando = asyncio.create_task(store.travar(USUARIO, "outro", espera=1))
+        await asyncio.sleep(0)
+        await store.destravar(USUARIO, "checkout")
+        return durante, ocupada, await esperando, await store.pegar_sujas(10, "flush")
+
+    durante, ocupada, depois, sujas = rodar(cenario())
+    assert durante == []
+    assert ocupada is False
+    assert depois is True
+    assert sujas == []  # agora travada por "outro"
+
+
+def test_memoria_recusa_mais_de_um_worker(monkeypatch):
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 2)
+    with pytest.raises(RuntimeError):
+        criar_sacola_store()
+
+
+# --- Flush para o banco ---
+
+async def _sacola_no_banco(*quantidades: int) -> list:
+    await criar_tabelas()
+    await sacola_store.esquecer(USUARIO)
+    async with SessionLocal() as db:
+        await db.execute(delete(SacolaItemModel))
+        for item_id, quantidade in enumerate(quantidades, start=1):
+            db.add(SacolaItemModel(
+                user_id=USUARIO, restaurant_id="rest-1", item_id=item_id,
+                nome=f"Item {item_id}", quantidade=quantidade, preco_unitario=10.0,
+            ))
+        await db.commit()
+        await _carregar_sacola(db, USUARIO)
+        return [i.id for i in (await db.scalars(select(SacolaItemModel).order_by(SacolaItemModel.item_id))).all()]
+
+
+async def _no_banco() -> dict:
+    async with SessionLocal() as db:
+        return {i.id: i.quantidade for i in (await db.scalars(select(SacolaItemModel))).all()}
+
+
+def test_flush_grava_quantidades_e_apaga_lapides():
+    async def cenario():
+        mantida, removida = await _sacola_no_banco(1, 1)
+        linhas = await sacola_store.linhas(USUARIO)
+        await sacola_store.somar_quantidade(USUARIO, mantida, 2)
+        await sacola_store.gravar_linha(USUARIO, {**linhas[removida], "quantidade": 0})
+        gravadas = await descarregar_sacolas(10)
+        return mantida, gravadas, await _no_banco(), await sacola_store.linhas(USUARIO)
+
+    mantida, gravadas, banco, store = rodar(cenario())
+    assert gravadas == 1
+    assert banco == {mantida: 3}
+    assert list(store) == [mantida]
+
+
+def test_linha_readicionada_depois_do_delete_volta_ao_banco():
+    async def cenario():
+        (linha_id,) = await _sacola_no_banco(2)
+        linha = (await sacola_store.linhas(USUARIO))[linha_id]
+        await sacola_store.gravar_linha(USUARIO, {**linha, "quantidade": 0})
+        snapshot = await sacola_store.pegar_sujas(10, "flush")
+        # Readicionada enquanto o flush com a lápide ainda ia para o banco
+        await sacola_store.gravar_linha(USUARIO, {**linha, "quantidade": 4})
+        await _persistir(snapshot)
+        await sacola_store.destravar(USUARIO, "flush")
+        apagada = await _no_banco()
+        await descarregar_usuario(USUARIO)
+        return linha_id, apagada, await _no_banco()
+
+    linha_id, apagada, banco = rodar(cenario())
+    assert apagada == {}
+    assert banco == {linha_id: 4}
+
+
+def test_descarregar_usuario_grava_sacola_suja_mesmo_parada(monkeypatch):
+    async def cenario():
+        (linha_id,) = await _sacola_no_banco(1)
+        await sacola_store.somar_quantidade(USUARIO, linha_id, 1)
+        monkeypatch.setattr(settings, "SACOLA_TTL", 0)
+        await descarregar_usuario(USUARIO)
+        return linha_id, await _no_banco()
+
+    linha_id, banco = rodar(cenario())
+    assert banco == {linha_id: 2}
+
+
+
+# --- PUT da sacola inteira ---
+
+def _item(item_id: int, quantidade: int, preco: float = 10.0, restaurante: str = "rest-1") -> dict:
+    return {"item_id": item_id, "restaurant_id": restaurante, "quantidade": quantidade,
+            "nome": f"Item {item_id}", "preco": preco}
+
+
+async def _put(itens: list, modo: str):
+    async with cliente() as http:
+        resposta = await http.put(
+            f"/api/sacola/{USUARIO}", json={"itens": itens, "modo": modo}, headers=autenticado(int(USUARIO)),
+        )
+    assert resposta.status_code == 200, resposta.text
+    corpo = resposta.json()
+    return {i["item_id"]: i["quantidade"] for i in corpo["itens"]}, corpo["total"]
+
+
+def test_put_substituir_troca_a_sacola_e_remove_quantidade_zero():
+    async def cenario():
+        await _sacola_no_banco(1, 2, 3)
+        return await _put([_item(1, 5), _item(2, 0), _item(4, 1, preco=2.5)], "substituir"), await _no_banco()
+
+    (itens, total), banco = rodar(cenario())
+    assert itens == {1: 5, 4: 1}  # 2 zerado e 3 fora do corpo saem
+    assert total == 5 * 10.0 + 2.5
+    assert sorted(banco.values()) == [1, 5]
+
+
+def test_put_mesclar_soma_as_quantidades():
+    async def cenario():
+        await _sacola_no_banco(1, 2)
+        # Item repetido no corpo também soma
+        return await _put([_item(1, 2), _item(1, 1), _item(3, 4, preco=1.0)], "mesclar")
+
+    itens, total = rodar(cenario())
+    assert itens == {1: 4, 2: 2, 3: 4}
+    assert total == 4 * 10.0 + 2 * 10.0 + 4 * 1.0
+
+
+def test_put_parte_das_pendencias_do_write_behind():
+    async def cenario():
+        (linha_id,) = await _sacola_no_banco(1)
+        await sacola_store.somar_quantidade(USUARIO, linha_id, 2)  # ainda só no store
+        itens, _ = await _put([_item(1, 1)], "mesclar")
+        return itens, await sacola_store.linhas(USUARIO)
+
+    itens, store = rodar(cenario())
+    assert itens == {1: 4}
+    assert [linha["quantidade"] for linha in store.values()] == [4]
+
+
+def test_migracao_3_junta_duplicadas_na_linha_de_menor_id():
+    async def cenario():
+        await criar_tabelas()
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM sacola_items"))
+            # Banco de antes da migração: sem o índice único
+            await conn.execute(text("DROP INDEX uq_sacola_user_restaurante_item"))
+            for linha_id, item_id, quantidade in [(7, 1, 2), (3, 1, 1), (9, 1, 4), (5, 2, 1)]:
+                await conn.execute(text(
+                    "INSERT INTO sacola_items (id, user_id, restaurant_id, item_id, nome, quantidade, preco_unitario)"
+                    " VALUES (:id, :u, 'rest-1', :item, 'Item', :q, 10.0)"
+                ), {"id": linha_id, "u": USUARIO, "item": item_id, "q": quantidade})
+
+            (passos,) = [passos for versao, _, passos in MIGRACOES if versao == 3]
+            for passo in passos:
+                await conn.execute(text(passo))
+
+            linhas = (await conn.execute(
+                text("SELECT id, item_id, quantidade FROM sacola_items ORDER BY id")
+            )).all()
+            indices = (await conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'uq_sacola_user_restaurante_item'"
+            ))).all()
+        return [tuple(linha) for linha in linhas], indices
+
+    linhas, indices = rodar(cenario())
+    assert linhas == [(3, 1, 7), (5, 2, 1)]
+    assert len(indices) == 1
@@ -0,0 +1,64 @@
+import json
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+import main  # noqa: F401  (registra todos os modelos no metadata)
+from src import schemas, serializers
+from src.models.items import Item
+from src.models.pedidos import OrderModel, OrderStatus, PedidoItem, TipoEntrega
+
+
+def _pedido(pedido_id: int) -> OrderModel:
+    return OrderModel(
+        id=pedido_id,
+        user_id=7,
+        restaurant_id="rest-1",
+        endereco_id=3,
+        total_price=59.9,
+        status=OrderStatus.EM_PREPARO,
+        tipo_entrega=TipoEntrega.AGENDADA,
+        horario_entrega="19:30",
+        codigo_entrega=None,
+        criado_em=datetime(2025, 3, 1, 12, 30, 15, 123456),
+        atualizado_em=None,
+        itens=[PedidoItem(id=pedido_id * 10, item_id=4, quantidade=2, preco_unitario_pago=29.95)],
+    )
+
+
+def _como_o_fastapi(schema, valor):
+    """O que o response_model padrão devolveria: validate + jsonable_encoder + json.dumps."""
+    return json.loads(json.dumps(jsonable_encoder(schema.model_validate(valor))))
+
+
+def test_pedido_igual_ao_response_model():
+    pedido = _pedido(1)
+    corpo = json.loads(serializers.json_bytes(serializers.pedido, pedido))
+    assert corpo == _como_o_fastapi(schemas.OrderResponse, pedido)
+    assert corpo["status"] == "EM_PREPARO"
+    assert corpo["itens"] == [{"id": 10, "item_id": 4, "quantidade": 2, "preco_unitario_pago": 29.95}]
+
+
+def test_lista_de_pedidos_e_itens():
+    pedidos = [_pedido(1), _pedido(2)]
+    assert json.loads(serializers.json_bytes(serializers.lista_pedidos, pedidos)) == [
+        _como_o_fastapi(schemas.OrderResponse, p) for p in pedidos
+    ]
+
+    item = Item(id=5, restaurant_id="rest-1", nome="Pastel", preco=8.5, ativo=True, criado_em=datetime(2025, 1, 2))
+    assert json.loads(serializers.json_bytes(serializers.lista_itens, [item])) == [
+        _como_o_fastapi(schemas.ItemResponse, item)
+    ]
+
+
+def test_resposta_json():
+    resposta = serializers.resposta_json(serializers.pedido, _pedido(1), status_code=201)
+    assert resposta.status_code == 201
+    assert resposta.media_type == "application/json"
+    assert json.loads(resposta.body)["id"] == 1
+
+
+def test_dumps_de_mensagem_websocket():
+    texto = serializers.dumps({"tipo": "status", "pedido_id": 1, "texto": "saiu para entrega ✓"})
+    assert isinstance(texto, str)
+    assert json.loads(texto) == {"tipo": "status", "pedido_id": 1, "texto": "saiu para entrega ✓"}
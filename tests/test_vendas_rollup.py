@@ -0,0 +1,193 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, select
+
+import main  # noqa: F401  (registra todos os modelos no metadata)
+from api.routes import relatorios
+from src import vendas_rollup
+from src.database import SessionLocal
+from src.models.avaliacao import Avaliacao, AvaliacaoRestaurante
+from src.models.pedidos import OrderModel, OrderStatus, PedidoItem
+from src.models.vendas_diarias import VendaDiariaItem, VendaDiariaRestaurante
+from tests.apoio import criar_tabelas, rodar
+
+AGORA = datetime.utcnow()
+HOJE = AGORA.date()
+
+
+async def _limpar():
+    await criar_tabelas()
+    async with SessionLocal() as db:
+        for modelo in (Avaliacao, AvaliacaoRestaurante, PedidoItem, OrderModel, VendaDiariaRestaurante, VendaDiariaItem):
+            await db.execute(delete(modelo))
+        await db.commit()
+
+
+async def _pedido(db, restaurant_id: str, criado_em: datetime, itens, registrar: bool = True) -> OrderModel:
+    """itens: [(item_id, quantidade, preço)]. registrar=False = pedido anterior ao rollup."""
+    pedido = OrderModel(
+        user_id=1, restaurant_id=restaurant_id, endereco_id=1, status=OrderStatus.PENDENTE,
+        total_price=sum(q * p for _, q, p in itens), criado_em=criado_em,
+    )
+    pedido.itens = [PedidoItem(item_id=i, quantidade=q, preco_unitario_pago=p) for i, q, p in itens]
+    db.add(pedido)
+    if registrar:
+        await vendas_rollup.registrar_pedido(db, pedido)
+    await db.flush()
+    return pedido
+
+
+async def _mudar_status(db, pedido: OrderModel, novo: OrderStatus):
+    await vendas_rollup.registrar_mudanca_status(db, pedido, pedido.status, novo)
+    pedido.status = novo
+
+
+async def _avaliar(db, pedido: OrderModel, nota: int):
+    db.add(Avaliacao(pedido_id=pedido.id, nota=nota))
+    await vendas_rollup.registrar_avaliacao(db, pedido, nota)
+
+
+async def _varredura(db):
+    """O que o rollup deve conter, calculado direto de pedidos/avaliações."""
+    por_restaurante = defaultdict(lambda: [0, 0.0, 0, 0.0, 0, 0])
+    por_item = defaultdict(lambda: [0, 0.0])
+    notas = dict((await db.execute(select(Avaliacao.pedido_id, Avaliacao.nota))).all())
+    pedidos = (await db.scalars(select(OrderModel))).all()
+    itens = (await db.execute(select(PedidoItem, OrderModel).join(OrderModel))).all()
+    for p in pedidos:
+        total = por_restaurante[(p.criado_em.date(), p.restaurant_id)]
+        total[0] += 1
+        total[1] += p.total_price
+        if p.status == OrderStatus.CANCELADO:
+            total[2] += 1
+            total[3] += p.total_price
+        if p.id in notas:
+            total[4] += 1
+            total[5] += notas[p.id]
+    for item, p in itens:
+        total = por_item[(p.criado_em.date(), p.restaurant_id, item.item_id)]
+        total[0] += item.quantidade
+        total[1] += item.quantidade * item.preco_unitario_pago
+    return _arredondar(por_restaurante), _arredondar(por_item)
+
+
+async def _rollup(db):
+    por_restaurante = {
+        (r.dia, r.restaurant_id): [r.n_pedidos, r.faturamento, r.n_cancelados,
+                                   r.faturamento_cancelado, r.n_avaliacoes, r.soma_notas]
+        for r in (await db.scalars(select(VendaDiariaRestaurante))).all()
+    }
+    por_item = {
+        (r.dia, r.restaurant_id, r.item_id): [r.quantidade, r.valor_faturado]
+        for r in (await db.scalars(select(VendaDiariaItem))).all()
+    }
+    return _arredondar(por_restaurante), _arredondar(por_item)
+
+
+def _arredondar(totais) -> dict:
+    return {chave: [round(v, 6) for v in valores] for chave, valores in totais.items()}
+
+
+async def _movimentar(db):
+    """Pedidos em três dias e dois restaurantes, cancelamentos e avaliações."""
+    anteontem, ontem = AGORA - timedelta(days=2), AGORA - timedelta(days=1)
+    a1 = await _pedido(db, "rest-a", anteontem, [(1, 2, 10.0), (2, 1, 5.5)])
+    a2 = await _pedido(db, "rest-a", anteontem, [(1, 1, 10.0)])
+    b1 = await _pedido(db, "rest-b", ontem, [(3, 3, 7.25), (3, 1, 7.25)])
+    b2 = await _pedido(db, "rest-b", AGORA, [(4, 1, 30.0)])
+    a3 = await _pedido(db, "rest-a", AGORA, [(2, 4, 5.5)])
+
+    await _mudar_status(db, a2, OrderStatus.CANCELADO)
+    await _mudar_status(db, b1, OrderStatus.CANCELADO)
+    await _mudar_status(db, b1, OrderStatus.CONFIRMADO)   # saiu de CANCELADO
+    await _mudar_status(db, b2, OrderStatus.EM_PREPARO)   # não mexe nos cancelados
+    await _mudar_status(db, a3, OrderStatus.CANCELADO)
+    await _mudar_status(db, a3, OrderStatus.CANCELADO)    # repetido: conta uma vez só
+
+    await _avaliar(db, a1, 5)
+    await _avaliar(db, b1, 2)
+    await _avaliar(db, b2, 4)
+    await db.commit()
+
+
+def test_incrementos_batem_com_a_varredura_de_pedidos():
+    async def cenario():
+        await _limpar()
+        async with SessionLocal() as db:
+            await _movimentar(db)
+            return await _rollup(db), await _varredura(db)
+
+    (rollup_restaurante, rollup_item), (esperado_restaurante, esperado_item) = rodar(cenario())
+    assert rollup_restaurante == esperado_restaurante
+    assert rollup_item == esperado_item
+    assert rollup_restaurante[(HOJE, "rest-a")][2:4] == [1, 22.0]
+
+
+def test_backfill_reproduz_os_incrementos():
+    async def cenario():
+        await _limpar()
+        async with SessionLocal() as db:
+            await _movimentar(db)
+            incremental = await _rollup(db)
+            await vendas_rollup.backfill(db, HOJE - timedelta(days=2), HOJE)
+            await db.commit()
+            return incremental, await _rollup(db)
+
+    incremental, recalculado = rodar(cenario())
+    assert recalculado == incremental
+
+
+def _amanha(monkeypatch):
+    class Amanha(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime.utcnow() + timedelta(days=1)
+
+    monkeypatch.setattr(relatorios, "datetime", Amanha)
+
+
+def test_pedidos_de_hoje_anteriores_ao_deploy_continuam_nos_relatorios(monkeypatch):
+    async def totais():
+        async with SessionLocal() as db:
+            return dict(await relatorios._totais_por_restaurante(db, None, None))
+
+    async def cenario():
+        await _limpar()
+        async with SessionLocal() as db:
+            # Código antigo: pedidos sem incremento no rollup
+            await _pedido(db, "rest-a", AGORA - timedelta(days=1), [(1, 1, 10.0)], registrar=False)
+            await _pedido(db, "rest-a", AGORA, [(1, 2, 10.0)], registrar=False)
+            await db.commit()
+            # Migração 5, antes de o worker atender
+            await vendas_rollup.preencher_ate_hoje(db)
+            await db.commit()
+            # Código novo: incrementos
+            await _pedido(db, "rest-a", AGORA, [(1, 4, 10.0)])
+            await db.commit()
+
+        hoje = await totais()
+        _amanha(monkeypatch)  # hoje vira dia fechado: lido só do rollup
+        return hoje, await totais()
+
+    hoje, amanha = rodar(cenario())
+    assert hoje["rest-a"]["n_pedidos"] == 3
+    assert hoje["rest-a"]["faturamento"] == pytest.approx(70.0)
+    assert amanha["rest-a"]["n_pedidos"] == 3
+    assert amanha["rest-a"]["faturamento"] == pytest.approx(70.0)
+
+
+def test_serie_diaria_junta_rollup_e_hoje_sem_contar_duas_vezes():
+    async def cenario():
+        await _limpar()
+        async with SessionLocal() as db:
+            await _movimentar(db)
+            return await relatorios.get_pedidos_por_dia(HOJE - timedelta(days=5), HOJE, db)
+
+    serie = {d.data: d.faturamento for d in rodar(cenario())}
+    assert serie == {
+        HOJE - timedelta(days=2): 35.5,
+        HOJE - timedelta(days=1): 29.0,
+        HOJE: 52.0,
+    }